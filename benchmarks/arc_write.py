@@ -0,0 +1,92 @@
+# Checks that archives loaded lazily and saved incrementally read back with the same files,
+# including archives whose header claims a larger size than the data they hold, and reports
+# the time taken for the incremental and the full write. Without inputs a small archive is built.
+# Run from the repository root, for example:
+#     python -m benchmarks.arc_write "Course/Luigi.arc" "Course/Daisy.arc"
+import argparse
+import os
+import tempfile
+from io import BytesIO
+from struct import pack_into, unpack
+from timeit import default_timer
+
+from lib.rarc import Archive
+
+
+def build_archive():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "course")
+        os.makedirs(os.path.join(root, "sub"))
+        for name, size in (("a.bin", 100), ("b.bin", 33), ("sub/c.bin", 64), ("sub/d.bin", 7)):
+            with open(os.path.join(root, name), "wb") as f:
+                f.write(bytes((i*7 + size) & 0xFF for i in range(size)))
+
+        arc = Archive.from_dir(root)
+        out = BytesIO()
+        arc.write_arc(out)
+        return out.getvalue()
+
+
+def read_files(data):
+    arc = Archive.from_file(BytesIO(data))
+    files = {}
+    for dirpath, dirnames, filenames in arc.root.walk():
+        for filename in filenames:
+            files[dirpath + "/" + filename] = arc[dirpath + "/" + filename].getvalue()
+    return files
+
+
+def check(name, data):
+    expected = read_files(data)
+    paths = sorted(expected)
+    # Grow the first file so every following file has to move
+    changed = dict(expected)
+    changed[paths[0]] = expected[paths[0]] + b"changed"
+
+    ok = True
+    for label, source in (("", data), (" oversized header", oversized(data))):
+        arc = Archive.from_file(BytesIO(source), lazy=True)
+        arc[paths[0]].seek(0, 2)
+        arc[paths[0]].write(b"changed")
+
+        start = default_timer()
+        out = BytesIO()
+        arc.write_arc(out)
+        taken = default_timer() - start
+        result = out.getvalue()
+
+        size = unpack(">I", result[4:8])[0]
+        same = size == len(result) and read_files(result) == changed
+        ok = ok and same
+        print("{0}{1}: {2} -> {3} bytes, header size {4} in {5:.4f}s, {6}".format(
+            name, label, len(source), len(result), size, taken, "ok" if same else "FAILED"))
+
+    start = default_timer()
+    Archive.from_file(BytesIO(data)).write_arc(BytesIO())
+    print("{0}: full write in {1:.4f}s".format(name, default_timer() - start))
+    return ok
+
+
+def oversized(data):
+    data = bytearray(data)
+    pack_into(">I", data, 4, len(data) + 0x1000)
+    return bytes(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to uncompressed archives. Default is a small generated archive.")
+
+    args = parser.parse_args()
+    failed = False
+
+    if args.input:
+        for path in args.input:
+            with open(path, "rb") as f:
+                failed = not check(path, f.read()) or failed
+    else:
+        failed = not check("generated", build_archive())
+
+    if failed:
+        raise SystemExit(1)
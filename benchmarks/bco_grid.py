@@ -0,0 +1,159 @@
+# Compares using the grid table of BCO files as the spatial index of Collision against binning the
+# triangles into a new grid, and checks that height queries give the same results with both. For the
+# synthetic terrain also checks that a table laid out differently than read_grid assumes is rejected,
+# so that the triangles are binned instead.
+# Run from the repository root, for example:
+#     python -m benchmarks.bco_grid "Course/Luigi_course.bco" --queries 20000
+# Without input files a synthetic terrain is written as BCO with a quadtree grid table.
+import argparse
+import math
+from io import BytesIO
+from struct import pack
+from timeit import default_timer
+
+import numpy
+
+from lib.collision import Collision, bin_triangles
+from lib.BCOllider import RacetrackCollision
+from benchmarks.collision_grid import make_terrain
+from benchmarks.collision_ground import make_positions, count_mismatches
+
+
+def write_bco(verts, faces, cell_size=4000, max_triangles=24, max_depth=3, quadrants=(0, 1, 2, 3)):
+    # Writes the mesh as BCO. Cells with many triangles are split into 4 like the game's files do, child i
+    # covers the x half q & 1 and the z half q >> 1 of its parent with q = quadrants[i].
+    vertices = numpy.array(verts, dtype=numpy.float32).astype(numpy.float64)
+    triangles = numpy.array([(face[0][0], face[1][0], face[2][0]) for face in faces]) - 1
+    corners_x = vertices[triangles, 0]
+    corners_z = vertices[triangles, 2]
+    min_x, max_x = corners_x.min(axis=1), corners_x.max(axis=1)
+    min_z, max_z = corners_z.min(axis=1), corners_z.max(axis=1)
+
+    start_x = math.floor(min_x.min() / cell_size) * cell_size
+    start_z = math.floor(min_z.min() / cell_size) * cell_size
+    size_x = int((max_x.max() - start_x) // cell_size) + 1
+    size_z = int((max_z.max() - start_z) // cell_size) + 1
+
+    entries = [None] * (size_x * size_z)
+    index_list = []
+
+    def fill(entry, x, z, size, candidates, depth):
+        inside = candidates[(min_x[candidates] <= x + size) & (max_x[candidates] >= x)
+                            & (min_z[candidates] <= z + size) & (max_z[candidates] >= z)]
+        if len(inside) > max_triangles and depth < max_depth:
+            child = len(entries)
+            entries.extend([None] * 4)
+            entries[entry] = (0, 0, child, 0)
+            for i, q in enumerate(quadrants):
+                fill(child + i, x + (q & 1)*size/2, z + (q >> 1)*size/2, size/2, inside, depth + 1)
+        else:
+            if len(inside) > 255:
+                raise RuntimeError("Cell with {0} triangles, use a deeper grid".format(len(inside)))
+            entries[entry] = (len(inside), 0, 0, len(index_list))
+            index_list.extend(inside.tolist())
+
+    everything = numpy.arange(len(triangles))
+    for z in range(size_z):
+        for x in range(size_x):
+            fill(size_x*z + x, start_x + x*cell_size, start_z + z*cell_size, cell_size, everything, 0)
+
+    gridtable = b"".join(pack(">BBHi", *entry) for entry in entries)
+    indices = b"".join(pack(">H", index) for index in index_list)
+    indices += b"\x00" * (-len(indices) % 4)
+    triangle_data = b"".join(pack(">iii10xH12x", v1, v2, v3, face[3] if len(face) > 3 else 0x100)
+                             for (v1, v2, v3), face in zip(triangles.tolist(), faces))
+    vertex_data = b"".join(pack(">fff", *vert) for vert in verts)
+
+    indices_offset = 0x2C + len(gridtable)
+    triangles_offset = indices_offset + len(indices)
+    vertices_offset = triangles_offset + len(triangle_data)
+    end_offset = vertices_offset + len(vertex_data)
+    header = pack(">4sHHiiiiHHIIII", b"0003", size_x, size_z, start_x, start_z, cell_size, cell_size, 0, 0,
+                  indices_offset, triangles_offset, vertices_offset, end_offset)
+    return header + gridtable + indices + triangle_data + vertex_data
+
+
+def best_time(func, repeat):
+    times = []
+    for i in range(repeat):
+        start = default_timer()
+        result = func()
+        times.append(default_timer() - start)
+    return result, min(times)
+
+
+def load_bco(data):
+    bco_coll = RacetrackCollision()
+    bco_coll.load_file(BytesIO(data))
+    faces = [((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type)
+             for v1, v2, v3, collision_type, rest in bco_coll.triangles]
+    return bco_coll, faces
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+    parser.add_argument("--queries", type=int, default=5000,
+                        help="Number of positions at which both grids are compared.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Times the grids are built, the fastest time is reported.")
+
+    args = parser.parse_args()
+
+    files = []
+    for path in args.input:
+        with open(path, "rb") as f:
+            files.append((path, f.read()))
+    if not files:
+        verts, faces = make_terrain(args.size)
+        files.append(("terrain {0}x{0}".format(args.size), write_bco(verts, faces)))
+
+    failed = False
+    for name, data in files:
+        bco_coll, faces = load_bco(data)
+        verts = bco_coll.vertices
+
+        grid, table_time = best_time(bco_coll.read_grid, args.repeat)
+        if grid is None:
+            print("{0}: grid table can't be used, the triangles would be binned".format(name))
+            failed = True
+            continue
+
+        vertices = numpy.array(verts, dtype=numpy.float64)
+        triangles = numpy.array([(face[0][0], face[1][0], face[2][0]) for face in faces]) - 1
+        _, bin_time = best_time(lambda: bin_triangles(vertices, triangles, 2000), args.repeat)
+
+        binned = Collision(verts, faces)
+        from_table = Collision(verts, faces, grid)
+
+        positions = make_positions(verts, binned.cell_size, args.queries)
+        xs = numpy.array([x for x, y, z in positions])
+        ys = numpy.array([y for x, y, z in positions])
+        zs = numpy.array([z for x, y, z in positions])
+
+        expected = binned.collide_rays_closest_many(xs, ys, zs)
+        heights = from_table.collide_rays_closest_many(xs, ys, zs)
+        expected = [None if math.isnan(height) else height for height in expected.tolist()]
+        mismatches = count_mismatches(expected, heights)
+
+        single = [from_table.collide_ray_downwards(x, z) for x, y, z in positions]
+        expected_single = [binned.collide_ray_downwards(x, z) for x, y, z in positions]
+        mismatches += sum(1 for a, b in zip(single, expected_single) if a != b)
+        failed = failed or mismatches > 0
+
+        print("{0}: {1} triangles, {2}x{3} cells of {4}x{5}, table decoded in {6:.4f}s, binning {7:.4f}s, "
+              "{8} of {9} queries differ".format(
+                  name, len(faces), from_table.grid_size_x, from_table.grid_size_z, from_table.cell_size_x,
+                  from_table.cell_size_z, table_time, bin_time, mismatches, 2*len(positions)))
+
+    if not args.input:
+        for name, data in (("children in z order", write_bco(verts, faces, quadrants=(0, 2, 1, 3))),):
+            rejected = load_bco(data)[0].read_grid() is None
+            failed = failed or not rejected
+            print("{0}: {1}".format(name, "rejected" if rejected else "decoded although the mesh doesn't fit it"))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,106 @@
+# Compares loading BCO collision through numpy views (RacetrackCollision) against the unpack_from loops
+# it replaced, and building Collision from those arrays against building it from vertex and face lists.
+# Checks that the triangle and vertex tuples are unchanged.
+# Run from the repository root, for example:
+#     python -m benchmarks.bco_parse "Course/Luigi_course.bco"
+# Without input files a synthetic terrain is written as BCO.
+import argparse
+import builtins
+from io import BytesIO
+from struct import unpack_from
+
+from lib.collision import Collision
+from lib.BCOllider import RacetrackCollision, read_float, read_int32, read_uint16, read_uint32, read_array
+from benchmarks.collision_grid import make_terrain
+from benchmarks.bco_grid import write_bco, best_time
+
+
+def parse_unpacked(data):
+    # Triangles and vertices the way RacetrackCollision.load_file used to read them
+    trianglesoffset = read_uint32(data, 0x20)
+    verticesoffset = read_uint32(data, 0x24)
+    unknownoffset = read_uint32(data, 0x28)
+
+    triangles = []
+    for i in range((verticesoffset-trianglesoffset) // 0x24):
+        v1 = read_int32(data, trianglesoffset+i*0x24 + 0x00)
+        v2 = read_int32(data, trianglesoffset+i*0x24 + 0x04)
+        v3 = read_int32(data, trianglesoffset+i*0x24 + 0x08)
+        collision_type = read_uint16(data, trianglesoffset+i*0x24 + 0x16)
+        rest = read_array(data, trianglesoffset+i*0x24 + 0x0C, length=0x24-0xC)
+        triangles.append((v1, v2, v3, collision_type, rest))
+
+    vertices = []
+    for i in range((unknownoffset-verticesoffset) // 0xC):
+        x = read_float(data, verticesoffset + i*0xC + 0x00)
+        y = read_float(data, verticesoffset + i*0xC + 0x04)
+        z = read_float(data, verticesoffset + i*0xC + 0x08)
+        vertices.append((x, y, z))
+
+    return triangles, vertices
+
+
+def load(data):
+    bco_coll = RacetrackCollision()
+    bco_coll.load_file(BytesIO(data))
+    return bco_coll
+
+
+def collision_from_lists(bco_coll):
+    verts = list(bco_coll.vertices)
+    faces = [((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type)
+             for v1, v2, v3, collision_type, rest in bco_coll.triangles]
+    return Collision(verts, faces)
+
+
+def collision_from_arrays(bco_coll):
+    triangles = bco_coll.triangle_array
+    return Collision.from_arrays(bco_coll.vertex_array, triangles["vertices"], triangles["collision_type"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Times everything is loaded, the fastest time is reported.")
+
+    args = parser.parse_args()
+
+    files = []
+    for path in args.input:
+        with open(path, "rb") as f:
+            files.append((path, f.read()))
+    if not files:
+        verts, faces = make_terrain(args.size)
+        files.append(("terrain {0}x{0}".format(args.size), write_bco(verts, faces)))
+
+    failed = False
+    print_bk = builtins.print
+    for name, data in files:
+        builtins.print = lambda *args, **kwargs: None
+        try:
+            (triangles, vertices), unpacked_time = best_time(lambda: parse_unpacked(data), args.repeat)
+            bco_coll, array_time = best_time(lambda: load(data), args.repeat)
+            _, lists_time = best_time(lambda: load(data).triangles and None, args.repeat)
+            from_lists, from_lists_time = best_time(lambda: collision_from_lists(load(data)), args.repeat)
+            from_arrays, from_arrays_time = best_time(lambda: collision_from_arrays(load(data)), args.repeat)
+        finally:
+            builtins.print = print_bk
+
+        same = (bco_coll.triangles == triangles and bco_coll.vertices == vertices
+                and from_lists.vertex_array.tobytes() == from_arrays.vertex_array.tobytes()
+                and from_lists.triangle_array.tobytes() == from_arrays.triangle_array.tobytes()
+                and from_lists.coltype_array.tobytes() == from_arrays.coltype_array.tobytes()
+                and from_lists.grid_triangles.tobytes() == from_arrays.grid_triangles.tobytes())
+        failed = failed or not same
+
+        print("{0}: {1} triangles, unpack_from {2:.4f}s, views {3:.4f}s (tuple lists {4:.4f}s), "
+              "Collision from lists {5:.3f}s, from arrays {6:.3f}s, {7}".format(
+                  name, len(triangles), unpacked_time, array_time, lists_time, from_lists_time,
+                  from_arrays_time, "same" if same else "DIFFERENT"))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,156 @@
+# Compares the section based BOL parser (BOL.from_bytes) against reading the document field by field
+# (read_unbuffered, how BOL.from_file read it before) and checks that both produce the same objects.
+# Run from the repository root, for example:
+#     python -m benchmarks.bol_parse "Course/Luigi.arc" luigi_course.bol
+import argparse
+from io import BytesIO
+from timeit import default_timer
+
+import numpy
+
+from lib.libbol import (BOL, ENEMYITEMPOINT, CHECKPOINT, ROUTEGROUP, ROUTEPOINT, OBJECTS, KARTPOINT, AREA,
+                        CAMERA, RESPAWNPOINT, LIGHTPARAM, MINIGAME, EnemyPointGroups, CheckpointGroups,
+                        ObjectContainer, Route, RoutePoint, MapObjects, KartStartPoints, Areas, Camera,
+                        JugemPoint, LightParam, MGEntry)
+from lib.rarc import Archive
+
+
+def load_bol_data(path):
+    if path.endswith(".bol"):
+        with open(path, "rb") as f:
+            return f.read()
+
+    with open(path, "rb") as f:
+        archive = Archive.from_file(f, lazy=True)
+    bolpath = archive.find_path("_course.bol", archive.root.name)
+    if bolpath is None:
+        raise RuntimeError("No _course.bol in {0}".format(path))
+    return archive[bolpath].getvalue()
+
+
+def read_unbuffered(f):
+    # Reads the document entry by entry and field by field from f
+    bol, old_bol, sectioncounts, sectionoffsets = BOL._read_header(f)
+
+    f.seek(sectionoffsets[ENEMYITEMPOINT])
+    bol.enemypointgroups = EnemyPointGroups.from_file(f, sectioncounts[ENEMYITEMPOINT], old_bol)
+
+    f.seek(sectionoffsets[CHECKPOINT])
+    bol.checkpoints = CheckpointGroups.from_file(f, sectioncounts[CHECKPOINT])
+
+    f.seek(sectionoffsets[ROUTEGROUP])
+    bol.routes = ObjectContainer.from_file(f, sectioncounts[ROUTEGROUP], Route)
+
+    f.seek(sectionoffsets[ROUTEPOINT])
+    routepoints = []
+    count = (sectionoffsets[OBJECTS] - sectionoffsets[ROUTEPOINT])//0x20
+    for i in range(count):
+        routepoints.append(RoutePoint.from_file(f))
+
+    for route in bol.routes:
+        route.add_routepoints(routepoints)
+
+    f.seek(sectionoffsets[OBJECTS])
+    bol.objects = MapObjects.from_file(f, sectioncounts[OBJECTS])
+
+    f.seek(sectionoffsets[KARTPOINT])
+    bol.kartpoints = KartStartPoints.from_file(f, (sectionoffsets[AREA] - sectionoffsets[KARTPOINT])//0x28)
+
+    f.seek(sectionoffsets[AREA])
+    bol.areas = Areas.from_file(f, sectioncounts[AREA])
+
+    f.seek(sectionoffsets[CAMERA])
+    bol.cameras = ObjectContainer.from_file(f, sectioncounts[CAMERA], Camera)
+
+    f.seek(sectionoffsets[RESPAWNPOINT])
+    bol.respawnpoints = ObjectContainer.from_file(f, sectioncounts[RESPAWNPOINT], JugemPoint)
+
+    f.seek(sectionoffsets[LIGHTPARAM])
+    bol.lightparams = ObjectContainer.from_file(f, sectioncounts[LIGHTPARAM], LightParam)
+
+    f.seek(sectionoffsets[MINIGAME])
+    bol.mgentries = ObjectContainer.from_file(f, sectioncounts[MINIGAME], MGEntry)
+
+    bol._finish_loading(old_bol)
+
+    return bol
+
+
+def find_difference(a, b, path="bol", seen=None):
+    # Returns a description of the first difference between two object graphs, or None.
+    if seen is None:
+        seen = set()
+    if (id(a), id(b)) in seen:
+        return None
+    seen.add((id(a), id(b)))
+
+    if type(a) is not type(b):
+        return "{0}: {1} != {2}".format(path, type(a), type(b))
+
+    if isinstance(a, numpy.ndarray):
+        if not numpy.array_equal(a, b):
+            return "{0}: arrays differ".format(path)
+    elif isinstance(a, (list, tuple)):
+        if len(a) != len(b):
+            return "{0}: length {1} != {2}".format(path, len(a), len(b))
+        for i, (item_a, item_b) in enumerate(zip(a, b)):
+            difference = find_difference(item_a, item_b, "{0}[{1}]".format(path, i), seen)
+            if difference is not None:
+                return difference
+    elif isinstance(a, dict):
+        if a.keys() != b.keys():
+            return "{0}: keys differ".format(path)
+        for key in a:
+            difference = find_difference(a[key], b[key], "{0}[{1!r}]".format(path, key), seen)
+            if difference is not None:
+                return difference
+    elif hasattr(a, "__dict__"):
+        return find_difference(vars(a), vars(b), path, seen)
+    elif a != b:
+        return "{0}: {1!r} != {2!r}".format(path, a, b)
+
+    return None
+
+
+def bench(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = default_timer()
+        result = func()
+        taken = default_timer() - start
+        if best is None or taken < best:
+            best = taken
+
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="+",
+                        help="Paths to .bol files or to archives containing a _course.bol")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="How often each parser runs per file, the best time is reported.")
+
+    args = parser.parse_args()
+
+    for path in args.input:
+        data = load_bol_data(path)
+
+        old_bol = read_unbuffered(BytesIO(data))
+        new_bol = BOL.from_bytes(data)
+        difference = find_difference(old_bol, new_bol)
+        if difference is not None:
+            raise RuntimeError("Parsers disagree on {0}: {1}".format(path, difference))
+
+        # Both parsers share the same post processing (route info, associations), so it is
+        # left out of the timings to measure the decoding alone.
+        finish_loading = BOL._finish_loading
+        BOL._finish_loading = lambda bol, old_bol: None
+        try:
+            old_time, _ = bench(lambda: read_unbuffered(BytesIO(data)), args.repeat)
+            new_time, _ = bench(lambda: BOL.from_bytes(data), args.repeat)
+        finally:
+            BOL._finish_loading = finish_loading
+
+        print("{0}: {1} bytes, field by field {2:.2f}ms, sections {3:.2f}ms, {4:.1f}x".format(
+            path, len(data), old_time*1000, new_time*1000, old_time/new_time))
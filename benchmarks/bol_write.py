@@ -0,0 +1,145 @@
+# Compares the single buffer BOL writer (BOL.to_bytes) against writing the document field by field
+# (write_unbuffered, how BOL.write wrote it before) and checks that both produce identical bytes.
+# Run from the repository root, for example:
+#     python -m benchmarks.bol_write "Course/Luigi.arc" luigi_course.bol
+import argparse
+from io import BytesIO
+from struct import pack
+
+from lib.libbol import BOL, write_uint16
+from benchmarks.bol_parse import load_bol_data, bench
+
+
+def write_unbuffered(bol, f):
+    # Writes the document entry by entry and field by field to f
+    f.write(b"0014")
+    f.write(pack(">B", bol.roll))
+    bol.rgb_ambient.write(f)
+    bol.rgba_light.write(f)
+    f.write(pack(">fff", bol.lightsource.x, bol.lightsource.y, bol.lightsource.z))
+    f.write(pack(">BB", bol.lap_count, bol.music_id))
+
+    enemypoints = 0
+    for group in bol.enemypointgroups.groups:
+        enemypoints += len(group.points)
+    write_uint16(f, enemypoints)
+    write_uint16(f, len(bol.checkpoints.groups))
+    write_uint16(f, len(bol.objects.objects))
+    write_uint16(f, len(bol.areas.areas))
+    write_uint16(f, len(bol.cameras))
+    write_uint16(f, len(bol.routes) + len(bol.cameraroutes))
+    write_uint16(f, len(bol.respawnpoints))
+
+    f.write(pack(">B", bol.fog_type))
+    bol.fog_color.write(f)
+    f.write(pack(">ffBBBB",
+            bol.fog_startz, bol.fog_endz,
+            bol.lod_bias, bol.dummy_start_line, bol.snow_effects, bol.shadow_opacity))
+    bol.shadow_color.write(f)
+    f.write(pack(">BB", len(bol.kartpoints.positions), bol.sky_follow))
+    f.write(pack(">BB", len(bol.lightparams), len(bol.mgentries)))
+    f.write(pack(">B", 0))  # padding
+
+    f.write(b"\x00"*4) # Filestart 0
+
+    offset_start = f.tell()
+    offsets = []
+    for i in range(11):
+        f.write(b"FOOB") # placeholder for offsets
+    f.write(b"\x12"*12) # padding
+
+    offsets.append(f.tell())
+    for group in bol.enemypointgroups.groups:
+        for point in group.points:
+            point.group = group.id
+            point.write(f)
+
+    offsets.append(f.tell())
+    for group in bol.checkpoints.groups:
+        group.write(f)
+    for group in bol.checkpoints.groups:
+        for point in group.points:
+            point.write(f)
+
+    offsets.append(f.tell())
+
+    routes, cameras = bol.combine_routes()
+
+    index = 0
+    for route in routes:
+        route.write(f, index)
+        index += len(route.points)
+
+    offsets.append(f.tell())
+    for route in routes:
+        for point in route.points:
+            point.write(f)
+
+    offsets.append(f.tell())
+    for object in bol.objects.objects:
+        object.write(f)
+
+    offsets.append(f.tell())
+    for startpoint in bol.kartpoints.positions:
+        startpoint.write(f)
+
+    offsets.append(f.tell())
+    for area in bol.areas.areas:
+        area.write(f)
+
+    offsets.append(f.tell())
+    for camera in cameras:
+        camera.write(f)
+
+    offsets.append(f.tell())
+    for respawnpoint in bol.respawnpoints:
+        respawnpoint.write(f)
+
+    offsets.append(f.tell())
+    for lightparam in bol.lightparams:
+        lightparam.write(f)
+
+    offsets.append(f.tell())
+    for mgentry in bol.mgentries:
+        mgentry.write(f)
+    assert len(offsets) == 11
+    f.seek(offset_start)
+    for offset in offsets:
+        f.write(pack(">I", offset))
+
+
+def write_bytes(bol):
+    f = BytesIO()
+    write_unbuffered(bol, f)
+    return f.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="+",
+                        help="Paths to .bol files or to archives containing a _course.bol")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="How often each writer runs per file, the best time is reported.")
+
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.input:
+        bol = BOL.from_bytes(load_bol_data(path))
+
+        old_time, old_data = bench(lambda: write_bytes(bol), args.repeat)
+        new_time, new_data = bench(lambda: bol.to_bytes(), args.repeat)
+
+        if old_data != new_data:
+            failed = True
+            mismatch = next((i for i, (a, b) in enumerate(zip(old_data, new_data)) if a != b),
+                            min(len(old_data), len(new_data)))
+            print("{0}: output differs at offset {1} ({2} and {3} bytes)".format(
+                path, hex(mismatch), len(old_data), len(new_data)))
+            continue
+
+        print("{0}: {1} bytes, field by field {2:.2f}ms, single buffer {3:.2f}ms, {4:.1f}x".format(
+            path, len(new_data), old_time*1000, new_time*1000, old_time/new_time))
+
+    if failed:
+        raise SystemExit(1)
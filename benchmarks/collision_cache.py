@@ -0,0 +1,190 @@
+# Compares opening a BCO file with and without the collision cache (lib.collision_cache), checks that a
+# collision loaded from the cache has the same arrays and answers queries the same, and that the cache
+# drops the least recently used entries once it grows beyond its size limit. Also times the entries of
+# converted models, which hold the textured model drawn in place of the collision, on a synthetic textured
+# OBJ standing in for what SuperBMD writes, and checks that a cached model has the same meshes.
+# Run from the repository root, for example:
+#     python -m benchmarks.collision_cache "Course/Luigi_course.bco"
+# Without input files a synthetic terrain is written as BCO.
+import argparse
+import builtins
+import os
+import random
+import tempfile
+from io import BytesIO
+from timeit import default_timer
+
+import numpy
+
+from lib.collision import Collision, CollisionGeometry
+from lib.collision_cache import CollisionCache, content_key
+from lib.collision_loader import read_obj_collision
+from lib.model_rendering import TexturedModel
+from lib.BCOllider import RacetrackCollision
+from benchmarks.collision_grid import make_terrain
+from benchmarks.bco_grid import write_bco
+from benchmarks.textured_model import write_course
+
+
+def open_collision(data, cache=None):
+    # Everything the editor does with a BCO file before the collision can be queried
+    bco_coll = RacetrackCollision()
+    bco_coll.load_file(BytesIO(data))
+
+    def build():
+        return Collision.from_geometry(CollisionGeometry.from_bco(bco_coll), bco_coll.read_grid())
+
+    if cache is None:
+        collision = build()
+    else:
+        collision = cache.get(bco_coll.data, build)
+    collision.geometry.prepare_rendering()
+    return collision
+
+
+def same_collision(collision, other, queries=2000, seed=0):
+    arrays = collision.save_arrays()
+    other_arrays = other.save_arrays()
+    if arrays.keys() != other_arrays.keys():
+        return False
+    for name, array in arrays.items():
+        if array.dtype != other_arrays[name].dtype or array.tobytes() != other_arrays[name].tobytes():
+            return False
+
+    rng = random.Random(seed)
+    bounds_min, bounds_max = collision.geometry.bounds
+    for i in range(queries):
+        x = rng.uniform(bounds_min[0], bounds_max[0])
+        z = rng.uniform(bounds_min[2], bounds_max[2])
+        y = rng.uniform(bounds_min[1], bounds_max[1])
+        if collision.collide_ray_closest(x, z, y) != other.collide_ray_closest(x, z, y):
+            return False
+
+    return True
+
+
+def same_model(model, other):
+    if len(model.mesh_list) != len(other.mesh_list):
+        return False
+    for mesh, other_mesh in zip(model.mesh_list, other.mesh_list):
+        material, other_material = mesh.material, other_mesh.material
+        if (not numpy.array_equal(mesh.vertex_data(), other_mesh.vertex_data())
+                or material.diffuse != other_material.diffuse or material.cull_mode != other_material.cull_mode
+                or material.textured != other_material.textured or material.image != other_material.image):
+            return False
+    return True
+
+
+def check_model(directory, size):
+    # Returns the time to read the textured course without cache, with a cold and with a warm cache, and
+    # whether the cached collision and model are the same. The file content stands in for the BMD file.
+    os.makedirs(directory)
+    objpath = write_course(directory, size)
+    with open(objpath, "rb") as f:
+        data = f.read()
+
+    def build():
+        return read_obj_collision(objpath), TexturedModel.from_obj_path(objpath, rotate=True)
+
+    cache = CollisionCache(os.path.join(directory, "cache"))
+    times = []
+    for get in (build, lambda: cache.get_with_model(data, build), lambda: cache.get_with_model(data, fail)):
+        start = default_timer()
+        result = get()
+        times.append(default_timer() - start)
+    (collision, model), (cached_collision, cached_model) = build(), result
+    return times, same_collision(collision, cached_collision) and same_model(model, cached_model)
+
+
+def fail():
+    raise RuntimeError("Cached model was built again")
+
+
+def check_eviction(directory, data):
+    # Three entries fit, a fourth one pushes out the one that was used least recently
+    cache = CollisionCache(directory, max_size=1)
+    cache.get(data, lambda: open_collision(data))
+    entry_size = os.path.getsize(cache.path(content_key(data)))
+    cache.remove(cache.path(content_key(data)))
+    cache = CollisionCache(directory, max_size=3*entry_size)
+
+    keys = []
+    for i in range(4):
+        variant = data + bytes([i])
+        keys.append(content_key(variant))
+        cache.get(variant, lambda: open_collision(data))
+        # Modification times may be coarse, make the order of use unambiguous
+        os.utime(cache.path(keys[-1]), (i, i))
+        if i == 2:
+            # Using the first entry again makes the second one the least recently used
+            cache.load(keys[0])
+            os.utime(cache.path(keys[0]), (2.5, 2.5))
+
+    kept = [os.path.exists(cache.path(key)) for key in keys]
+    return kept == [True, False, True, True]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+
+    args = parser.parse_args()
+
+    files = []
+    for path in args.input:
+        with open(path, "rb") as f:
+            files.append((path, f.read()))
+    if not files:
+        verts, faces = make_terrain(args.size)
+        files.append(("terrain {0}x{0}".format(args.size), write_bco(verts, faces)))
+
+    failed = False
+    print_bk = builtins.print
+    with tempfile.TemporaryDirectory() as directory:
+        cache = CollisionCache(os.path.join(directory, "cache"))
+        for name, data in files:
+            builtins.print = lambda *args, **kwargs: None
+            try:
+                start = default_timer()
+                uncached = open_collision(data)
+                uncached_time = default_timer() - start
+
+                start = default_timer()
+                open_collision(data, cache)
+                cold_time = default_timer() - start
+
+                start = default_timer()
+                cached = open_collision(data, cache)
+                warm_time = default_timer() - start
+            finally:
+                builtins.print = print_bk
+
+            same = same_collision(uncached, cached)
+            failed = failed or not same
+            print("{0}: {1} triangles, without cache {2:.3f}s, cold {3:.3f}s, warm {4:.4f}s, "
+                  "entry {5:.1f} MB, {6}".format(
+                      name, len(uncached.triangle_array), uncached_time, cold_time, warm_time,
+                      os.path.getsize(cache.path(content_key(data))) / 2**20, "same" if same else "DIFFERENT"))
+
+        builtins.print = lambda *args, **kwargs: None
+        try:
+            model_times, same = check_model(os.path.join(directory, "model"), args.size)
+        finally:
+            builtins.print = print_bk
+        failed = failed or not same
+        print("textured course {0}x{0}: without cache {1:.3f}s, cold {2:.3f}s, warm {3:.4f}s, {4}".format(
+            args.size, *model_times, "same" if same else "DIFFERENT"))
+
+        builtins.print = lambda *args, **kwargs: None
+        try:
+            evicted = check_eviction(os.path.join(directory, "eviction"), files[0][1])
+        finally:
+            builtins.print = print_bk
+        failed = failed or not evicted
+        print("least recently used entry evicted:", evicted)
+
+    if failed:
+        raise SystemExit(1)
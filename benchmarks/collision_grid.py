@@ -0,0 +1,290 @@
+# Compares building the collision grid with the array based binning (Collision) against the
+# recursive subdivision it replaced, and checks that queries hit the same triangles and heights.
+# Run from the repository root, for example:
+#     python -m benchmarks.collision_grid "Course/Luigi_course.bco" --queries 20000
+# Without input files a synthetic terrain is used.
+import argparse
+import random
+from timeit import default_timer
+
+import numpy
+
+from lib.collision import Collision, bin_triangles
+from lib.BCOllider import RacetrackCollision
+import py_obj
+
+
+# The grid building and ray test helpers lib.collision used before, kept as the reference implementation
+def collides(face_v1, face_v2, face_v3, box_mid_x, box_mid_z, box_size_x, box_size_z):
+    half_x = box_size_x / 2.0
+    min_x = min(face_v1[0], face_v2[0], face_v3[0]) - box_mid_x
+    if min_x > +half_x:
+        return False
+    max_x = max(face_v1[0], face_v2[0], face_v3[0]) - box_mid_x
+    if max_x < -half_x:
+        return False
+
+    half_z = box_size_z / 2.0
+    min_z = min(face_v1[2], face_v2[2], face_v3[2]) - box_mid_z
+    if min_z > +half_z:
+        return False
+    max_z = max(face_v1[2], face_v2[2], face_v3[2]) - box_mid_z
+    if max_z < -half_z:
+        return False
+
+    return True
+
+
+def subdivide_grid(minx, minz,
+                   gridx_start, gridx_end, gridz_start, gridz_end,
+                   cell_size, triangles, vertices, result):
+    #print("Subdivision with", gridx_start, gridz_start, gridx_end, gridz_end, (gridx_start+gridx_end) // 2, (gridz_start+gridz_end) // 2)
+    if gridx_start == gridx_end-1 and gridz_start == gridz_end-1:
+        if gridx_start not in result:
+            result[gridx_start] = {}
+        result[gridx_start][gridz_start] = triangles
+
+        return True
+
+    # assert gridx_end > gridx_start or gridz_end > gridz_start
+
+    halfx = (gridx_start+gridx_end) // 2
+    halfz = (gridz_start+gridz_end) // 2
+
+    # x->
+    # 2 3 ^
+    # 0 1 z
+    coordinates = (
+        (0, gridx_start , halfx     , gridz_start   , halfz),   # Quadrant 0
+        (1, halfx       , gridx_end , gridz_start   , halfz),     # Quadrant 1
+        (2, gridx_start , halfx     , halfz         , gridz_end),     # Quadrant 2
+        (3, halfx       , gridx_end , halfz         , gridz_end) # Quadrant 3
+    )
+    skip = []
+    if gridx_start == halfx:
+        skip.append(0)
+        skip.append(2)
+    if halfx == gridx_end:
+        skip.append(1)
+        skip.append(3)
+    if gridz_start == halfz:
+        skip.append(0)
+        skip.append(1)
+    if halfz == gridz_end:
+        skip.append(2)
+        skip.append(3)
+
+    coordinates = [([], startx, endx, startz, endz)
+                   for quadrant_index, startx, endx, startz, endz in coordinates
+                   if quadrant_index not in skip]
+
+    for quadrant, startx, endx, startz, endz in coordinates:
+        area_size_x = (endx - startx) * cell_size
+        area_size_z = (endz - startz) * cell_size
+
+        box_mid_x = minx + startx * cell_size + area_size_x // 2
+        box_mid_z = minz + startz * cell_size + area_size_z // 2
+
+        for triangle in triangles:
+            _i, (v1_index, v2_index, v3_index, _coltype)= triangle
+
+            v1 = vertices[v1_index[0] - 1]
+            v2 = vertices[v2_index[0] - 1]
+            v3 = vertices[v3_index[0] - 1]
+
+            if collides(v1, v2, v3, box_mid_x, box_mid_z, area_size_x, area_size_z):
+                quadrant.append(triangle)
+
+    for quadrant, startx, endx, startz, endz in coordinates:
+        subdivide_grid(minx, minz, startx, endx, startz, endz, cell_size, quadrant, vertices,
+                       result)
+
+
+def normalize_vector(v1):
+    n = (v1[0]**2 + v1[1]**2 + v1[2]**2)**0.5
+    return v1[0]/n, v1[1]/n, v1[2]/n
+
+
+def create_vector(v1, v2):
+    return v2[0]-v1[0],v2[1]-v1[1],v2[2]-v1[2]
+
+
+def cross_product(v1, v2):
+    cross_x = v1[1]*v2[2] - v1[2]*v2[1]
+    cross_y = v1[2]*v2[0] - v1[0]*v2[2]
+    cross_z = v1[0]*v2[1] - v1[1]*v2[0]
+    return cross_x, cross_y, cross_z
+
+
+MAX_X = 200000
+MAX_Z = 200000
+
+
+def make_terrain(size, spacing=250.0, seed=0):
+    # Bumpy height field with a few overlapping bridges, faces in the format of py_obj.read_obj
+    rng = random.Random(seed)
+    verts = []
+    faces = []
+    half = size * spacing / 2.0
+
+    for ix in range(size + 1):
+        for iz in range(size + 1):
+            verts.append((ix*spacing - half, rng.uniform(-300.0, 300.0), iz*spacing - half))
+
+    def index(ix, iz):
+        return ix*(size + 1) + iz + 1
+
+    for ix in range(size):
+        for iz in range(size):
+            coltype = rng.choice((0x100, 0x200, 0x300, 0x1000))
+            faces.append(((index(ix, iz), None), (index(ix + 1, iz), None), (index(ix, iz + 1), None), coltype))
+            faces.append(((index(ix + 1, iz), None), (index(ix + 1, iz + 1), None), (index(ix, iz + 1), None), coltype))
+
+    for i in range(size // 4):
+        x, z = rng.uniform(-half, half), rng.uniform(-half, half)
+        length = rng.uniform(500.0, 5000.0)
+        y = rng.uniform(500.0, 2000.0)
+        start = len(verts) + 1
+        verts.extend(((x, y, z), (x + length, y, z), (x, y + 50.0, z + 400.0), (x + length, y + 50.0, z + 400.0)))
+        faces.append(((start, None), (start + 1, None), (start + 2, None), 0x100))
+        faces.append(((start + 1, None), (start + 3, None), (start + 2, None), 0x100))
+
+    return verts, faces
+
+
+def load_mesh(path):
+    if path.endswith(".obj"):
+        with open(path, "r") as f:
+            verts, faces, normals = py_obj.read_obj(f)
+        return verts, faces
+
+    bco_coll = RacetrackCollision()
+    with open(path, "rb") as f:
+        bco_coll.load_file(f)
+    faces = [((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type)
+             for v1, v2, v3, collision_type, rest in bco_coll.triangles]
+    return bco_coll.vertices, faces
+
+
+def build_subdivided_grid(verts, faces, cell_size=2000):
+    # The grid as it was built before, a fixed area split up recursively
+    grid = {}
+    triangles = [(i, face) for i, face in enumerate(faces)]
+    subdivide_grid(-MAX_X, -MAX_Z, 0, 2*MAX_X // cell_size, 0, 2*MAX_Z // cell_size, cell_size,
+                   triangles, verts, grid)
+    return grid
+
+
+def collide_faces(verts, triangles, hidden_coltypes, x, y, z, dir_y=-1.0):
+    # The ray test as Collision did it before the triangle planes were precomputed, one face at a time
+    hit = None
+    for i, face in triangles:
+        v1index, v2index, v3index = face[:3]
+        if len(face) > 3 and (face[3] in hidden_coltypes):
+            continue
+
+        v1 = verts[v1index[0]-1]
+        v2 = verts[v2index[0]-1]
+        v3 = verts[v3index[0]-1]
+
+        normal = cross_product(create_vector(v1, v2), create_vector(v1, v3))
+        if normal[0] == normal[1] == normal[2] == 0.0:
+            continue
+        normal = normalize_vector(normal)
+
+        D = -v1[0]*normal[0] + -v1[1]*normal[1] + -v1[2]*normal[2]
+
+        if normal[1]*dir_y == 0.0:
+            continue
+
+        t = -(normal[0] * x + normal[1] * y + normal[2] * z + D) / (normal[1]*dir_y)
+        point = x, (y+dir_y*t), z
+
+        vectest1 = cross_product(create_vector(v1, v2), create_vector(v1, point))
+        vectest2 = cross_product(create_vector(v2, v3), create_vector(v2, point))
+        vectest3 = cross_product(create_vector(v3, v1), create_vector(v3, point))
+
+        if ((normal[0]*vectest1[0] + normal[1]*vectest1[1] + normal[2]*vectest1[2]) >= 0 and
+                (normal[0]*vectest2[0] + normal[1]*vectest2[1] + normal[2]*vectest2[2]) >= 0 and
+                (normal[0]*vectest3[0] + normal[1]*vectest3[1] + normal[2]*vectest3[2]) >= 0):
+            height = point[1]
+
+            if hit is None or abs(y - height) < abs(y - hit):
+                hit = height
+
+    return hit
+
+
+def compare(collision, grid, verts, queries, seed=0):
+    rng = random.Random(seed)
+    xs = [vert[0] for vert in verts]
+    zs = [vert[2] for vert in verts]
+    min_x, max_x, min_z, max_z = min(xs), max(xs), min(zs), max(zs)
+    cell_size = collision.cell_size
+
+    mismatches = 0
+    for i in range(queries):
+        if i % 4 == 0:
+            # Exactly on cell borders and corners
+            x = rng.randint(int(min_x // cell_size) - 1, int(max_x // cell_size) + 1) * cell_size
+            z = rng.randint(int(min_z // cell_size) - 1, int(max_z // cell_size) + 1) * cell_size
+        else:
+            x = rng.uniform(min_x - cell_size, max_x + cell_size)
+            z = rng.uniform(min_z - cell_size, max_z + cell_size)
+        y = rng.uniform(-1000.0, 3000.0)
+
+        grid_x = int((x + MAX_X) // cell_size)
+        grid_z = int((z + MAX_Z) // cell_size)
+        if grid_x in grid and grid_z in grid[grid_x]:
+            old_triangles = grid[grid_x][grid_z]
+            old_result = collide_faces(verts, old_triangles, collision.hidden_coltypes, x, y, z)
+        else:
+            old_triangles = []
+            old_result = None
+
+        new_triangles = collision.get_cell_triangles(x, z) or []
+        new_result = collision.collide_ray_downwards(x, z, y)
+
+        if [i for i, face in old_triangles] != [i for i, face in new_triangles] or old_result != new_result:
+            mismatches += 1
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco or .obj collision files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+    parser.add_argument("--queries", type=int, default=5000,
+                        help="Number of random positions at which both grids are compared.")
+
+    args = parser.parse_args()
+
+    meshes = [(path, load_mesh(path)) for path in args.input]
+    if not meshes:
+        meshes.append(("terrain {0}x{0}".format(args.size), make_terrain(args.size)))
+
+    failed = False
+    for name, (verts, faces) in meshes:
+        collision = Collision(verts, faces)
+
+        vertices = numpy.array(verts, dtype=numpy.float64)
+        triangles = numpy.array([(face[0][0], face[1][0], face[2][0]) for face in faces]) - 1
+        start = default_timer()
+        bin_triangles(vertices, triangles, collision.cell_size)
+        new_time = default_timer() - start
+
+        start = default_timer()
+        grid = build_subdivided_grid(verts, faces)
+        old_time = default_timer() - start
+
+        mismatches = compare(collision, grid, verts, args.queries)
+        failed = failed or mismatches > 0
+
+        print("{0}: {1} triangles, subdivision {2:.2f}s, binning {3:.4f}s, {4} of {5} queries differ".format(
+            name, len(faces), old_time, new_time, mismatches, args.queries))
+
+    if failed:
+        raise SystemExit(1)
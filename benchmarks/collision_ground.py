@@ -0,0 +1,111 @@
+# Compares grounding many positions one face at a time as Collision used to, one position at a time
+# (collide_ray_downwards, collide_ray_closest) and with the batch queries of Collision, and checks
+# that all of them give the same heights.
+# Run from the repository root, for example:
+#     python -m benchmarks.collision_ground "Course/Luigi_course.bco" --queries 20000
+# Without input files a synthetic terrain is used.
+import argparse
+import math
+import random
+from timeit import default_timer
+
+import numpy
+
+from lib.collision import Collision
+from benchmarks.collision_grid import make_terrain, load_mesh, collide_faces
+
+
+def make_positions(verts, cell_size, count, seed=0):
+    rng = random.Random(seed)
+    xs = [vert[0] for vert in verts]
+    zs = [vert[2] for vert in verts]
+    min_x, max_x, min_z, max_z = min(xs), max(xs), min(zs), max(zs)
+
+    positions = []
+    for i in range(count):
+        if i % 4 == 0:
+            # Exactly on cell borders and corners
+            x = rng.randint(int(min_x // cell_size) - 1, int(max_x // cell_size) + 1) * cell_size
+            z = rng.randint(int(min_z // cell_size) - 1, int(max_z // cell_size) + 1) * cell_size
+        else:
+            x = rng.uniform(min_x - cell_size, max_x + cell_size)
+            z = rng.uniform(min_z - cell_size, max_z + cell_size)
+        positions.append((float(x), rng.uniform(-1000.0, 3000.0), float(z)))
+
+    return positions
+
+
+def count_mismatches(expected, heights):
+    mismatches = 0
+    for height, batch_height in zip(expected, heights):
+        if height is None:
+            if not math.isnan(batch_height):
+                mismatches += 1
+        elif height != batch_height:
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco or .obj collision files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+    parser.add_argument("--queries", type=int, default=5000,
+                        help="Number of positions that are grounded.")
+    parser.add_argument("--hide", type=lambda value: int(value, 0), action="append", default=[],
+                        help="Collision type that is hidden, can be given several times.")
+
+    args = parser.parse_args()
+
+    meshes = [(path, load_mesh(path)) for path in args.input]
+    if not meshes:
+        meshes.append(("terrain {0}x{0}".format(args.size), make_terrain(args.size)))
+
+    failed = False
+    for name, (verts, faces) in meshes:
+        collision = Collision(verts, faces)
+        collision.hidden_coltypes = set(args.hide)
+
+        positions = make_positions(verts, collision.cell_size, args.queries)
+        xs = numpy.array([x for x, y, z in positions])
+        ys = numpy.array([y for x, y, z in positions])
+        zs = numpy.array([z for x, y, z in positions])
+
+        for label, single, many, with_y in (
+                ("downwards", collision.collide_ray_downwards, collision.collide_rays_down_many, False),
+                ("closest", collision.collide_ray_closest, collision.collide_rays_closest_many, True)):
+            start = default_timer()
+            expected = []
+            for x, y, z in positions:
+                triangles = collision.get_cell_triangles(x, z)
+                if triangles is None:
+                    expected.append(None)
+                else:
+                    expected.append(collide_faces(verts, triangles, collision.hidden_coltypes,
+                                                  x, y if with_y else 99999999, z))
+            reference_time = default_timer() - start
+
+            start = default_timer()
+            if with_y:
+                results = [single(x, z, y) for x, y, z in positions]
+            else:
+                results = [single(x, z) for x, y, z in positions]
+            single_time = default_timer() - start
+
+            start = default_timer()
+            heights = many(xs, ys if with_y else None, zs)
+            batch_time = default_timer() - start
+
+            single_mismatches = sum(1 for height, result in zip(expected, results) if height != result)
+            batch_mismatches = count_mismatches(expected, heights)
+            failed = failed or single_mismatches > 0 or batch_mismatches > 0
+
+            print("{0} ({1}): {2} triangles, per face {3:.3f}s, per position {4:.3f}s, batch {5:.4f}s, "
+                  "{6} and {7} of {8} heights differ".format(
+                      name, label, len(faces), reference_time, single_time, batch_time,
+                      single_mismatches, batch_mismatches, len(positions)))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,113 @@
+# Compares picking with rays of the 3D view through the bounding volume hierarchy of Collision
+# against testing every triangle with Line.collide, and checks that both find the same points.
+# Run from the repository root, for example:
+#     python -m benchmarks.collision_pick "Course/Luigi_course.bco" --rays 500
+# Without input files a synthetic terrain is used.
+import argparse
+import random
+from timeit import default_timer
+
+from lib.collision import Collision
+from lib.vectors import Vector3, Triangle, Line
+from benchmarks.collision_grid import make_terrain, load_mesh
+
+
+def make_triangles(verts, faces):
+    # The triangles as Collision used to keep them, in the coordinates of the 3D view
+    triangles = []
+    for face in faces:
+        corners = []
+        for index in face[:3]:
+            x, y, z = verts[index[0]-1]
+            corners.append(Vector3(x, -z, y))
+        triangles.append(Triangle(*corners))
+    return triangles
+
+
+def collide_linear(triangles, ray):
+    best_distance = None
+    place_at = None
+
+    for tri in triangles:
+        collision = ray.collide(tri)
+
+        if collision is not False:
+            point, distance = collision
+
+            if best_distance is None or distance < best_distance:
+                place_at = point
+                best_distance = distance
+
+    return place_at
+
+
+def make_rays(verts, count, seed=0):
+    rng = random.Random(seed)
+    xs = [vert[0] for vert in verts]
+    zs = [vert[2] for vert in verts]
+    min_x, max_x, min_z, max_z = min(xs), max(xs), min(zs), max(zs)
+
+    rays = []
+    for i in range(count):
+        x, z = rng.uniform(min_x, max_x), rng.uniform(min_z, max_z)
+        if i % 5 == 0:
+            # Straight down, the way the top down view looks
+            origin, direction = Vector3(x, -z, 5000.0), Vector3(0.0, 0.0, -1.0)
+        elif i % 5 == 1:
+            # Flat along the ground from outside of the course
+            origin = Vector3(min_x - 1000.0, -z, rng.uniform(-300.0, 300.0))
+            direction = Vector3(1.0, rng.uniform(-0.2, 0.2), 0.0)
+        else:
+            origin = Vector3(x, -z, rng.uniform(1000.0, 8000.0))
+            direction = Vector3(rng.uniform(-1.0, 1.0), rng.uniform(-1.0, 1.0), rng.uniform(-1.0, -0.1))
+        rays.append(Line(origin, direction))
+
+    return rays
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco or .obj collision files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+    parser.add_argument("--rays", type=int, default=200,
+                        help="Number of rays that are cast.")
+
+    args = parser.parse_args()
+
+    meshes = [(path, load_mesh(path)) for path in args.input]
+    if not meshes:
+        meshes.append(("terrain {0}x{0}".format(args.size), make_terrain(args.size)))
+
+    failed = False
+    for name, (verts, faces) in meshes:
+        collision = Collision(verts, faces)
+        triangles = make_triangles(verts, faces)
+        rays = make_rays(verts, args.rays)
+
+        start = default_timer()
+        expected = [collide_linear(triangles, ray) for ray in rays]
+        linear_time = default_timer() - start
+
+        start = default_timer()
+        collision.collide_ray(rays[0])
+        build_time = default_timer() - start
+
+        start = default_timer()
+        results = [collision.collide_ray(ray) for ray in rays]
+        bvh_time = default_timer() - start
+
+        mismatches = 0
+        for point, result in zip(expected, results):
+            if (point is None) != (result is None) or (point is not None and point != result):
+                mismatches += 1
+        failed = failed or mismatches > 0
+
+        print("{0}: {1} triangles, linear {2:.2f}ms per ray, hierarchy built in {3:.3f}s, {4:.3f}ms per ray, "
+              "{5} hits, {6} of {7} rays differ".format(
+                  name, len(faces), linear_time*1000/len(rays), build_time, bvh_time*1000/len(rays),
+                  sum(1 for point in expected if point is not None), mismatches, len(rays)))
+
+    if failed:
+        raise SystemExit(1)
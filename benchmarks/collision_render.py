@@ -0,0 +1,133 @@
+# Compares setting up and drawing the collision model from one vertex buffer (CollisionModel) against the
+# per vertex display lists it replaced, and checks that both draw the same image with a hidden and a
+# highlighted collision type. Needs EGL, see benchmarks.gl_context.
+# Run from the repository root, for example:
+#     python -m benchmarks.collision_render "Course/Luigi_course.bco"
+# Without input files a synthetic terrain is used.
+from benchmarks.gl_context import create_context, read_pixels, look_down_at
+import argparse
+import builtins
+from timeit import default_timer
+
+import numpy
+from OpenGL.GL import *
+
+from lib.collision import CollisionGeometry
+from lib.model_rendering import CollisionModel, colortypes, otherwise
+from benchmarks.collision_grid import make_terrain, load_mesh
+
+SIZE = 512
+
+
+def generate_displists(model):
+    # The display lists as CollisionModel built them before, one glVertexAttrib3f/glVertex3f call per value
+    geometry = model.geometry
+    corners = geometry.corners[:, :, [0, 2, 1]].tolist()
+    normals = (geometry.normals * numpy.array((-1.0, -1.0, 1.0))).tolist()
+    displists = []
+
+    for meshtype, (start, end) in geometry.type_ranges.items():
+        shift = meshtype >> 8
+        if shift in colortypes:
+            color = colortypes[shift]
+        else:
+            color = otherwise
+        color = (color[0]/255.0, color[1]/255.0, color[2]/255.0)
+
+        displist = glGenLists(1)
+        glNewList(displist, GL_COMPILE)
+        glBegin(GL_TRIANGLES)
+
+        for i in geometry.type_order[start:end].tolist():
+            normal = normals[i]
+            for vertex in corners[i]:
+                glVertexAttrib3f(3, *normal)
+                glVertexAttrib3f(4, *color)
+                glVertex3f(*vertex)
+
+        glEnd()
+        glEndList()
+
+        displists.append((meshtype, displist))
+
+    return displists
+
+
+def render_displists(model, displists, selected_part):
+    factorval = glGetUniformLocation(model.program, "interpolate")
+    glUseProgram(model.program)
+    for colltype, displist in displists:
+        if (colltype in model.hidden_collision_types
+                or colltype & 0xFF00 in model.hidden_collision_type_groups):
+            continue
+        glUniform1f(factorval, 1.0 if colltype == selected_part else 0.0)
+        glCallList(displist)
+    glUseProgram(0)
+
+
+def draw(render, frames):
+    # Draws the frame a few times, returns the image and the average time per frame
+    start = default_timer()
+    for i in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        render()
+    glFinish()
+    return read_pixels(SIZE, SIZE), (default_timer() - start) / frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco or .obj collision files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+    parser.add_argument("--frames", type=int, default=20,
+                        help="Number of frames drawn with each renderer.")
+
+    args = parser.parse_args()
+
+    meshes = [(path, load_mesh(path)) for path in args.input]
+    if not meshes:
+        meshes.append(("terrain {0}x{0}".format(args.size), make_terrain(args.size)))
+
+    create_context(SIZE, SIZE)
+    glEnable(GL_DEPTH_TEST)
+    glClearColor(0.0, 0.0, 0.0, 1.0)
+
+    failed = False
+    for name, (verts, faces) in meshes:
+        geometry = CollisionGeometry.from_faces(verts, faces)
+        geometry.prepare_rendering()
+        look_down_at(*geometry.bounds)
+
+        model = CollisionModel(geometry)
+        model.create_shaders()
+        types = model.collision_types
+        # Hide one type and highlight another, if there are enough types
+        model.hidden_collision_types = set(types[:1]) if len(types) > 2 else set()
+        selected_part = types[-1]
+
+        start = default_timer()
+        displists = generate_displists(model)
+        glFinish()
+        displist_time = default_timer() - start
+
+        start = default_timer()
+        model.generate_buffers()
+        glFinish()
+        buffer_time = default_timer() - start
+
+        old_image, old_frame = draw(lambda: render_displists(model, displists, selected_part), args.frames)
+        new_image, new_frame = draw(lambda: model.render(selectedPart=selected_part), args.frames)
+
+        differing = int(numpy.count_nonzero((old_image != new_image).any(axis=2)))
+        drawn = int(numpy.count_nonzero(new_image[:, :, :3].any(axis=2)))
+        failed = failed or differing > 0 or drawn == 0
+
+        print("{0}: {1} triangles, display lists {2:.2f}s, vertex buffer {3:.4f}s, frame {4:.2f} ms vs "
+              "{5:.2f} ms, {6} of {7} drawn pixels differ".format(
+                  name, len(geometry.triangles), displist_time, buffer_time, old_frame * 1000,
+                  new_frame * 1000, differing, drawn))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,179 @@
+# Compares drawing routes and their point markers the way the level view draws them with and without
+# culling what is out of view (lib.culling), in the top down view zoomed in on a corner and in the 3D view
+# looking across the course. Both have to draw the same image. Needs EGL, see benchmarks.gl_context.
+# Run from the repository root, for example:
+#     python -m benchmarks.culling --routes 300
+from benchmarks.gl_context import create_context, read_pixels
+import argparse
+import random
+from math import cos, sin
+from timeit import default_timer
+
+import numpy
+from OpenGL.GL import *
+from OpenGL.GLU import gluPerspective, gluLookAt
+
+from lib.culling import Frustum, GroupBounds, CullStats
+from lib.libbol import Rotation
+from lib.line_geometry import GeometryCache, route_lines
+from lib.model_rendering import LineBatch
+from lib.object_models import ObjectModels
+from lib.vectors import Vector3
+from mkdd_widgets import BolMapViewer, GROUP_BOUNDS_PADDING, route_point_positions
+
+SIZE = 512
+
+
+class Route(object):
+    def __init__(self, points):
+        self.points = points
+
+
+class RoutePoint(object):
+    def __init__(self, position):
+        self.position = position
+
+
+class Object(object):
+    def __init__(self, position, rotation):
+        self.position = position
+        self.rotation = rotation
+
+
+class View(object):
+    # Holds what the methods of BolMapViewer borrowed here use
+    group_visible = BolMapViewer.group_visible
+    group_lines = BolMapViewer.group_lines
+    draw_lines = BolMapViewer.draw_lines
+
+    def __init__(self, models):
+        self.models = models
+        self.frustum = None
+        self.group_bounds = GroupBounds(GROUP_BOUNDS_PADDING)
+        self.cull_stats = CullStats()
+        self.line_geometry = GeometryCache()
+        self.lines = LineBatch()
+        self.wide_lines = LineBatch()
+
+
+def make_scene(routes, points, objects, area, seed=0):
+    rng = random.Random(seed)
+    route_list = []
+    for i in range(routes):
+        x, z = rng.uniform(-area, area), rng.uniform(-area, area)
+        route_points = []
+        for j in range(points):
+            x += rng.uniform(-800.0, 800.0)
+            z += rng.uniform(-800.0, 800.0)
+            route_points.append(RoutePoint(Vector3(x, rng.uniform(-300.0, 300.0), z)))
+        route_list.append(Route(route_points))
+
+    object_list = [Object(Vector3(rng.uniform(-area, area), rng.uniform(-300.0, 300.0), rng.uniform(-area, area)),
+                          Rotation.from_mkdd_rotation(*[rng.randint(-10000, 10000) for j in range(6)]))
+                   for i in range(objects)]
+    return route_list, object_list
+
+
+def render(view, models, routes, objects, cull):
+    # Like BolMapViewer.paintGL draws object routes and objects
+    view.cull_stats.reset()
+    frustum = view.frustum if cull else None
+    for route in routes:
+        if cull and not view.group_visible(route, route.points, route_point_positions, set()):
+            continue
+        for point in route.points:
+            models.render_generic_position_colored(point.position, False, "objectpoint")
+        lines, arrows = view.group_lines(route, route_point_positions, route_lines, set())
+        view.lines.add(lines, (0.0, 0.0, 0.0))
+        models.arrow_heads.add(arrows)
+    view.draw_lines()
+
+    for obj in objects:
+        models.render_generic_position_rotation_colored("objects", obj.position, obj.rotation, False)
+    models.render_markers(frustum, view.cull_stats)
+
+
+def top_down(zoom, offset_x, offset_z):
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    camera_size = SIZE*zoom
+    glOrtho(-camera_size / 2 - offset_x, camera_size / 2 - offset_x,
+            -camera_size / 2 + offset_z, camera_size / 2 + offset_z, -120000.0, 80000.0)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+
+
+def perspective(x, z, height, horiz, vertical):
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    gluPerspective(75, 1.0, 256.0, 160000.0)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    look_direction = Vector3(cos(horiz), sin(horiz), sin(vertical))
+    fac = 1.01 - abs(look_direction.z)
+    gluLookAt(x, z, height, x + look_direction.x * fac, z + look_direction.y * fac, height + look_direction.z,
+              0, 0, 1)
+
+
+def current_mvp():
+    modelview = numpy.transpose(numpy.reshape(glGetFloatv(GL_MODELVIEW_MATRIX), (4, 4)))
+    projection = numpy.transpose(numpy.reshape(glGetFloatv(GL_PROJECTION_MATRIX), (4, 4)))
+    return numpy.dot(projection, modelview)
+
+
+def draw(view, models, routes, objects, cull, frames):
+    # Returns the image of the last frame and the average time per frame
+    start = default_timer()
+    for i in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        view.frustum = Frustum(current_mvp())
+        render(view, models, routes, objects, cull)
+    image = read_pixels(SIZE, SIZE)
+    return image, (default_timer() - start) / frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=300,
+                        help="Number of object routes in the scene.")
+    parser.add_argument("--points", type=int, default=15,
+                        help="Number of points per route.")
+    parser.add_argument("--objects", type=int, default=1000,
+                        help="Number of objects in the scene.")
+    parser.add_argument("--frames", type=int, default=10,
+                        help="Number of frames drawn with and without culling.")
+
+    args = parser.parse_args()
+
+    create_context(SIZE, SIZE)
+    glEnable(GL_DEPTH_TEST)
+    glEnable(GL_ALPHA_TEST)
+    glAlphaFunc(GL_GEQUAL, 0.5)
+    glClearColor(1.0, 1.0, 1.0, 1.0)
+
+    models = ObjectModels()
+    models.init_gl()
+    area = 40000.0
+    routes, objects = make_scene(args.routes, args.points, args.objects, area)
+
+    views = (("top down, whole course", lambda: top_down(area*2.4 / SIZE, 0.0, 0.0)),
+             ("top down, zoomed in on a corner", lambda: top_down(10.0, area*0.8, area*0.8)),
+             ("3D, looking across the course", lambda: perspective(-area, -area, 1500.0, 0.785, -0.2)),
+             ("3D, looking at the ground", lambda: perspective(0.0, 0.0, 4000.0, 1.57, -1.4)))
+
+    failed = False
+    for name, setup in views:
+        setup()
+        view = View(models)
+        old_image, old_time = draw(view, models, routes, objects, False, args.frames)
+        new_image, new_time = draw(view, models, routes, objects, True, args.frames)
+
+        differing = int(numpy.count_nonzero((old_image != new_image).any(axis=2)))
+        drawn = int(numpy.count_nonzero((new_image[:, :, :3] != 0xFF).any(axis=2)))
+        failed = failed or differing > 0 or drawn == 0
+
+        print("{0}: frame {1:.1f} ms vs {2:.1f} ms culled, {3}, {4} of {5} drawn pixels differ".format(
+            name, old_time * 1000, new_time * 1000, view.cull_stats, differing, drawn))
+
+    if failed:
+        raise SystemExit(1)
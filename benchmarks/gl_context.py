@@ -0,0 +1,57 @@
+# Offscreen OpenGL for the benchmarks that render, through EGL without a window system. Import this module
+# before anything that imports OpenGL, PyOpenGL picks its platform on the first import.
+import ctypes
+import os
+
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+from OpenGL import EGL
+from OpenGL.GL import *
+import numpy
+
+
+def create_context(width, height):
+    # Makes a compatibility profile context with a width x height framebuffer current and returns it
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("Couldn't initialize EGL")
+
+    attributes = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                  EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8, EGL.EGL_DEPTH_SIZE, 24,
+                  EGL.EGL_NONE]
+    config = EGL.EGLConfig()
+    count = EGL.EGLint()
+    EGL.eglChooseConfig(display, (EGL.EGLint*len(attributes))(*attributes), ctypes.pointer(config), 1,
+                        ctypes.pointer(count))
+    if count.value == 0:
+        raise RuntimeError("No EGL config for an OpenGL pbuffer")
+
+    surface_attributes = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE]
+    surface = EGL.eglCreatePbufferSurface(display, config,
+                                          (EGL.EGLint*len(surface_attributes))(*surface_attributes))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("Couldn't make the EGL context current")
+
+    glViewport(0, 0, width, height)
+    return context
+
+
+def read_pixels(width, height):
+    glFinish()
+    data = glReadPixels(0, 0, width, height, GL_RGBA, GL_UNSIGNED_BYTE)
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(height, width, 4)
+
+
+def look_down_at(bounds_min, bounds_max):
+    # Projection that shows the area between the bounds from above, with x and z of the collision
+    # mapped like the 3D view maps them (z and y swapped)
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    glOrtho(bounds_min[0], bounds_max[0], bounds_min[2], bounds_max[2],
+            -bounds_max[1] - 1.0, -bounds_min[1] + 1.0)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
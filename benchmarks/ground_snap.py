@@ -0,0 +1,109 @@
+# Drags a few hundred positions across the collision the way the editor does with "Ground Objects While
+# Moving" (lib.ground_snap), reports the time spent grounding per frame and checks that every position ends
+# up at the height a single collide_ray_closest query gives.
+# Run from the repository root, for example:
+#     python -m benchmarks.ground_snap "Course/Luigi_course.bco" --positions 500
+# Without input files a synthetic terrain is used.
+import argparse
+import builtins
+import random
+
+from lib.collision import Collision
+from lib.ground_snap import GroundSnapper, DEFAULT_SNAP_BUDGET
+from lib.vectors import Vector3
+from benchmarks.collision_grid import make_terrain, load_mesh
+
+
+def make_positions(collision, count, seed=0):
+    # A cluster of positions around a random spot, like a selected group of points
+    rng = random.Random(seed)
+    bounds_min, bounds_max = collision.geometry.bounds
+    center_x = rng.uniform(bounds_min[0], bounds_max[0])
+    center_z = rng.uniform(bounds_min[2], bounds_max[2])
+    spread = 0.05 * max(bounds_max[0] - bounds_min[0], bounds_max[2] - bounds_min[2])
+    return [Vector3(center_x + rng.uniform(-spread, spread), rng.uniform(bounds_min[1], bounds_max[1]),
+                    center_z + rng.uniform(-spread, spread))
+            for i in range(count)]
+
+
+def drag(collision, positions, frames, budget, seed=0):
+    # Moves all positions by the same small step every frame. Returns the grounding time of every frame.
+    rng = random.Random(seed)
+    snapper = GroundSnapper(budget)
+    times = []
+    step_x, step_z = rng.uniform(-50.0, 50.0), rng.uniform(-50.0, 50.0)
+    for i in range(frames):
+        for pos in positions:
+            pos.x += step_x
+            pos.z += step_z
+        snapper.move(positions)
+        grounded, seconds = snapper.step(collision)
+        times.append(seconds)
+
+    # What the editor does after the drag stops
+    while snapper.pending > 0:
+        snapper.step(collision)
+
+    return times
+
+
+def count_mismatches(collision, positions, heights_before):
+    # The height a position must end at, queried from its height before the last grounding
+    mismatches = 0
+    for pos, y in zip(positions, heights_before):
+        expected = collision.collide_ray_closest(pos.x, pos.z, y)
+        if expected is None:
+            expected = y
+        if expected != pos.y:
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .bco or .obj collision files. A synthetic terrain is used if none are given.")
+    parser.add_argument("--size", type=int, default=120,
+                        help="Number of quads along each side of the synthetic terrain.")
+    parser.add_argument("--positions", type=int, default=500,
+                        help="Number of dragged positions.")
+    parser.add_argument("--frames", type=int, default=120,
+                        help="Number of frames the positions are dragged for.")
+    parser.add_argument("--budget", type=float, default=DEFAULT_SNAP_BUDGET * 1000,
+                        help="Time budget for grounding per frame in milliseconds.")
+
+    args = parser.parse_args()
+
+    meshes = [(path, load_mesh(path)) for path in args.input]
+    if not meshes:
+        meshes.append(("terrain {0}x{0}".format(args.size), make_terrain(args.size)))
+
+    failed = False
+    for name, (verts, faces) in meshes:
+        print_bk = builtins.print
+        builtins.print = lambda *args, **kwargs: None
+        try:
+            collision = Collision(verts, faces)
+        finally:
+            builtins.print = print_bk
+
+        positions = make_positions(collision, args.positions)
+        times = drag(collision, positions, args.frames, args.budget / 1000)
+
+        # One more frame without moving, after which every position has to be on the ground
+        heights_before = [pos.y for pos in positions]
+        snapper = GroundSnapper(args.budget / 1000)
+        snapper.move(positions)
+        while snapper.pending > 0:
+            snapper.step(collision)
+        mismatches = count_mismatches(collision, positions, heights_before)
+        failed = failed or mismatches > 0
+
+        times.sort()
+        print("{0}: {1} triangles, {2} positions over {3} frames, grounding per frame median {4:.2f} ms, "
+              "max {5:.2f} ms, {6} of {2} heights differ".format(
+                  name, len(faces), len(positions), len(times), times[len(times) // 2] * 1000,
+                  times[-1] * 1000, mismatches))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,167 @@
+# Compares drawing point and object markers with instanced draw calls (lib.model_rendering.InstancedMarkers)
+# against drawing each marker with its own matrix and display list call, for the visible pass and for the
+# color id pass that picking reads. Checks that both draw the same image, up to the differences allowed
+# below. Needs EGL, see benchmarks.gl_context. The submit times are the time until all calls for a frame
+# returned, the frame times include waiting for the frame to be drawn.
+# Run from the repository root, for example:
+#     python -m benchmarks.markers --markers 5000
+from benchmarks.gl_context import create_context, read_pixels
+import argparse
+import random
+from timeit import default_timer
+
+import numpy
+from OpenGL.GL import *
+from OpenGL.GLU import gluPerspective, gluLookAt
+
+from lib.libbol import Rotation
+from lib.object_models import ObjectModels
+from lib.vectors import Vector3
+
+SIZE = 512
+CUBE_KINDS = ("enemypoint", "objectpoint", "camerapoint", "checkpointleft", "checkpointright", "unusedpoint")
+OBJECT_KINDS = ("objects", "startpoints", "areas", "camera", "respawn")
+
+
+def make_markers(count, area, seed=0):
+    # (kind, position, rotation, selected), a fifth of them are objects with a rotation
+    rng = random.Random(seed)
+    markers = []
+    for i in range(count):
+        position = Vector3(rng.uniform(-area, area), rng.uniform(-500.0, 500.0), rng.uniform(-area, area))
+        selected = rng.random() < 0.1
+        if i % 5 == 0:
+            rotation = Rotation.from_mkdd_rotation(*[rng.randint(-10000, 10000) for j in range(6)])
+            markers.append((rng.choice(OBJECT_KINDS), position, rotation, selected))
+        else:
+            markers.append((rng.choice(CUBE_KINDS), position, None, selected))
+    return markers
+
+
+def render_immediate(models, markers):
+    # The markers as ObjectModels drew them before, one matrix and display list call each
+    for kind, position, rotation, selected in markers:
+        glPushMatrix()
+        glTranslatef(position.x, -position.z, position.y)
+        if rotation is None:
+            getattr(models, kind).render(selected=selected)
+        else:
+            glMultMatrixf(rotation.mtx)
+            glColor3f(0.0, 0.0, 0.0)
+            glBegin(GL_LINE_STRIP)
+            glVertex3f(0.0, 0.0, 750.0)
+            glVertex3f(0.0, 0.0, 0.0)
+            glVertex3f(1000.0, 0.0, 0.0)
+            glEnd()
+            getattr(models, kind).render(selected=selected)
+        glPopMatrix()
+
+
+def render_immediate_coloredid(models, markers):
+    for i, (kind, position, rotation, selected) in enumerate(markers):
+        glPushMatrix()
+        glTranslatef(position.x, -position.z, position.y)
+        if rotation is None:
+            models.cube.render_coloredid(0x100000 + i*4)
+        else:
+            glMultMatrixf(rotation.mtx)
+            models.generic.render_coloredid(0x100000 + i*4)
+        glPopMatrix()
+
+
+def render_instanced(models, markers):
+    for kind, position, rotation, selected in markers:
+        if rotation is None:
+            models.render_generic_position_colored(position, selected, kind)
+        else:
+            models.render_generic_position_rotation_colored(kind, position, rotation, selected)
+    models.render_markers()
+
+
+def render_instanced_coloredid(models, markers):
+    for i, (kind, position, rotation, selected) in enumerate(markers):
+        if rotation is None:
+            models.render_generic_position_colored_id(position, 0x100000 + i*4)
+        else:
+            models.render_generic_position_rotation_colored_id(position, rotation, 0x100000 + i*4)
+    models.render_markers_coloredid()
+
+
+def draw(render, frames):
+    # Returns the image of the last frame, the average submit time and the average time per frame
+    submit_time = 0.0
+    start = default_timer()
+    for i in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        submit_start = default_timer()
+        render()
+        submit_time += default_timer() - submit_start
+    image = read_pixels(SIZE, SIZE)
+    return image, submit_time / frames, (default_timer() - start) / frames
+
+
+def look_at_markers(area):
+    # Like the 3D view looking down at the area at an angle
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    gluPerspective(75, 1.0, 256.0, 160000.0)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    gluLookAt(0.0, -area*1.6, area*0.9, 0.0, 0.0, 0.0, 0, 0, 1)
+
+
+def compare(models, markers, frames):
+    # Returns the timings of both renderers for both passes and how many of the drawn pixels differ
+    glClearColor(1.0, 1.0, 1.0, 1.0)
+    results = []
+    for render, render_coloredid in ((render_immediate, render_immediate_coloredid),
+                                     (render_instanced, render_instanced_coloredid)):
+        image, submit_time, frame_time = draw(lambda: render(models, markers), frames)
+        ids, id_submit_time, id_frame_time = draw(lambda: render_coloredid(models, markers), frames)
+        results.append((image, ids, (submit_time, frame_time, id_submit_time, id_frame_time)))
+
+    (old_image, old_ids, old_times), (new_image, new_ids, new_times) = results
+    differing = int(numpy.count_nonzero((old_image != new_image).any(axis=2)))
+    differing_ids = int(numpy.count_nonzero((old_ids != new_ids).any(axis=2)))
+    drawn = int(numpy.count_nonzero((new_image[:, :, :3] != 0xFF).any(axis=2)))
+    return old_times, new_times, differing, differing_ids, drawn
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--markers", type=int, default=5000,
+                        help="Number of markers drawn in the timed scene.")
+    parser.add_argument("--frames", type=int, default=10,
+                        help="Number of frames drawn with each renderer.")
+
+    args = parser.parse_args()
+
+    create_context(SIZE, SIZE)
+    glEnable(GL_DEPTH_TEST)
+    glEnable(GL_ALPHA_TEST)
+    glAlphaFunc(GL_GEQUAL, 0.5)
+
+    models = ObjectModels()
+    models.init_gl()
+
+    failed = False
+    # Both renderers have to draw the same pixels except where coplanar surfaces of a marker fight over depth,
+    # whose rounding differs between the fixed function matrix stack and the shader. The sparse scene is
+    # spread out so that hardly any markers overlap. In the dense one the visible pass may also differ where
+    # markers overlap, the outlines of overlapping markers are layered differently (see InstancedMarkers),
+    # which was about 8% of the drawn pixels with the default 5000 markers. The id pass doesn't depend on
+    # the order and has to match in both.
+    for name, count, area, tolerance in (("sparse", 100, 15000.0, 0.01), ("dense", args.markers, 20000.0, 0.1)):
+        markers = make_markers(count, area)
+        look_at_markers(area)
+        old_times, new_times, differing, differing_ids, drawn = compare(models, markers, args.frames)
+        failed = failed or differing > drawn * tolerance or differing_ids > drawn // 100 or drawn == 0
+
+        times = [value * 1000 for pair in zip(old_times, new_times) for value in pair]
+        print("{0}: {1} markers, visible pass submit {2:.1f} ms vs {3:.1f} ms, frame {4:.1f} ms vs {5:.1f} ms, "
+              "id pass submit {6:.1f} ms vs {7:.1f} ms, frame {8:.1f} ms vs {9:.1f} ms, "
+              "{10} and {11} of {12} drawn pixels differ".format(
+                  name, count, *times, differing, differing_ids, drawn))
+
+    if failed:
+        raise SystemExit(1)
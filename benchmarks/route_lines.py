@@ -0,0 +1,217 @@
+# Compares drawing the lines and arrow heads of routes, enemy point groups and checkpoints from cached
+# arrays (lib.line_geometry) in one call per kind against drawing every segment and arrow head with its own
+# calls, as the level view did before. Checks that both draw the same image. Needs EGL, see
+# benchmarks.gl_context. Run from the repository root, for example:
+#     python -m benchmarks.route_lines --routes 300
+from benchmarks.gl_context import create_context, read_pixels
+import argparse
+import random
+from timeit import default_timer
+
+import numpy
+from OpenGL.GL import *
+
+from lib.line_geometry import route_lines, checkpoint_lines, enemy_group_links
+from lib.object_models import ObjectModels
+from lib.vectors import Vector3
+from mkdd_widgets import route_point_positions, checkpoint_positions, colors
+from benchmarks.culling import View, Route, RoutePoint, top_down, SIZE
+
+
+class EnemyPoint(RoutePoint):
+    def __init__(self, position, link):
+        super().__init__(position)
+        self.link = link
+
+
+class EnemyPointGroup(Route):
+    def __init__(self, id, points):
+        super().__init__(points)
+        self.id = id
+
+
+class Checkpoint(object):
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+def make_scene(routes, points, area, seed=0):
+    # Routes, enemy point groups linked in a loop and groups of checkpoints along winding paths
+    rng = random.Random(seed)
+
+    def path(count):
+        x, z = rng.uniform(-area, area), rng.uniform(-area, area)
+        positions = []
+        for i in range(count):
+            x += rng.uniform(-800.0, 800.0)
+            z += rng.uniform(-800.0, 800.0)
+            positions.append(Vector3(x, rng.uniform(-300.0, 300.0), z))
+        return positions
+
+    route_list = [Route([RoutePoint(position) for position in path(points)]) for i in range(routes)]
+    # Some routes have points on top of each other, whose arrow heads are not rotated
+    for route in route_list[::10]:
+        route.points.append(RoutePoint(route.points[-1].position.copy()))
+
+    enemy_groups = []
+    for i in range(routes // 10):
+        positions = path(points)
+        enemy_points = [EnemyPoint(position, -1) for position in positions]
+        enemy_points[0].link = i
+        enemy_points[-1].link = (i + 1) % (routes // 10)
+        enemy_groups.append(EnemyPointGroup(i, enemy_points))
+
+    checkpoint_groups = []
+    for i in range(routes // 10):
+        checkpoint_groups.append(Route([Checkpoint(position, position + Vector3(600.0, 0.0, 600.0))
+                                        for position in path(points)]))
+    return route_list, enemy_groups, checkpoint_groups
+
+
+def render_immediate(view, models, routes, enemy_groups, checkpoint_groups):
+    # The lines as BolMapViewer.paintGL drew them before, a begin/end pair per line and a matrix per arrow head
+    for i, route in enumerate(routes):
+        selected = i % 7 == 0
+        last_point = None
+        glColor3f(0.0, 0.0, 0.0)
+        for point in route.points:
+            if last_point is not None:
+                models.draw_arrow_head(last_point.position, point.position)
+            last_point = point
+        if selected:
+            glLineWidth(3.0)
+        glBegin(GL_LINE_STRIP)
+        glColor3f(0.0, 0.0, 0.0)
+        for point in route.points:
+            pos = point.position
+            glVertex3f(pos.x, -pos.z, pos.y)
+        glEnd()
+        if selected:
+            glLineWidth(1.0)
+
+    for group in enemy_groups:
+        glBegin(GL_LINE_STRIP)
+        glColor3f(0.0, 0.0, 0.0)
+        for point in group.points:
+            pos = point.position
+            glVertex3f(pos.x, -pos.z, pos.y)
+        glEnd()
+    for group, group_b, color, line in enemy_group_links(enemy_groups):
+        point_a, point_b = group.points[-1], group_b.points[0]
+        glColor3f(*color)
+        glBegin(GL_LINES)
+        glVertex3f(point_a.position.x, -point_a.position.z, point_a.position.y)
+        glVertex3f(point_b.position.x, -point_b.position.z, point_b.position.y)
+        glEnd()
+
+    for i, group in enumerate(checkpoint_groups):
+        glColor3f(*colors[i % 4])
+        glBegin(GL_LINES)
+        prev = None
+        for checkpoint in group.points:
+            pos1, pos2 = checkpoint.start, checkpoint.end
+            glVertex3f(pos1.x, -pos1.z, pos1.y)
+            glVertex3f(pos2.x, -pos2.z, pos2.y)
+            if prev is not None:
+                pos3, pos4 = prev.start, prev.end
+                glVertex3f(pos1.x, -pos1.z, pos1.y)
+                glVertex3f(pos3.x, -pos3.z, pos3.y)
+                glVertex3f(pos2.x, -pos2.z, pos2.y)
+                glVertex3f(pos4.x, -pos4.z, pos4.y)
+            prev = checkpoint
+        glEnd()
+    for group in checkpoint_groups:
+        for prev, checkpoint in zip(group.points, group.points[1:]):
+            models.draw_arrow_head((prev.start + prev.end) / 2.0, (checkpoint.start + checkpoint.end) / 2.0)
+    glBegin(GL_LINES)
+    for group in checkpoint_groups:
+        for prev, checkpoint in zip(group.points, group.points[1:]):
+            mid1 = (prev.start + prev.end) / 2.0
+            mid2 = (checkpoint.start + checkpoint.end) / 2.0
+            glVertex3f(mid1.x, -mid1.z, mid1.y)
+            glVertex3f(mid2.x, -mid2.z, mid2.y)
+    glEnd()
+
+
+def render_batched(view, models, routes, enemy_groups, checkpoint_groups):
+    # Like BolMapViewer.paintGL draws them now, without culling
+    for i, route in enumerate(routes):
+        lines, arrows = view.group_lines(route, route_point_positions, route_lines, set())
+        (view.wide_lines if i % 7 == 0 else view.lines).add(lines, (0.0, 0.0, 0.0))
+        models.arrow_heads.add(arrows)
+    view.draw_lines()
+
+    for group in enemy_groups:
+        lines, arrows = view.group_lines(group, route_point_positions, route_lines, set())
+        view.lines.add(lines, (0.0, 0.0, 0.0))
+    for group, group_b, color, line in view.line_geometry.get(enemy_groups, lambda: enemy_group_links(enemy_groups)):
+        view.lines.add(line, color)
+    view.draw_lines()
+
+    checkpoint_lines_drawn = []
+    for i, group in enumerate(checkpoint_groups):
+        quads, mid_lines, arrows = view.group_lines(group, checkpoint_positions, checkpoint_lines, set())
+        view.lines.add(quads, colors[i % 4])
+        checkpoint_lines_drawn.append((mid_lines, arrows))
+    view.draw_lines()
+    color = colors[(len(checkpoint_groups) - 1) % 4]
+    for mid_lines, arrows in checkpoint_lines_drawn:
+        view.lines.add(mid_lines, color)
+        models.arrow_heads.add(arrows)
+    view.draw_lines(color)
+
+
+def draw(render, frames):
+    # Returns the image of the last frame, the time of the first frame and the average time of the others
+    times = []
+    for i in range(frames):
+        start = default_timer()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        render()
+        glFinish()
+        times.append(default_timer() - start)
+    image = read_pixels(SIZE, SIZE)
+    return image, times[0], sum(times[1:]) / max(1, frames - 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=300,
+                        help="Number of routes, a tenth of that many enemy point groups and checkpoint groups are added.")
+    parser.add_argument("--points", type=int, default=20,
+                        help="Number of points per route and group.")
+    parser.add_argument("--frames", type=int, default=10,
+                        help="Number of frames drawn with each renderer.")
+
+    args = parser.parse_args()
+
+    create_context(SIZE, SIZE)
+    glEnable(GL_DEPTH_TEST)
+    glClearColor(1.0, 1.0, 1.0, 1.0)
+
+    models = ObjectModels()
+    area = 40000.0
+    scene = make_scene(args.routes, args.points, area)
+
+    failed = False
+    for name, zoom, offset in (("whole course", area*2.4 / SIZE, 0.0), ("zoomed in", 20.0, area*0.3)):
+        top_down(zoom, offset, offset)
+        # The old drawing used the arrow head display list
+        models.arrow_head.render()
+        view = View(models)
+        old_image, old_first, old_time = draw(lambda: render_immediate(view, models, *scene), args.frames)
+        new_image, new_first, new_time = draw(lambda: render_batched(view, models, *scene), args.frames)
+
+        # Arrow heads are placed by the shader instead of the matrix stack, which may round their ends to
+        # neighbouring pixels
+        differing = int(numpy.count_nonzero((old_image != new_image).any(axis=2)))
+        drawn = int(numpy.count_nonzero((new_image[:, :, :3] != 0xFF).any(axis=2)))
+        failed = failed or differing > drawn // 100 or drawn == 0
+
+        print("{0}: frame {1:.2f} ms vs {2:.2f} ms, first frame with building the arrays {3:.2f} ms, "
+              "{4} of {5} drawn pixels differ".format(
+                  name, old_time * 1000, new_time * 1000, new_first * 1000, differing, drawn))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,181 @@
+# Times loading a textured OBJ model the way BMD previews are loaded (TexturedModel.from_obj_path, on a
+# thread without a GL context like the editor's collision loader) and compares uploading its meshes as vertex buffers against the per vertex display lists they replaced.
+# Checks that both draw the same image with textures and lighting. Needs EGL, see benchmarks.gl_context.
+# Run from the repository root, for example:
+#     python -m benchmarks.textured_model lib/temp/temp.obj
+# Without input files a synthetic textured course is written to a temporary directory.
+from benchmarks.gl_context import create_context, read_pixels, look_down_at
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+import random
+import tempfile
+from timeit import default_timer
+
+import numpy
+from OpenGL.GL import *
+from PIL import Image
+
+from lib.model_rendering import TexturedModel
+from lib.vectors import Vector3
+
+SIZE = 512
+
+
+def write_course(directory, size, materials=12, spacing=100.0, seed=0):
+    # Height field split into materials, most of them textured, with a few degenerate faces and
+    # faces without texture coordinates. Returns the path of the OBJ file.
+    rng = random.Random(seed)
+    with open(os.path.join(directory, "course.mtl"), "w") as f:
+        for i in range(materials):
+            f.write("newmtl material{0}\n".format(i))
+            f.write("Kd {0} {1} {2}\n".format(rng.random(), rng.random(), rng.random()))
+            if i % 4 != 3:
+                texture = "texture{0}.png".format(i)
+                pixels = numpy.array([[(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+                                       for x in range(16)] for y in range(16)], dtype=numpy.uint8)
+                Image.fromarray(pixels).save(os.path.join(directory, texture))
+                f.write("map_Kd {0}\n".format(texture))
+
+    path = os.path.join(directory, "course.obj")
+    half = size * spacing / 2.0
+    with open(path, "w") as f:
+        f.write("mtllib course.mtl\n")
+        for ix in range(size + 1):
+            for iz in range(size + 1):
+                f.write("v {0} {1} {2}\n".format(ix*spacing - half, iz*spacing - half, rng.uniform(0.0, 300.0)))
+                f.write("vt {0} {1}\n".format(ix / 4.0, iz / 4.0))
+
+        def index(ix, iz):
+            return ix*(size + 1) + iz + 1
+
+        for band in range(materials):
+            f.write("usemtl material{0}\n".format(band))
+            for ix in range(band*size // materials, (band + 1)*size // materials):
+                for iz in range(size):
+                    a, b, c, d = index(ix, iz), index(ix + 1, iz), index(ix + 1, iz + 1), index(ix, iz + 1)
+                    if rng.random() < 0.01:
+                        f.write("f {0}/{0} {1}/{1} {1}/{1}\n".format(a, b))
+                    elif rng.random() < 0.02:
+                        f.write("f {0} {1} {2}\n".format(a, b, c))
+                        f.write("f {0}/{0} {1}/{1} {2}/{2}\n".format(a, c, d))
+                    else:
+                        f.write("f {0}/{0} {1}/{1} {2}/{2} {3}/{3}\n".format(a, b, c, d))
+
+    return path
+
+
+def generate_displist(mesh):
+    # The display list as TexturedMesh built it before, from triangles of (position, texcoord) index pairs
+    corners = list(zip(mesh.position_indices, [None if ti == -1 else ti for ti in mesh.texcoord_indices]))
+    triangles = [corners[i:i+3] for i in range(0, len(corners), 3)]
+    vertex_positions = [tuple(position) for position in mesh.vertex_positions.tolist()]
+    vertex_texcoords = [tuple(texcoord) for texcoord in mesh.vertex_texcoords.tolist()]
+
+    displist = glGenLists(1)
+    glNewList(displist, GL_COMPILE)
+    glBegin(GL_TRIANGLES)
+
+    for triangle in triangles:
+        v0 = Vector3(*vertex_positions[triangle[0][0]])
+        v1 = Vector3(*vertex_positions[triangle[1][0]])
+        v2 = Vector3(*vertex_positions[triangle[2][0]])
+        vn = (v1 - v0).cross(v2 - v0)
+        if not vn.norm():
+            continue
+        vn.normalize()
+
+        for vi, ti in triangle:
+            if mesh.material.textured and ti is not None:
+                glTexCoord2f(*vertex_texcoords[ti])
+            glNormal3f(vn.x, vn.y, vn.z)
+            glVertex3f(*vertex_positions[vi])
+
+    glEnd()
+    glEndList()
+    return displist
+
+
+def draw(model):
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    # Every mesh starts from the same texture coordinate, the display lists inherit the current one
+    glTexCoord2f(0.0, 0.0)
+    model.render()
+    return read_pixels(SIZE, SIZE)
+
+
+def setup_lighting():
+    # As the 3D view sets it up for models
+    glLightfv(GL_LIGHT0, GL_POSITION, (-2.0, 5.0, 5.0, 0.0))
+    glLightfv(GL_LIGHT0, GL_DIFFUSE, (0.8, 0.8, 0.8, 1.0))
+    glLightfv(GL_LIGHT0, GL_AMBIENT, (1.8, 1.8, 1.8, 1.0))
+    glShadeModel(GL_SMOOTH)
+    glEnable(GL_LIGHT0)
+    glEnable(GL_RESCALE_NORMAL)
+    glEnable(GL_NORMALIZE)
+    glEnable(GL_LIGHTING)
+    glEnable(GL_COLOR_MATERIAL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="*",
+                        help="Paths to .obj files as SuperBMD writes them. A synthetic course is used if none are given.")
+    parser.add_argument("--size", type=int, default=200,
+                        help="Number of quads along each side of the synthetic course.")
+
+    args = parser.parse_args()
+
+    create_context(SIZE, SIZE)
+    glEnable(GL_DEPTH_TEST)
+    glClearColor(0.0, 0.0, 0.0, 1.0)
+    setup_lighting()
+
+    failed = False
+    loader = ThreadPoolExecutor(max_workers=1)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = args.input
+        if not paths:
+            paths = [write_course(directory, args.size)]
+
+        for path in paths:
+            start = default_timer()
+            model = loader.submit(TexturedModel.from_obj_path, path, rotate=True).result()
+            parse_time = default_timer() - start
+
+            # Rotated so that the model's y axis points at the viewer
+            vertices = model.mesh_list[0].vertex_positions
+            bounds_min, bounds_max = vertices.min(axis=0), vertices.max(axis=0)
+            look_down_at((bounds_min[0], bounds_min[1], -bounds_max[2]), (bounds_max[0], bounds_max[1], -bounds_min[2]))
+            glRotatef(90.0, 1.0, 0.0, 0.0)
+
+            start = default_timer()
+            for mesh in model.mesh_list:
+                mesh.material.upload()
+            displists = [generate_displist(mesh) for mesh in model.mesh_list]
+            glFinish()
+            displist_time = default_timer() - start
+
+            start = default_timer()
+            for mesh in model.mesh_list:
+                mesh.generate_buffers()
+            glFinish()
+            buffer_time = default_timer() - start
+
+            new_image = draw(model)
+            for mesh, displist in zip(model.mesh_list, displists):
+                mesh.draw = lambda displist=displist: glCallList(displist)
+            old_image = draw(model)
+
+            triangles = sum(len(mesh.position_indices) // 3 for mesh in model.mesh_list)
+            differing = int(numpy.count_nonzero((old_image != new_image).any(axis=2)))
+            drawn = int(numpy.count_nonzero(new_image[:, :, :3].any(axis=2)))
+            failed = failed or differing > 0 or drawn == 0
+
+            print("{0}: {1} triangles in {2} meshes, parse {3:.2f}s, display lists {4:.2f}s, vertex buffers "
+                  "{5:.3f}s, {6} of {7} drawn pixels differ".format(
+                      os.path.basename(path), triangles, len(model.mesh_list), parse_time, displist_time,
+                      buffer_time, differing, drawn))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,116 @@
+# Makes edits through the editor the way the user does: moving and rotating the selection, editing a field
+# of the data editor and selecting something else before it is written back, pasting, deleting and an edit
+# that doesn't tell the undo history which objects it changed. Checks that every edit gets an undo entry of
+# its own, that undoing the entries one by one gives back the document as it was before each edit and that
+# redoing them gives the edited document again. Needs a Qt platform plugin, without a display run it with
+# QT_QPA_PLATFORM=offscreen.
+# Run from the repository root, for example:
+#     python -m benchmarks.undo_editor "Course/Luigi.arc" luigi_course.bol
+import argparse
+import sys
+from timeit import default_timer
+
+import mkdd_editor
+from lib.vectors import Vector3
+
+
+def select(editor, obj):
+    # Selects the object in the tree like clicking it does, which also shows it in the data editor
+    editor.select_tree_item_bound_to(obj)
+
+
+def move(editor, bol):
+    select(editor, bol.enemypointgroups.groups[0].points[0])
+    editor.action_move_objects(100.0, 0.0, 50.0)
+
+
+def rotate(editor, bol):
+    select(editor, bol.kartpoints.positions[0])
+    editor.action_rotate_object(Vector3(30.0, 0.0, 0.0))
+
+
+def edit_field(editor, bol):
+    # The field is only written once it loses focus, here to a click that selects another point and
+    # records before the field is written
+    points = bol.enemypointgroups.groups[0].points
+    select(editor, points[0])
+    data_editor = editor.pik_control.object_data_edit
+    data_editor.scale.setText(str(points[0].scale + 250.0))
+
+    select(editor, points[1])
+    editor.on_document_potentially_changed()
+    data_editor.scale.editingFinished.emit()
+
+
+def paste(editor, bol):
+    select(editor, bol.respawnpoints[0])
+    editor.on_copy_action_triggered()
+    editor.on_paste_action_triggered()
+
+
+def delete(editor, bol):
+    select(editor, bol.enemypointgroups.groups[0].points[-1])
+    editor.action_delete_objects()
+
+
+def unmarked(editor, bol):
+    bol.respawnpoints[0].position.y += 100.0
+
+
+EDITS = (("move", move), ("rotate", rotate), ("data editor field", edit_field), ("paste", paste),
+         ("delete", delete), ("unmarked edit", unmarked))
+
+
+def check(editor, path):
+    # Returns whether all edits were undone and redone correctly
+    editor.load_file(path)
+    bol = editor.level_file
+    history = editor.undo_stack.undo_history
+
+    failed = False
+    states = [bol.to_bytes()]
+    for name, edit in EDITS:
+        entries = len(history)
+        edit(editor, bol)
+        start = default_timer()
+        editor.on_document_potentially_changed()
+        taken = default_timer() - start
+
+        states.append(bol.to_bytes())
+        ok = len(history) == entries + 1 and states[-1] != states[-2]
+        failed = failed or not ok
+        print("{0}: {1}: {2} in {3:.2f}ms".format(
+            path, name, "recorded" if ok else "FAILED, {0} entries recorded".format(len(history) - entries),
+            taken * 1000))
+
+    for i in reversed(range(len(EDITS))):
+        editor.on_undo_action_triggered()
+        if bol.to_bytes() != states[i]:
+            failed = True
+            print("{0}: undoing {1} FAILED".format(path, EDITS[i][0]))
+
+    for i in range(len(EDITS)):
+        editor.on_redo_action_triggered()
+        if bol.to_bytes() != states[i + 1]:
+            failed = True
+            print("{0}: redoing {1} FAILED".format(path, EDITS[i][0]))
+
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="+",
+                        help="Paths to .bol files or to .arc files containing a _course.bol")
+
+    args = parser.parse_args()
+
+    app = mkdd_editor.Application(sys.argv[:1])
+    editor = mkdd_editor.GenEditor()
+
+    failed = False
+    for path in args.input:
+        failed = not check(editor, path) or failed
+
+    if failed:
+        raise SystemExit(1)
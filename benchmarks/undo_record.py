@@ -0,0 +1,164 @@
+# Makes a series of edits to a course the way the editor does, recording an undo entry after each with the
+# edited objects marked as changed (lib.undo), and compares the time per record against comparing the whole
+# document. Checks that undoing every entry gives back the document as loaded, that redoing them gives the
+# edited document again and that both ways of recording find the same changes.
+# Run from the repository root, for example:
+#     python -m benchmarks.undo_record "Course/Luigi.arc" luigi_course.bol
+import argparse
+import random
+from copy import deepcopy
+from timeit import default_timer
+
+from lib.libbol import BOL, MapObject
+from lib.undo import UndoStack
+from lib.vectors import Vector3
+from benchmarks.bol_parse import load_bol_data, find_difference
+
+
+class Editor(object):
+    # Holds the roots the editor tracks
+    def __init__(self, bol):
+        self.level_file = bol
+        self.minimap = Minimap()
+
+    def get_undo_roots(self):
+        return [(self, ("level_file", )), (self.minimap, ("corner1", "corner2", "orientation"))]
+
+
+class Minimap(object):
+    def __init__(self):
+        self.corner1 = Vector3(-1000.0, 0.0, -1000.0)
+        self.corner2 = Vector3(1000.0, 0.0, 1000.0)
+        self.orientation = 0
+
+
+def make_edits(editor, count, seed=0):
+    # Returns functions that each make an edit and return the objects they edited, None for edits that
+    # may touch anything and call for comparing the whole document. Edits that return no objects are
+    # found by comparing the whole document too, since nothing was marked.
+    rng = random.Random(seed)
+    bol = editor.level_file
+    objects = bol.objects.objects
+    points = [point for group in bol.enemypointgroups.groups for point in group.points]
+
+    def move():
+        selected = rng.sample(objects, min(len(objects), 20))
+        for obj in selected:
+            obj.position.x += rng.uniform(-100.0, 100.0)
+            obj.position.z += rng.uniform(-100.0, 100.0)
+        return selected
+
+    def rotate():
+        obj = rng.choice(objects)
+        obj.rotation.rotate_around_y(rng.uniform(-45.0, 45.0))
+        return [obj]
+
+    def set_field():
+        obj = rng.choice(objects)
+        obj.presence = rng.randint(0, 3)
+        obj.userdata[rng.randint(0, 7)] = rng.randint(-100, 100)
+        return [obj]
+
+    def set_point():
+        point = rng.choice(points)
+        point.scale = rng.uniform(500.0, 2000.0)
+        point.position.y += 10.0
+        return [point]
+
+    def add_object():
+        obj = MapObject.new()
+        obj.position = Vector3(rng.uniform(-1000.0, 1000.0), 0.0, rng.uniform(-1000.0, 1000.0))
+        objects.insert(rng.randint(0, len(objects)), obj)
+        return []
+
+    def delete_object():
+        del objects[rng.randrange(len(objects))]
+        return None
+
+    def reverse_group():
+        group = rng.choice(bol.enemypointgroups.groups)
+        group.points.reverse()
+        return None
+
+    def move_minimap():
+        editor.minimap.corner1.x -= 100.0
+        return []
+
+    def nothing():
+        return []
+
+    edits = [move, rotate, set_field, set_point, add_object, delete_object, reverse_group, move_minimap,
+             nothing, nothing]
+    return [rng.choice(edits) for i in range(count)]
+
+
+def run(editor, edits, full):
+    # Makes the edits, recording after each. Returns the time taken by the records that compared the
+    # whole document when full is set, by the ones of marked objects otherwise.
+    stack = UndoStack(editor.get_undo_roots, budget=2**40)
+    times = []
+    for edit in edits:
+        edited = edit()
+        if edited is None or full:
+            stack.mark_all_changed()
+        else:
+            stack.mark_changed(*edited)
+
+        start = default_timer()
+        stack.record()
+        if full or edited:
+            times.append(default_timer() - start)
+
+    return stack, times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="+",
+                        help="Paths to .bol files or to archives containing a _course.bol")
+    parser.add_argument("--edits", type=int, default=200,
+                        help="Number of edits made to each course.")
+
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.input:
+        data = load_bol_data(path)
+        results = []
+        for full in (True, False):
+            editor = Editor(BOL.from_bytes(data))
+            original = deepcopy(editor)
+
+            edits = make_edits(editor, args.edits)
+            stack, times = run(editor, edits, full)
+            edited = deepcopy(editor)
+            entries = len(stack.undo_history)
+
+            while stack.undo_history:
+                stack.undo()
+            undone = find_difference(original, editor)
+            while stack.redo_history:
+                stack.redo()
+            redone = find_difference(edited, editor)
+
+            for name, difference in (("undoing", undone), ("redoing", redone)):
+                if difference is not None:
+                    failed = True
+                    print("{0}: {1} all entries recorded {2} differs: {3}".format(
+                        path, name, "comparing everything" if full else "marked objects", difference))
+
+            results.append((entries, editor.level_file.to_bytes(), times))
+
+        (full_entries, full_data, full_times), (entries, marked_data, times) = results
+        if full_entries != entries or full_data != marked_data:
+            failed = True
+            print("{0}: recording marked objects found {1} entries, comparing everything {2}".format(
+                path, entries, full_entries))
+
+        print("{0}: {1} objects, {2} entries, record comparing everything {3:.2f}ms, "
+              "marked objects {4:.2f}ms on average".format(
+                  path, len(stack.state.objects), entries,
+                  sum(full_times) / len(full_times) * 1000, sum(times) / len(times) * 1000))
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,51 @@
+# Round trips files through the Yaz0 encoder at every level and reports the
+# compression ratio and time taken. Yaz0 compressed inputs are decompressed first.
+# Run from the repository root, for example:
+#     python -m benchmarks.yaz0_compress "Course/Luigi.arc" "Course/Daisy.arc"
+import argparse
+from io import BytesIO
+from timeit import default_timer
+
+from lib.yaz0 import decompress, decompress_data, compress_data, LEVELS
+
+
+def check_round_trip(data, compressed):
+    if bytes(decompress_data(compressed)) != data:
+        return False
+
+    out = BytesIO()
+    decompress(BytesIO(compressed), out)
+    return out.getvalue() == data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="+",
+                        help="Paths to the files to compress")
+    parser.add_argument("--level", choices=list(LEVELS), action="append",
+                        help="Only test the given level(s). Default is all levels.")
+
+    args = parser.parse_args()
+    levels = args.level if args.level else list(LEVELS)
+    failed = False
+
+    for path in args.input:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if data[:4] == b"Yaz0":
+            data = bytes(decompress_data(data))
+
+        for level in levels:
+            start = default_timer()
+            compressed = compress_data(data, level)
+            taken = default_timer() - start
+
+            ok = check_round_trip(data, bytes(compressed))
+            failed = failed or not ok
+            print("{0} [{1}]: {2} -> {3} bytes ({4:.1%}) in {5:.2f}s, round trip {6}".format(
+                path, level, len(data), len(compressed), len(compressed)/max(len(data), 1), taken,
+                "ok" if ok else "FAILED"))
+
+    if failed:
+        raise SystemExit(1)
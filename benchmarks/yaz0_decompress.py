@@ -0,0 +1,60 @@
+# Compares the buffer based Yaz0 decoder against the stream based one.
+# Run from the repository root, for example:
+#     python -m benchmarks.yaz0_decompress "Course/Luigi.arc" "Course/Daisy.arc"
+import argparse
+from io import BytesIO
+from timeit import default_timer
+
+from lib.yaz0 import decompress, decompress_data
+
+
+def bench(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = default_timer()
+        result = func()
+        taken = default_timer() - start
+        if best is None or taken < best:
+            best = taken
+
+    return best, result
+
+
+def run_stream(data):
+    out = BytesIO()
+    decompress(BytesIO(data), out)
+    return out.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="+",
+                        help="Paths to Yaz0 compressed files (usually .arc or .szs)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="How often each decoder runs per file, the best time is reported.")
+
+    args = parser.parse_args()
+
+    total_old = total_new = 0.0
+    for path in args.input:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if data[:4] != b"Yaz0":
+            print("Skipping {0}: not Yaz0 compressed".format(path))
+            continue
+
+        old_time, old_result = bench(lambda: run_stream(data), args.repeat)
+        new_time, new_result = bench(lambda: decompress_data(data), args.repeat)
+
+        if old_result != new_result:
+            raise RuntimeError("Decoders disagree on {0}".format(path))
+
+        total_old += old_time
+        total_new += new_time
+        print("{0}: {1} bytes, stream {2:.3f}s, buffer {3:.3f}s, {4:.1f}x".format(
+            path, len(new_result), old_time, new_time, old_time/new_time))
+
+    if total_new > 0:
+        print("Total: stream {0:.3f}s, buffer {1:.3f}s, {2:.1f}x".format(
+            total_old, total_new, total_old/total_new))
@@ -32,6 +32,10 @@ def make_default_config():
         "filter_view": "",
         "default_view": "topdownview",
         "addi_file_on_load": "BCO",
+        "undo_memory_budget_mb": "64",
+        "collision_cache_mb": "256",
+        "ground_when_moving": "False",
+        "ground_when_moving_budget_ms": "8",
     }
 
     with open("editor_config.ini", "w") as f:
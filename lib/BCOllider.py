@@ -3,6 +3,21 @@
 import subprocess
 from struct import unpack_from, pack
 
+import numpy
+
+
+# Grid table entry: number of triangles, unknown, index of the first of 4 child entries or 0 for leaves,
+# index of the first triangle in the triangle index list
+GRID_ENTRY = numpy.dtype([("count", "u1"), ("unknown", "u1"), ("child", ">u2"), ("start", ">i4")])
+# Triangle entry, the 0x18 bytes after the vertex indices are kept as rest for old callers
+TRIANGLE_ENTRY = numpy.dtype({"names": ["vertices", "rest", "collision_type"],
+                              "formats": [(">i4", (3,)), "V24", ">u2"],
+                              "offsets": [0x00, 0x0C, 0x16],
+                              "itemsize": 0x24})
+# Deepest quadtree level that is decoded, and the most cells the decoded grid may have
+MAX_GRID_DEPTH = 8
+MAX_GRID_CELLS = 1 << 20
+
 
 def read_array(buffer, offset, length):
     return buffer[offset:offset+length]
@@ -48,8 +63,32 @@ class RacetrackCollision(object):
         self.unknownoffset = 0
 
         self.grids = []
-        self.triangles = []
-        self.vertices = []
+        # Views on the file data, the lists of tuples are only built when they are used
+        self.triangle_array = numpy.zeros(0, dtype=TRIANGLE_ENTRY)
+        self.vertex_array = numpy.zeros((0, 3), dtype=">f4")
+        self._triangles = None
+        self._vertices = None
+
+    @property
+    def triangles(self):
+        # (v1, v2, v3, collision_type, rest) for every triangle
+        if self._triangles is None:
+            self._triangles = [(v1, v2, v3, collision_type, rest) for (v1, v2, v3), collision_type, rest in
+                               zip(self.triangle_array["vertices"].tolist(),
+                                   self.triangle_array["collision_type"].tolist(),
+                                   self.triangle_array["rest"].tolist())]
+        return self._triangles
+
+    @property
+    def data(self):
+        # The file content as it was read
+        return self._data
+
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self._vertices = [tuple(vertex) for vertex in self.vertex_array.tolist()]
+        return self._vertices
 
     def load_file(self, f):
         data = f.read()
@@ -81,38 +120,21 @@ class RacetrackCollision(object):
         # Parse triangles
         trianglescount = (self.verticesoffset-self.trianglesoffset) // 0x24
         print((self.verticesoffset-self.trianglesoffset)%0x24)
-
-        for i in range(trianglescount):
-            v1 = read_int32(data, self.trianglesoffset+i*0x24 + 0x00)
-            v2 = read_int32(data, self.trianglesoffset+i*0x24 + 0x04)
-            v3 = read_int32(data, self.trianglesoffset+i*0x24 + 0x08)
-            collision_type = read_uint16(data, self.trianglesoffset+i*0x24 + 0x16)
-            rest = read_array(data, self.trianglesoffset+i*0x24 + 0x0C, length=0x24-0xC)
-            self.triangles.append((v1,v2,v3, collision_type, rest))
+        self.triangle_array = numpy.frombuffer(data, TRIANGLE_ENTRY, trianglescount, self.trianglesoffset)
+        self._triangles = None
 
         # Parse vertices
         vertcount = (self.unknownoffset-self.verticesoffset) // 0xC
         print((self.unknownoffset-self.verticesoffset) % 0xC)
-
-        biggestx = biggestz = -99999999
-        smallestx = smallestz = 99999999
-
-        for i in range(vertcount):
-            x = read_float(data, self.verticesoffset + i*0xC + 0x00)
-            y = read_float(data, self.verticesoffset + i*0xC + 0x04)
-            z = read_float(data, self.verticesoffset + i*0xC + 0x08)
-            self.vertices.append((x,y,z))
-
-            if x > biggestx:
-                biggestx = x
-            if x < smallestx:
-                smallestx = x
-
-            if z > biggestz:
-                biggestz = z
-            if z < smallestz:
-                smallestz = z
-            #print(x,y,z)
+        self.vertex_array = numpy.frombuffer(data, ">f4", vertcount*3, self.verticesoffset).reshape(-1, 3)
+        self._vertices = None
+
+        if vertcount > 0:
+            smallestx, _, smallestz = self.vertex_array.min(axis=0).tolist()
+            biggestx, _, biggestz = self.vertex_array.max(axis=0).tolist()
+        else:
+            biggestx = biggestz = -99999999
+            smallestx = smallestz = 99999999
         print("smallest/biggest vertex coordinates:",smallestx, smallestz, biggestx, biggestz)
         f.seek(self.unknownoffset)
         self.matentries = []
@@ -122,6 +144,111 @@ class RacetrackCollision(object):
             self.matentries.append((val1, val2, unk, int1, int2))
 
 
+    def read_grid(self):
+        # Decodes the grid table into a uniform grid with cells the size of the smallest quadtree cells
+        # that point to the triangles of the quadtree leaf they are in, in the layout lib.collision.Collision
+        # takes: (start_x, start_z, cell_size_x, cell_size_z, size_x, size_z, cell leaves, offsets, triangles).
+        # Returns None if the table can't be used, then the caller has to build a grid itself.
+        data = self._data
+        top_cells = self.grid_xsize * self.grid_zsize
+        entrycount = (self.triangles_indices_offset - self.gridtable_offset) // 8
+        if top_cells == 0 or entrycount < top_cells:
+            return None
+
+        entries = numpy.frombuffer(data, GRID_ENTRY, entrycount, self.gridtable_offset)
+        indices = numpy.frombuffer(data, ">u2", (self.trianglesoffset - self.triangles_indices_offset) // 2,
+                                   self.triangles_indices_offset).astype(numpy.int64)
+        children = entries["child"].astype(numpy.int64)
+
+        # Walk the quadtree one level at a time, collecting the leaves with their position counted
+        # in cells of their depth. Child i covers the x half i & 1 and the z half i >> 1 of its parent.
+        index = numpy.arange(top_cells, dtype=numpy.int64)
+        x = index % self.grid_xsize
+        z = index // self.grid_xsize
+        leaves = []
+        depth = 0
+        while True:
+            child = children[index]
+            is_leaf = child == 0
+            leaves.append((index[is_leaf], x[is_leaf], z[is_leaf], numpy.full(is_leaf.sum(), depth)))
+            if is_leaf.all():
+                break
+            if depth == MAX_GRID_DEPTH or child.max() + 3 >= entrycount:
+                return None
+
+            quadrant = numpy.arange(4)
+            index = (child[~is_leaf].reshape(-1, 1) + quadrant).ravel()
+            x = (x[~is_leaf].reshape(-1, 1)*2 + (quadrant & 1)).ravel()
+            z = (z[~is_leaf].reshape(-1, 1)*2 + (quadrant >> 1)).ravel()
+            depth += 1
+
+        leaf_entries, leaf_x, leaf_z, leaf_depth = (numpy.concatenate(values) for values in zip(*leaves))
+        scale = 1 << depth
+        size_x = self.grid_xsize * scale
+        size_z = self.grid_zsize * scale
+        if size_x * size_z > MAX_GRID_CELLS:
+            return None
+
+        counts = entries["count"][leaf_entries].astype(numpy.int64)
+        starts = entries["start"][leaf_entries].astype(numpy.int64)
+        used = counts > 0
+        if numpy.any(starts[used] < 0) or numpy.any(starts[used] + counts[used] > len(indices)):
+            return None
+
+        # Triangles of every leaf, sorted so that ties between hits go to the first one in the file
+        local = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        leaf_triangles = indices[numpy.repeat(starts, counts) + local]
+        leaf_of_triangle = numpy.repeat(numpy.arange(len(leaf_entries)), counts)
+        if not numpy.all((numpy.diff(leaf_triangles) > 0) | (numpy.diff(leaf_of_triangle) != 0)):
+            leaf_triangles = leaf_triangles[numpy.lexsort((leaf_triangles, leaf_of_triangle))]
+        if numpy.any(leaf_triangles >= len(self.triangle_array)):
+            return None
+
+        # Every leaf covers span x span cells of the decoded grid
+        cell_leaf = numpy.full((size_x, size_z), -1, dtype=numpy.int64)
+        span = numpy.left_shift(1, depth - leaf_depth)
+        for level_span in numpy.unique(span).tolist():
+            level = numpy.flatnonzero(span == level_span)
+            cells = cell_leaf.reshape(size_x // level_span, level_span, size_z // level_span, level_span)
+            cells[leaf_x[level], :, leaf_z[level], :] = level.reshape(-1, 1, 1)
+        if numpy.any(cell_leaf < 0):
+            return None
+
+        cell_size_x = self.gridcell_xsize / scale
+        cell_size_z = self.gridcell_zsize / scale
+        start = numpy.array((self.coordinate1_x, self.coordinate1_z), dtype=numpy.float64)
+        cell_size = numpy.array((cell_size_x, cell_size_z))
+        leaf_min = start + numpy.stack((leaf_x*span, leaf_z*span), axis=1) * cell_size
+        leaf_max = leaf_min + span.reshape(-1, 1) * cell_size
+
+        # The grid has to cover the whole mesh and every triangle has to touch the cell it is listed in,
+        # otherwise the table is laid out differently than assumed here. Beyond that the table is trusted
+        # to list every triangle of a leaf, checking that would cost as much as binning them.
+        vertices = self.vertex_array[:, [0, 2]].astype(numpy.float64)
+        corners = self.triangle_array["vertices"].astype(numpy.int64)
+        if len(corners) and (corners.min() < 0 or corners.max() >= len(vertices)):
+            return None
+        end = start + cell_size * (size_x, size_z)
+        if len(vertices) and (numpy.any(vertices.min(axis=0) < start) or numpy.any(vertices.max(axis=0) > end)):
+            return None
+
+        corner1, corner2, corner3 = (vertices[corners[:, i]] for i in range(3))
+        triangle_min = numpy.minimum(numpy.minimum(corner1, corner2), corner3)
+        triangle_max = numpy.maximum(numpy.maximum(corner1, corner2), corner3)
+        tolerance = cell_size * 1e-3
+        if (numpy.any(numpy.take(triangle_max, leaf_triangles, axis=0)
+                      < numpy.take(leaf_min - tolerance, leaf_of_triangle, axis=0))
+                or numpy.any(numpy.take(triangle_min, leaf_triangles, axis=0)
+                             > numpy.take(leaf_max + tolerance, leaf_of_triangle, axis=0))):
+            return None
+
+        offsets = numpy.zeros(len(counts) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+
+        return (self.coordinate1_x, self.coordinate1_z, cell_size_x, cell_size_z, size_x, size_z,
+                cell_leaf.ravel(), offsets, leaf_triangles)
+
+
 def read_gridtable_entry(data, offset):
     unk1 = read_uint8(data, offset+0)
     unk2 = read_uint8(data, offset+1)
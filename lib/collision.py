@@ -1,282 +1,541 @@
 import math
-from .vectors import Vector3, Triangle
+import numpy
+from .vectors import Vector3
 from configuration import read_config
 
-def collides(face_v1, face_v2, face_v3, box_mid_x, box_mid_z, box_size_x, box_size_z):
-    half_x = box_size_x / 2.0
-    min_x = min(face_v1[0], face_v2[0], face_v3[0]) - box_mid_x
-    if min_x > +half_x:
-        return False
-    max_x = max(face_v1[0], face_v2[0], face_v3[0]) - box_mid_x
-    if max_x < -half_x:
-        return False
-
-    half_z = box_size_z / 2.0
-    min_z = min(face_v1[2], face_v2[2], face_v3[2]) - box_mid_z
-    if min_z > +half_z:
-        return False
-    max_z = max(face_v1[2], face_v2[2], face_v3[2]) - box_mid_z
-    if max_z < -half_z:
-        return False
-
-    return True
-
-
-def subdivide_grid(minx, minz,
-                   gridx_start, gridx_end, gridz_start, gridz_end,
-                   cell_size, triangles, vertices, result):
-    #print("Subdivision with", gridx_start, gridz_start, gridx_end, gridz_end, (gridx_start+gridx_end) // 2, (gridz_start+gridz_end) // 2)
-    if gridx_start == gridx_end-1 and gridz_start == gridz_end-1:
-        if gridx_start not in result:
-            result[gridx_start] = {}
-        result[gridx_start][gridz_start] = triangles
-
-        return True
-
-    # assert gridx_end > gridx_start or gridz_end > gridz_start
-
-    halfx = (gridx_start+gridx_end) // 2
-    halfz = (gridz_start+gridz_end) // 2
-
-    # x->
-    # 2 3 ^
-    # 0 1 z
-    coordinates = (
-        (0, gridx_start , halfx     , gridz_start   , halfz),   # Quadrant 0
-        (1, halfx       , gridx_end , gridz_start   , halfz),     # Quadrant 1
-        (2, gridx_start , halfx     , halfz         , gridz_end),     # Quadrant 2
-        (3, halfx       , gridx_end , halfz         , gridz_end) # Quadrant 3
-    )
-    skip = []
-    if gridx_start == halfx:
-        skip.append(0)
-        skip.append(2)
-    if halfx == gridx_end:
-        skip.append(1)
-        skip.append(3)
-    if gridz_start == halfz:
-        skip.append(0)
-        skip.append(1)
-    if halfz == gridz_end:
-        skip.append(2)
-        skip.append(3)
-
-    coordinates = [([], startx, endx, startz, endz)
-                   for quadrant_index, startx, endx, startz, endz in coordinates
-                   if quadrant_index not in skip]
-
-    for quadrant, startx, endx, startz, endz in coordinates:
-        area_size_x = (endx - startx) * cell_size
-        area_size_z = (endz - startz) * cell_size
-
-        box_mid_x = minx + startx * cell_size + area_size_x // 2
-        box_mid_z = minz + startz * cell_size + area_size_z // 2
-
-        for triangle in triangles:
-            _i, (v1_index, v2_index, v3_index, _coltype)= triangle
-
-            v1 = vertices[v1_index[0] - 1]
-            v2 = vertices[v2_index[0] - 1]
-            v3 = vertices[v3_index[0] - 1]
-
-            if collides(v1, v2, v3, box_mid_x, box_mid_z, area_size_x, area_size_z):
-                quadrant.append(triangle)
-
-    for quadrant, startx, endx, startz, endz in coordinates:
-        subdivide_grid(minx, minz, startx, endx, startz, endz, cell_size, quadrant, vertices,
-                       result)
-
-
-def normalize_vector(v1):
-    n = (v1[0]**2 + v1[1]**2 + v1[2]**2)**0.5
-    return v1[0]/n, v1[1]/n, v1[2]/n
-
-
-def create_vector(v1, v2):
-    return v2[0]-v1[0],v2[1]-v1[1],v2[2]-v1[2]
-
-
-def cross_product(v1, v2):
-    cross_x = v1[1]*v2[2] - v1[2]*v2[1]
-    cross_y = v1[2]*v2[0] - v1[0]*v2[2]
-    cross_z = v1[0]*v2[1] - v1[1]*v2[0]
-    return cross_x, cross_y, cross_z
-
-
-MAX_X = 200000
-MAX_Z = 200000
-
+def bin_triangles(vertices, triangles, cell_size):
+    # Sorts triangles into a uniform grid of square cells on the XZ plane that covers the mesh.
+    # A triangle is put into every cell its bounding box touches.
+    # Returns the grid start, the number of cells on each axis and the triangles of each cell in
+    # CSR layout: the triangle indices of cell (x, z) are ids[offsets[c]:offsets[c+1]] with
+    # c = x * size_z + z.
+    if len(triangles) == 0:
+        return 0.0, 0.0, 0, 0, numpy.zeros(1, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+
+    corners_x = vertices[triangles, 0]
+    corners_z = vertices[triangles, 2]
+    min_x, max_x = corners_x.min(axis=1), corners_x.max(axis=1)
+    min_z, max_z = corners_z.min(axis=1), corners_z.max(axis=1)
+
+    start_x = math.floor(min_x.min() / cell_size) * cell_size
+    start_z = math.floor(min_z.min() / cell_size) * cell_size
+    # Cells border each other, a vertex lying on the far border of the last cell also touches the next one
+    size_x = int((max_x.max() - start_x) // cell_size) + 1
+    size_z = int((max_z.max() - start_z) // cell_size) + 1
+
+    first_x = numpy.maximum(numpy.ceil((min_x - start_x) / cell_size).astype(numpy.int64) - 1, 0)
+    first_z = numpy.maximum(numpy.ceil((min_z - start_z) / cell_size).astype(numpy.int64) - 1, 0)
+    last_x = numpy.minimum(((max_x - start_x) // cell_size).astype(numpy.int64), size_x - 1)
+    last_z = numpy.minimum(((max_z - start_z) // cell_size).astype(numpy.int64), size_z - 1)
+
+    # Every triangle gets one entry per cell of its cell range
+    width_z = last_z - first_z + 1
+    counts = (last_x - first_x + 1) * width_z
+    ids = numpy.repeat(numpy.arange(len(triangles), dtype=numpy.int64), counts)
+    local = numpy.arange(len(ids), dtype=numpy.int64) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    width_z = width_z[ids]
+    cells = (first_x[ids] + local // width_z) * size_z + first_z[ids] + local % width_z
+
+    # Stable sort keeps the triangles of each cell in file order
+    order = numpy.argsort(cells, kind="stable")
+    offsets = numpy.zeros(size_x * size_z + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(cells, minlength=size_x * size_z), out=offsets[1:])
+
+    return start_x, start_z, size_x, size_z, offsets, ids[order]
+
+
+def cross_products(corners):
+    # Cross product of the edges v1->v2 and v1->v3 of triangles given as corner arrays and whether it is nonzero
+    edge1 = corners[:, 1] - corners[:, 0]
+    edge2 = corners[:, 2] - corners[:, 0]
+    products = numpy.stack((edge1[:, 1]*edge2[:, 2] - edge1[:, 2]*edge2[:, 1],
+                            edge1[:, 2]*edge2[:, 0] - edge1[:, 0]*edge2[:, 2],
+                            edge1[:, 0]*edge2[:, 1] - edge1[:, 1]*edge2[:, 0]), axis=1)
+    return products, numpy.any(products != 0.0, axis=1)
+
+
+def morton_codes(points, bits=10):
+    # Interleaves the bits of the points' positions quantized inside their bounds
+    low = points.min(axis=0)
+    extent = points.max(axis=0) - low
+    extent[extent == 0] = 1.0
+    quantized = ((points - low) / extent * ((1 << bits) - 1)).astype(numpy.int64)
+
+    codes = numpy.zeros(len(points), dtype=numpy.int64)
+    for bit in range(bits):
+        for axis in range(3):
+            codes |= ((quantized[:, axis] >> bit) & 1) << (3*bit + axis)
+    return codes
+
+
+class TriangleBVH(object):
+    # Bounding volume hierarchy over triangles. The triangles are sorted along a Morton curve and
+    # split into leaves of leaf_size triangles, the leaves are then merged pairwise into a balanced
+    # tree. Node i of a level has the nodes 2*i and 2*i+1 of the next level as children.
+    def __init__(self, corners, leaf_size=8):
+        self.leaf_size = leaf_size
+        self.count = len(corners)
+        self.levels = []
+        if self.count == 0:
+            self.order = numpy.zeros(0, dtype=numpy.int64)
+            return
+
+        self.order = numpy.argsort(morton_codes(corners.mean(axis=1)), kind="stable")
+        starts = numpy.arange(0, self.count, leaf_size)
+
+        # Boxes are padded a little so that rounding in the box test never drops a triangle
+        mins = corners.min(axis=1)[self.order]
+        maxs = corners.max(axis=1)[self.order]
+        padding = (numpy.abs(mins) + numpy.abs(maxs) + 1.0) * 1e-9
+        mins = numpy.minimum.reduceat(mins - padding, starts)
+        maxs = numpy.maximum.reduceat(maxs + padding, starts)
+        self.levels.append((mins, maxs))
+
+        while len(mins) > 1:
+            pairs = len(mins) // 2
+            parent_mins = mins[0::2].copy()
+            parent_maxs = maxs[0::2].copy()
+            numpy.minimum(parent_mins[:pairs], mins[1::2], out=parent_mins[:pairs])
+            numpy.maximum(parent_maxs[:pairs], maxs[1::2], out=parent_maxs[:pairs])
+            mins, maxs = parent_mins, parent_maxs
+            self.levels.append((mins, maxs))
+
+        self.levels.reverse()
+
+    def candidates(self, origin, direction):
+        # Indices of the triangles in all leaves whose boxes are hit by the ray, in no particular order
+        if self.count == 0:
+            return self.order
+
+        origin = numpy.asarray(origin, dtype=numpy.float64)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            inverse = 1.0 / numpy.asarray(direction, dtype=numpy.float64)
+
+            nodes = numpy.zeros(1, dtype=numpy.int64)
+            for depth, (mins, maxs) in enumerate(self.levels):
+                if depth > 0:
+                    nodes = numpy.concatenate((nodes*2, nodes*2 + 1))
+                    nodes = nodes[nodes < len(mins)]
+
+                # Slab test, fmin and fmax skip the NaN of a ray that lies exactly in a box face
+                t1 = (mins[nodes] - origin) * inverse
+                t2 = (maxs[nodes] - origin) * inverse
+                near = numpy.fmin(t1, t2).max(axis=1)
+                far = numpy.fmax(t1, t2).min(axis=1)
+                nodes = nodes[(near <= far) & (far >= 0.0)]
+
+                if len(nodes) == 0:
+                    return nodes
+
+        positions = (nodes[:, None]*self.leaf_size + numpy.arange(self.leaf_size)).ravel()
+        return self.order[positions[positions < self.count]]
+
+
+# Names of the parts of a collision grid, in the order Collision takes them
+GRID_FIELDS = ("start_x", "start_z", "cell_size_x", "cell_size_z", "size_x", "size_z", "buckets", "offsets",
+               "triangles")
+
+
+class CollisionGeometry(object):
+    # The triangles of a collision mesh as arrays, shared by the collision queries, the collision
+    # renderers and the minimap generator. Everything derived from the arrays is computed on first use.
+    def __init__(self, vertices, triangles, collision_types):
+        # vertices is an (n, 3) array, triangles an (m, 3) array of vertex indices starting at 0 and
+        # collision_types holds the type of every triangle, -1 for triangles without a type.
+        self.vertices = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3)
+        self.triangles = numpy.asarray(triangles, dtype=numpy.int64).reshape(-1, 3)
+        self.collision_types = numpy.asarray(collision_types, dtype=numpy.int64)
+
+        self._verts = None
+        self._faces = None
+        self._corners = None
+        self._cross_products = None
+        self._normals = None
+        self._normals_valid = None
+        self._view_normals = None
+        self._bounds = None
+        self._type_order = None
+        self._type_ranges = None
+
+    @classmethod
+    def from_faces(cls, verts, faces):
+        # verts and faces in the format of py_obj.read_obj, faces without a collision type are never hidden
+        geometry = cls([vert[:3] for vert in verts],
+                       numpy.array([(face[0][0], face[1][0], face[2][0]) for face in faces],
+                                   dtype=numpy.int64).reshape(-1, 3) - 1,
+                       [face[3] if len(face) > 3 else -1 for face in faces])
+        geometry._verts = verts
+        geometry._faces = faces
+        return geometry
+
+    @classmethod
+    def from_bco(cls, bco_coll):
+        triangles = bco_coll.triangle_array
+        return cls(bco_coll.vertex_array, triangles["vertices"], triangles["collision_type"])
+
+    @property
+    def verts(self):
+        if self._verts is None:
+            self._verts = [tuple(vertex) for vertex in self.vertices.tolist()]
+        return self._verts
+
+    @property
+    def faces(self):
+        if self._faces is None:
+            self._faces = [((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), coltype) for (v1, v2, v3), coltype
+                           in zip(self.triangles.tolist(), self.collision_types.tolist())]
+        return self._faces
+
+    @property
+    def corners(self):
+        # (m, 3, 3) array of the corners of every triangle
+        if self._corners is None:
+            self._corners = self.vertices[self.triangles]
+        return self._corners
+
+    @property
+    def cross_products(self):
+        # Unnormalized normal of every triangle, the edges v1->v2 and v1->v3 crossed
+        if self._cross_products is None:
+            self._cross_products, self._normals_valid = cross_products(self.corners)
+        return self._cross_products
+
+    @property
+    def normals_valid(self):
+        # Whether a triangle is not degenerate
+        if self._normals_valid is None:
+            self._cross_products, self._normals_valid = cross_products(self.corners)
+        return self._normals_valid
+
+    @property
+    def normals(self):
+        # Unit normal of every triangle, zero for degenerate triangles, in the same order of operations
+        # as the single triangle test used to do them
+        if self._normals is None:
+            valid = self.normals_valid
+            self._normals = self.cross_products.copy()
+            # The length goes through Python floats because numpy's square and square root can round
+            # differently from Python's pow in the last bit
+            lengths = numpy.array([(x**2 + y**2 + z**2)**0.5 for x, y, z in self._normals[valid].tolist()])
+            self._normals[valid] /= lengths.reshape(-1, 1)
+        return self._normals
+
+    @property
+    def view_normals(self):
+        # Unit normals in the axis order of the 3D view, x, -z, y, normalized like lib.vectors.Vector3 does it
+        if self._view_normals is None:
+            valid = self.normals_valid
+            self._view_normals = self.cross_products[:, [0, 2, 1]] * numpy.array((1.0, -1.0, 1.0))
+            lengths = numpy.array([math.sqrt(x**2 + y**2 + z**2)
+                                   for x, y, z in self._view_normals[valid].tolist()])
+            self._view_normals[valid] /= lengths.reshape(-1, 1)
+        return self._view_normals
+
+    @property
+    def bounds(self):
+        # Smallest and biggest vertex coordinates, None if there are no vertices
+        if self._bounds is None and len(self.vertices) > 0:
+            self._bounds = self.vertices.min(axis=0), self.vertices.max(axis=0)
+        return self._bounds
+
+    @property
+    def type_order(self):
+        # Triangle indices sorted by collision type, in file order within a type
+        if self._type_order is None:
+            self._type_order = numpy.argsort(self.collision_types, kind="stable")
+        return self._type_order
+
+    @property
+    def type_ranges(self):
+        # Collision type -> (start, end) of its triangles in type_order, in ascending type order
+        if self._type_ranges is None:
+            self.prepare_rendering()
+        return self._type_ranges
+
+    def prepare_rendering(self):
+        # Computes the type ranges lib.model_rendering.CollisionModel draws the triangles by, so that a loader
+        # thread can do it before the model is made on the GUI thread. The rest it reads is computed when a
+        # Collision is built.
+        sorted_types = self.collision_types[self.type_order]
+        types, starts = numpy.unique(sorted_types, return_index=True)
+        ends = numpy.append(starts[1:], len(sorted_types))
+        self._type_ranges = {coltype: (start, end) for coltype, start, end
+                             in zip(types.tolist(), starts.tolist(), ends.tolist())}
+
+    def save_arrays(self):
+        # The mesh and everything derived from it that is slow to compute, as a dict of arrays
+        return {"vertices": self.vertices, "triangles": self.triangles, "collision_types": self.collision_types,
+                "cross_products": self.cross_products, "normals_valid": self.normals_valid,
+                "normals": self.normals, "view_normals": self.view_normals, "type_order": self.type_order}
+
+    @classmethod
+    def from_saved_arrays(cls, arrays):
+        geometry = cls(arrays["vertices"], arrays["triangles"], arrays["collision_types"])
+        geometry._cross_products = arrays["cross_products"]
+        geometry._normals_valid = arrays["normals_valid"]
+        geometry._normals = arrays["normals"]
+        geometry._view_normals = arrays["view_normals"]
+        geometry._type_order = arrays["type_order"]
+        return geometry
 
 
 class Collision(object):
-    def __init__(self, verts, faces):
-        self.verts = verts
-        self.faces = faces
-        self.triangles = []
-        #print(self.faces)
-        for face in self.faces:
-
-            v1i, v2i, v3i = face[0:3]
-
-            col_type = 0x0100
-            if len(face) > 3:
-                col_type = face[3]
-
-            #print(v1i, v2i, v3i, len(self.verts))
-            x, y, z = verts[v1i[0]-1]
-            v1 = Vector3(x, -z, y)
-            x, y, z = verts[v2i[0]-1]
-            v2 = Vector3(x, -z, y)
-            x, y, z = verts[v3i[0]-1]
-            v3 = Vector3(x, -z, y)
-
-
-            self.triangles.append(Triangle(v1,v2,v3,col_type))
-
+    def __init__(self, verts, faces, grid=None):
+        # grid is an optional spatial index that was already built, e.g. the one stored in a BCO file, as
+        # (start_x, start_z, cell_size_x, cell_size_z, size_x, size_z, cell buckets, offsets, triangle indices).
+        # Cell c = x * size_z + z holds the triangles of bucket b = cell_buckets[c], which are stored like
+        # bin_triangles stores the triangles of a cell. Without it the triangles are binned into square cells.
+        self._build(CollisionGeometry.from_faces(verts, faces), grid)
+
+    @classmethod
+    def from_arrays(cls, vertices, triangles, collision_types, grid=None):
+        # The arrays as CollisionGeometry takes them, e.g. the arrays of a RacetrackCollision
+        return cls.from_geometry(CollisionGeometry(vertices, triangles, collision_types), grid)
+
+    @classmethod
+    def from_geometry(cls, geometry, grid=None):
+        collision = cls.__new__(cls)
+        collision._build(geometry, grid)
+        return collision
+
+    def save_arrays(self):
+        # The geometry and the grid as a dict of arrays, see lib.collision_cache
+        arrays = self.geometry.save_arrays()
+        for name, value in zip(GRID_FIELDS, self.grid):
+            arrays["grid_" + name] = numpy.asarray(value)
+        return arrays
+
+    @classmethod
+    def from_saved_arrays(cls, arrays):
+        grid = tuple(arrays["grid_" + name] for name in GRID_FIELDS)
+        # Plain numbers are stored as arrays without dimensions
+        grid = tuple(value.item() if value.ndim == 0 else value for value in grid)
+        return cls.from_geometry(CollisionGeometry.from_saved_arrays(arrays), grid)
+
+    @property
+    def verts(self):
+        return self.geometry.verts
+
+    @property
+    def faces(self):
+        return self.geometry.faces
+
+    def _build(self, geometry, grid):
+        self.geometry = geometry
+        self.vertex_array = geometry.vertices
+        self.triangle_array = geometry.triangles
+        self.coltype_array = geometry.collision_types
         self.cell_size = 2000
 
-        box_size_x = self.cell_size
-        box_size_z = self.cell_size
-
-        smallest_x =-MAX_X#max(-6000.0, smallest_x)
-        smallest_z = -MAX_Z#max(-6000.0, smallest_z)
-        biggest_x = MAX_X#min(6000.0, biggest_x)
-        biggest_z = MAX_Z#min(6000.0, biggest_z)
-        print("dimensions are changed to", smallest_x, smallest_z, biggest_x, biggest_z)
-        start_x = math.floor(smallest_x / box_size_x) * box_size_x
-        start_z = math.floor(smallest_z / box_size_z) * box_size_z
-        end_x = math.ceil(biggest_x / box_size_x) * box_size_x
-        end_z = math.ceil(biggest_z / box_size_z) * box_size_z
-        diff_x = abs(end_x - start_x)
-        diff_z = abs(end_z - start_z)
-        grid_size_x = int(diff_x // box_size_x)
-        grid_size_z = int(diff_z // box_size_z)
-
-        self.grid = {}
-        triangles = [(i, face) for i, face in enumerate(faces)]
-        subdivide_grid(start_x, start_z, 0, grid_size_x, 0, grid_size_z, self.cell_size, triangles, self.verts, self.grid)
-        print("finished generating triangles")
-        print(grid_size_x, grid_size_z)
+        # Planes and edges v1->v2, v2->v3, v3->v1 of every triangle for the height queries
+        self.triangle_corners = geometry.corners
+        self.triangle_edges = numpy.roll(self.triangle_corners, -1, axis=1) - self.triangle_corners
+        self.plane_normals = normals = geometry.normals
+        self.plane_valid = geometry.normals_valid
+        v1 = self.triangle_corners[:, 0]
+        self.plane_distances = -v1[:, 0]*normals[:, 0] + -v1[:, 1]*normals[:, 1] + -v1[:, 2]*normals[:, 2]
+
+        # Horizontal extents of every triangle as min x, max x, min z, max z, widened a little so that rounding
+        # in the edge tests can't accept a position outside of them. Positions outside skip the full test.
+        xz = self.triangle_corners[:, :, [0, 2]]
+        margin = 1e-6 * (numpy.abs(xz).max(axis=(1, 2)) + 1.0)
+        self.triangle_extents = numpy.column_stack((xz[:, :, 0].min(axis=1) - margin, xz[:, :, 0].max(axis=1) + margin,
+                                                    xz[:, :, 1].min(axis=1) - margin, xz[:, :, 1].max(axis=1) + margin))
+
+        # Triangles for picking rays of the 3D view, which has z and y swapped and z flipped, laid out
+        # like lib.vectors.Triangle. The hierarchy over them is built on the first ray.
+        self.ray_corners = self.triangle_corners[:, :, [0, 2, 1]] * numpy.array((1.0, -1.0, 1.0))
+        self.ray_normals = geometry.view_normals
+        self.ray_normals_valid = self.plane_valid
+        self.bvh = None
+
+        if grid is None:
+            (self.grid_start_x, self.grid_start_z, self.grid_size_x, self.grid_size_z,
+             self.grid_offsets, self.grid_triangles) = bin_triangles(self.vertex_array, self.triangle_array,
+                                                                     self.cell_size)
+            self.cell_size_x = self.cell_size_z = self.cell_size
+            self.grid_buckets = numpy.arange(self.grid_size_x * self.grid_size_z, dtype=numpy.int64)
+        else:
+            (self.grid_start_x, self.grid_start_z, self.cell_size_x, self.cell_size_z, self.grid_size_x,
+             self.grid_size_z, self.grid_buckets, self.grid_offsets, self.grid_triangles) = grid
+        self.grid = (self.grid_start_x, self.grid_start_z, self.cell_size_x, self.cell_size_z, self.grid_size_x,
+                     self.grid_size_z, self.grid_buckets, self.grid_offsets, self.grid_triangles)
 
         self.hidden_coltypes = set()
 
-    def collide_ray_downwards(self, x, z, y=99999999):
-        grid_x = int((x+MAX_X) // self.cell_size)
-        grid_z = int((z+MAX_Z) // self.cell_size)
-
-        if grid_x not in self.grid or grid_z not in self.grid[grid_x]:
-            return None
-
-        triangles = self.grid[grid_x][grid_z]
-
-        verts = self.verts
-
-        y = y
-        dir_x = 0
-        dir_y = -1.0
-        dir_z = 0
-
-        hit = None
+    @property
+    def hidden_coltypes(self):
+        return self._hidden_coltypes
 
-        result = self._collide(verts, triangles, x, y, z, -1.0)
+    @hidden_coltypes.setter
+    def hidden_coltypes(self, coltypes):
+        # Assign a new set to change the hidden types, the mask of visible triangles is rebuilt here
+        self._hidden_coltypes = coltypes
+        self.visible_mask = ~numpy.isin(self.coltype_array, list(coltypes))
 
-        return result
+    def get_cell_indices(self, x, z):
+        grid_x = int((x - self.grid_start_x) // self.cell_size_x)
+        grid_z = int((z - self.grid_start_z) // self.cell_size_z)
 
-    def collide_ray_closest(self, x, z, y):
-        grid_x = int((x + MAX_X) // self.cell_size)
-        grid_z = int((z + MAX_Z) // self.cell_size)
-
-        if grid_x not in self.grid or grid_z not in self.grid[grid_x]:
+        if not (0 <= grid_x < self.grid_size_x and 0 <= grid_z < self.grid_size_z):
             return None
 
-        triangles = self.grid[grid_x][grid_z]
-
-        verts = self.verts
-
-        y = y
-        dir_x = 0
-        dir_y = -1.0
-        dir_z = 0
+        cell = grid_x * self.grid_size_z + grid_z
+        bucket = self.grid_buckets[cell]
+        return self.grid_triangles[self.grid_offsets[bucket]:self.grid_offsets[bucket + 1]]
 
-        hit = None
-
-        result1 = self._collide(verts, triangles, x, y, z, -1.0)
-        result2 = self._collide(verts, triangles, x, y, z, 1.0)
-
-        if result1 is None and result2 is None:
+    def get_cell_triangles(self, x, z):
+        indices = self.get_cell_indices(x, z)
+        if indices is None:
             return None
-        elif result1 is None:
-            return result2
-        elif result2 is None:
-            return result1
-        else:
-            dist1 = abs(y - result1)
-            dist2 = abs(y - result2)
-            if dist1 > dist2:
-                return result2
-            else:
-                return result1
 
-    def _collide(self, verts, triangles, x, y, z, dir_y):
-        hit = None
-        for i, face in triangles:#face in self.faces:#
-            #print(face)
-            v1index, v2index, v3index = face[:3]
-            if len(face) > 3 and (face[3] in self.hidden_coltypes):
-                continue
+        return [(i, self.faces[i]) for i in indices.tolist()]
 
-            v1 = verts[v1index[0]-1]
-            v2 = verts[v2index[0]-1]
-            v3 = verts[v3index[0]-1]
-
-            edge1 = create_vector(v1, v2)
-            edge2 = create_vector(v1, v3)
-
-            normal = cross_product(edge1, edge2)
-            if normal[0] == normal[1] == normal[2] == 0.0:
-                continue
-            normal = normalize_vector(normal)
-
-            D = -v1[0]*normal[0] + -v1[1]*normal[1] + -v1[2]*normal[2]
-
-            if normal[1]*dir_y == 0.0:#abs(normal[1] * dir_y) < 10**(-6):
-                continue # triangle parallel to ray
-
-            t = -(normal[0] * x + normal[1] * y + normal[2] * z + D) / (normal[1]*dir_y)
-
-            point = x, (y+dir_y*t), z
-            #print(point)
-            edg1 = create_vector(v1, v2)
-            edg2 = create_vector(v2, v3)
-            edg3 = create_vector(v3, v1)
+    def collide_ray_downwards(self, x, z, y=99999999):
+        indices = self.get_cell_indices(x, z)
+        if indices is None:
+            return None
 
-            vectest1 = cross_product(edg1, create_vector(v1, point))
-            vectest2 = cross_product(edg2, create_vector(v2, point))
-            vectest3 = cross_product(edg3, create_vector(v3, point))
+        return self._collide(indices, x, y, z)
 
-            if ((normal[0]*vectest1[0] + normal[1]*vectest1[1] + normal[2]*vectest1[2]) >= 0 and
-                 (normal[0]*vectest2[0] + normal[1]*vectest2[1] + normal[2]*vectest2[2]) >= 0 and
-                  (normal[0]*vectest3[0] + normal[1]*vectest3[1] + normal[2]*vectest3[2]) >= 0):
+    def collide_ray_closest(self, x, z, y):
+        # Casting up instead of down finds the same plane intersections, so one test covers both
+        indices = self.get_cell_indices(x, z)
+        if indices is None:
+            return None
 
-                height = point[1]
+        return self._collide(indices, x, y, z)
 
-                if hit is None or abs(y - height) < abs(y - hit):
-                    hit = height
+    def _collide(self, indices, x, y, z):
+        indices = indices[self.visible_mask[indices]]
+        valid, heights = self._intersect(indices, x, y, z, -1.0)
+        if not valid.any():
+            return None
 
-        return hit
+        # The hit closest to y, the first one in cell order on ties
+        distances = numpy.where(valid, numpy.abs(y - heights), numpy.inf)
+        return float(heights[numpy.argmin(distances)])
+
+    def _intersect(self, indices, x, y, z, dir_y):
+        # Intersects vertical rays at (x, z) starting at height y with the planes of the given triangles
+        # and tests whether the hits are inside the triangles. x, y, z are numbers or arrays of the same
+        # length as indices. Returns the mask of hits and the hit heights.
+        normals = self.plane_normals[indices]
+        nx, ny, nz = normals[:, 0], normals[:, 1], normals[:, 2]
+        corners = self.triangle_corners[indices]
+        edges = self.triangle_edges[indices]
+        valid = self.plane_valid[indices] & (ny*dir_y != 0.0)
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            t = -(nx*x + ny*y + nz*z + self.plane_distances[indices]) / (ny*dir_y)
+            heights = y + dir_y*t
+
+            for i in range(3):
+                edge = edges[:, i]
+                to_x = x - corners[:, i, 0]
+                to_y = heights - corners[:, i, 1]
+                to_z = z - corners[:, i, 2]
+                valid &= (nx*(edge[:, 1]*to_z - edge[:, 2]*to_y)
+                          + ny*(edge[:, 2]*to_x - edge[:, 0]*to_z)
+                          + nz*(edge[:, 0]*to_y - edge[:, 1]*to_x)) >= 0
+
+        return valid, heights
+
+    def collide_rays_down_many(self, xs, ys, zs):
+        # collide_ray_downwards for many positions at once. Returns an array of heights that is NaN
+        # where nothing was hit. ys may be None to start every ray from the default height.
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        if ys is None:
+            ys = numpy.full(len(xs), 99999999.0)
+        return self._collide_many(xs, ys, zs)
+
+    def collide_rays_closest_many(self, xs, ys, zs):
+        # collide_ray_closest for many positions at once, NaN where nothing was hit.
+        return self._collide_many(xs, ys, zs)
+
+    def _collide_many(self, xs, ys, zs):
+        # Same test as _collide, done for all pairs of position and triangle in the position's cell
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        zs = numpy.asarray(zs, dtype=numpy.float64)
+        heights = numpy.full(len(xs), numpy.nan)
+
+        grid_x = numpy.floor_divide(xs - self.grid_start_x, self.cell_size_x)
+        grid_z = numpy.floor_divide(zs - self.grid_start_z, self.cell_size_z)
+        inside = numpy.flatnonzero((grid_x >= 0) & (grid_x < self.grid_size_x)
+                                   & (grid_z >= 0) & (grid_z < self.grid_size_z))
+        if len(inside) == 0:
+            return heights
+
+        buckets = self.grid_buckets[grid_x[inside].astype(numpy.int64) * self.grid_size_z
+                                    + grid_z[inside].astype(numpy.int64)]
+        starts = self.grid_offsets[buckets]
+        counts = self.grid_offsets[buckets + 1] - starts
+        query = numpy.repeat(inside, counts)
+        local = numpy.arange(len(query)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        triangle = self.grid_triangles[numpy.repeat(starts, counts) + local]
+
+        # Only the pairs where the position is within the horizontal extents of the visible triangle can hit
+        extents = numpy.take(self.triangle_extents, triangle, axis=0)
+        x = numpy.take(xs, query)
+        z = numpy.take(zs, query)
+        candidates = numpy.flatnonzero(numpy.take(self.visible_mask, triangle)
+                                       & (x >= extents[:, 0]) & (x <= extents[:, 1])
+                                       & (z >= extents[:, 2]) & (z <= extents[:, 3]))
+        query = query[candidates]
+        triangle = triangle[candidates]
+
+        y = ys[query]
+        valid, hit_heights = self._intersect(triangle, xs[query], y, zs[query], -1.0)
+
+        # Per position the hit closest to its height, the first one in cell order on ties
+        hits = numpy.flatnonzero(valid)
+        distance = numpy.abs(y[hits] - hit_heights[hits])
+        order = numpy.lexsort((hits, distance, query[hits]))
+        hit_queries, first = numpy.unique(query[hits][order], return_index=True)
+        heights[hit_queries] = hit_heights[hits[order[first]]]
+
+        return heights
 
     def collide_ray(self, ray):
-        best_distance = None
-        place_at = None
-
-        for tri in self.triangles:
-            collision = ray.collide(tri)
-
-            if collision is not False:
-                point, distance = collision
-
-                if best_distance is None or distance < best_distance:
-                    place_at = point
-                    best_distance = distance
+        # Nearest hit of the ray in front of its origin, tested like Line.collide does for the
+        # triangles whose bounding volumes the ray passes through
+        if self.bvh is None:
+            self.bvh = TriangleBVH(self.ray_corners)
+
+        origin = (ray.origin.x, ray.origin.y, ray.origin.z)
+        direction = (ray.direction.x, ray.direction.y, ray.direction.z)
+        indices = self.bvh.candidates(origin, direction)
+        indices = indices[self.ray_normals_valid[indices]]
+
+        normals = self.ray_normals[indices]
+        nx, ny, nz = normals[:, 0], normals[:, 1], normals[:, 2]
+        corners = self.ray_corners[indices]
+        ox, oy, oz = origin
+        dx, dy, dz = direction
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            facing = nx*dx + ny*dy + nz*dz
+            d = ((corners[:, 0, 0] - ox)*nx + (corners[:, 0, 1] - oy)*ny + (corners[:, 0, 2] - oz)*nz) / facing
+            valid = (facing != 0) & (d >= 0)
+
+            hit_x = ox + dx*d
+            hit_y = oy + dy*d
+            hit_z = oz + dz*d
+
+            for i in range(3):
+                start = corners[:, i]
+                end = corners[:, (i + 1) % 3]
+                edge_x, edge_y, edge_z = end[:, 0] - start[:, 0], end[:, 1] - start[:, 1], end[:, 2] - start[:, 2]
+                to_x, to_y, to_z = hit_x - start[:, 0], hit_y - start[:, 1], hit_z - start[:, 2]
+                valid &= (nx*(edge_y*to_z - edge_z*to_y)
+                          + ny*(edge_z*to_x - edge_x*to_z)
+                          + nz*(edge_x*to_y - edge_y*to_x)) > 0
+
+        hits = numpy.flatnonzero(valid)
+        if len(hits) == 0:
+            return None
 
-        return place_at
\ No newline at end of file
+        # The nearest hit, the first triangle in file order on ties
+        best = hits[numpy.lexsort((indices[hits], d[hits]))[0]]
+        return Vector3(float(hit_x[best]), float(hit_y[best]), float(hit_z[best]))
\ No newline at end of file
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+
+import numpy
+
+from .collision import Collision
+from .model_rendering import TexturedModel
+
+# Bump this when the arrays stored for a collision change, older entries are then never looked at again
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(tempfile.gettempdir(), "mkdd_track_editor_collision_cache")
+# Default size limit of all cache entries together
+DEFAULT_CACHE_SIZE = 256*1024*1024
+
+
+def content_key(data):
+    return "{0}_v{1}".format(hashlib.sha1(data).hexdigest(), CACHE_FORMAT_VERSION)
+
+
+def model_key(data):
+    # Entries that hold a TexturedModel next to the collision
+    return content_key(data) + "_model"
+
+
+class CollisionCache(object):
+    # Processed collision meshes stored as .npz files, keyed by the content of the file they were made from.
+    # For models that are converted first, the model drawn in place of the collision is stored with it.
+    # Entries that were used least recently are removed once the cache grows beyond max_size bytes.
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, data, build):
+        # Returns the collision made from the file content data, calling build() to make it if it isn't cached
+        key = content_key(data)
+        collision = self.load(key)
+        if collision is None:
+            collision = build()
+            self.store(key, collision)
+
+        return collision
+
+    def get_with_model(self, data, build):
+        # Returns the collision and the TexturedModel made from the file content data, e.g. a BMD model that has
+        # to be converted before either can be made. build() is called to make both if they aren't cached.
+        key = model_key(data)
+        loaded = self.load(key, with_model=True)
+        if loaded is None:
+            loaded = build()
+            self.store(key, *loaded)
+
+        return loaded
+
+    def load(self, key, with_model=False):
+        # Returns the collision, and the model as well if with_model is set
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with numpy.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            collision = Collision.from_saved_arrays(arrays)
+            if with_model:
+                model = TexturedModel.from_saved_arrays(arrays)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as err:
+            print("Removing unreadable collision cache entry", path, str(err))
+            self.remove(path)
+            return None
+
+        # The modification time is the time of last use
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        if with_model:
+            return collision, model
+        return collision
+
+    def store(self, key, collision, model=None):
+        path = self.path(key)
+        temp_path = path + ".tmp"
+        arrays = collision.save_arrays()
+        if model is not None:
+            arrays.update(model.save_arrays())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "wb") as f:
+                numpy.savez(f, **arrays)
+            os.replace(temp_path, path)
+        except OSError as err:
+            print("Failed to write collision cache entry", path, str(err))
+            self.remove(temp_path)
+            return
+
+        self.trim()
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def entries(self):
+        # (time of last use, size, path) of every entry, oldest first
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+
+        for name in names:
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        return entries
+
+    def trim(self):
+        # Removes the least recently used entries until the cache fits max_size, the newest entry is always kept
+        entries = self.entries()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries[:-1]:
+            if size <= self.max_size:
+                break
+            self.remove(path)
+            size -= entry_size
@@ -0,0 +1,145 @@
+from io import BytesIO
+from timeit import default_timer
+
+from .BCOllider import RacetrackCollision
+from .rarc import Archive
+from .bmd_render import superbmd_to_obj, clear_temp_folder
+from .collision import Collision, CollisionGeometry
+from .model_rendering import TexturedModel
+import py_obj
+
+# The parts of loading collision that don't need the GUI thread: reading and converting files, parsing
+# and building the collision grid. The functions take a progress callback that is called with a short
+# description of each stage as it starts, and return the time each stage took.
+
+
+class LoadTimes(object):
+    def __init__(self):
+        self.stages = []
+        self.last = default_timer()
+
+    def stage(self, name):
+        # Ends the current stage, which is named name
+        now = default_timer()
+        self.stages.append((name, now - self.last))
+        self.last = now
+
+    def add(self, name, seconds):
+        # A stage that was timed elsewhere, e.g. on another thread
+        self.stages.append((name, seconds))
+
+    def total(self):
+        return sum(seconds for name, seconds in self.stages)
+
+    def __str__(self):
+        return ", ".join("{0} {1:.3f}s".format(name, seconds) for name, seconds in self.stages)
+
+
+def read_archive_file(path, ending):
+    # Content of the file in the archive at path whose name ends with ending
+    with open(path, "rb") as f:
+        archive = Archive.from_file(f, lazy=True)
+
+    filepath = archive.find_path(ending, archive.root.name)
+    if filepath is None:
+        raise RuntimeError("No Course File found!")
+    return archive[filepath].getvalue()
+
+
+def read_source(source):
+    # source is the path of a file, its content or a function that returns its content
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    elif callable(source):
+        return source()
+    else:
+        return source
+
+
+def load_bco_collision(source, cache, progress):
+    # source is given like read_source takes it. Returns the RacetrackCollision, the Collision and the LoadTimes.
+    times = LoadTimes()
+    progress("reading")
+    data = read_source(source)
+    times.stage("read")
+
+    progress("parsing")
+    bco_coll = RacetrackCollision()
+    bco_coll.load_file(BytesIO(data))
+    times.stage("parse")
+
+    progress("building collision grid")
+
+    def build():
+        return Collision.from_geometry(CollisionGeometry.from_bco(bco_coll), bco_coll.read_grid())
+
+    collision = cache.get(bco_coll.data, build)
+    collision.geometry.prepare_rendering()
+    times.stage("grid")
+
+    return bco_coll, collision, times
+
+
+def read_obj_collision(objpath):
+    with open(objpath, "r") as f:
+        verts, faces, normals = py_obj.read_obj(f)
+    return Collision(verts, faces)
+
+
+def load_obj_collision(objpath, cache, progress, times=None):
+    # Returns the Collision of an OBJ file, the TexturedModel drawn in its place and the LoadTimes
+    if times is None:
+        times = LoadTimes()
+
+    progress("reading")
+    with open(objpath, "rb") as f:
+        data = f.read()
+    times.stage("read")
+
+    progress("parsing and building collision grid")
+    collision = cache.get(data, lambda: read_obj_collision(objpath))
+    times.stage("parse and grid")
+
+    progress("reading textured model")
+    # Textures are only uploaded when the model is first drawn
+    model = TexturedModel.from_obj_path(objpath, rotate=True)
+    times.stage("model")
+
+    return collision, model, times
+
+
+def load_bmd_collision(bmdpath, cache, progress, source=None):
+    # Converts a BMD file to lib/temp/temp.obj and returns the Collision of it, the TexturedModel drawn in its
+    # place and the LoadTimes. With source given like read_source takes it, the model is written to bmdpath
+    # first. Both are cached by the content of the BMD file, so a cached model isn't converted again.
+    times = LoadTimes()
+    progress("reading model")
+    data = read_source(bmdpath if source is None else source)
+    times.stage("read")
+
+    def build():
+        # Cleared here rather than by the caller, loads run one after the other on the loader thread and an
+        # earlier one may still be reading the folder
+        clear_temp_folder()
+        if source is not None:
+            with open(bmdpath, "wb") as f:
+                f.write(data)
+
+        progress("converting model")
+        superbmd_to_obj(bmdpath)
+        times.stage("convert")
+
+        progress("parsing and building collision grid")
+        collision = read_obj_collision("lib/temp/temp.obj")
+        times.stage("parse and grid")
+
+        progress("reading textured model")
+        model = TexturedModel.from_obj_path("lib/temp/temp.obj", rotate=True)
+        times.stage("model")
+        return collision, model
+
+    collision, model = cache.get_with_model(data, build)
+    times.stage("cache")
+
+    return collision, model, times
@@ -0,0 +1,91 @@
+import numpy
+
+# Coordinates here are the ones the views draw in, (x, -z, y) of a position
+
+
+class Frustum(object):
+    # The six planes of the volume that the view shows, taken from its projection * modelview matrix.
+    # Works for the perspective 3D view and for the ortho top down view alike.
+    def __init__(self, mvp):
+        mvp = numpy.asarray(mvp, dtype=numpy.float64)
+        planes = numpy.array([mvp[3] + mvp[0], mvp[3] - mvp[0],
+                              mvp[3] + mvp[1], mvp[3] - mvp[1],
+                              mvp[3] + mvp[2], mvp[3] - mvp[2]])
+        lengths = numpy.sqrt((planes[:, :3]**2).sum(axis=1))
+        self.planes = planes / lengths.reshape(-1, 1)
+        self._plane_list = self.planes.tolist()
+
+    def sphere_visible(self, x, y, z, radius):
+        for a, b, c, d in self._plane_list:
+            if a*x + b*y + c*z + d < -radius:
+                return False
+        return True
+
+    def position_visible(self, position, radius):
+        return self.sphere_visible(position.x, -position.z, position.y, radius)
+
+    def box_visible(self, bounds_min, bounds_max):
+        # Whether any part of the box might be visible, the corner of the box furthest along a plane's
+        # normal has to be in front of every plane
+        for a, b, c, d in self._plane_list:
+            x = bounds_max[0] if a > 0 else bounds_min[0]
+            y = bounds_max[1] if b > 0 else bounds_min[1]
+            z = bounds_max[2] if c > 0 else bounds_min[2]
+            if a*x + b*y + c*z + d < 0:
+                return False
+        return True
+
+    def points_visible(self, points, radius):
+        # Mask of the spheres around the (n, 3) points that might be visible
+        distances = numpy.asarray(points, dtype=numpy.float64) @ self.planes[:, :3].T + self.planes[:, 3]
+        return (distances >= -radius).all(axis=1)
+
+
+class GroupBounds(object):
+    # Bounding boxes of groups of positions such as routes, kept until clear() is called because the
+    # document changed. Groups are looked up by identity.
+    def __init__(self, padding):
+        self.padding = padding
+        self._bounds = {}
+
+    def clear(self):
+        self._bounds = {}
+
+    def get(self, group, members, position_of):
+        # Bounds of the positions of the members of the group as (min, max), None if it has no members
+        entry = self._bounds.get(id(group))
+        if entry is None or entry[0] is not group:
+            positions = []
+            for member in members:
+                for position in position_of(member):
+                    positions.append((position.x, -position.z, position.y))
+
+            if positions:
+                positions = numpy.array(positions)
+                bounds = (positions.min(axis=0) - self.padding, positions.max(axis=0) + self.padding)
+            else:
+                bounds = None
+            entry = (group, bounds)
+            self._bounds[id(group)] = entry
+
+        return entry[1]
+
+
+class CullStats(object):
+    # How many things of each kind were drawn and culled in the last frame
+    def __init__(self):
+        self.drawn = {}
+        self.culled = {}
+
+    def reset(self):
+        self.drawn = {}
+        self.culled = {}
+
+    def count(self, kind, visible, amount=1):
+        counts = self.drawn if visible else self.culled
+        counts[kind] = counts.get(kind, 0) + amount
+
+    def __str__(self):
+        kinds = sorted(set(self.drawn) | set(self.culled))
+        return ", ".join("{0} {1} drawn {2} culled".format(kind, self.drawn.get(kind, 0), self.culled.get(kind, 0))
+                         for kind in kinds)
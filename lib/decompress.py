@@ -1,10 +1,8 @@
 import sys 
-from yaz0 import decompress
-from io import BytesIO
+from yaz0 import decompress_data
 inputfile = sys.argv[1]
 
 with open(inputfile, "rb") as f:
-    out = BytesIO()
-    decompress(f, out)
+    out = decompress_data(f.read())
     with open(inputfile+".bin", "wb") as g:
-        g.write(out.getvalue())
\ No newline at end of file
+        g.write(out)
@@ -0,0 +1,54 @@
+from math import isnan
+from timeit import default_timer
+
+# Default time that grounding dragged positions may take per frame, in seconds
+DEFAULT_SNAP_BUDGET = 0.008
+# Positions grounded by one batch query, small enough that a batch doesn't overshoot the budget by much
+SNAP_CHUNK_SIZE = 128
+
+
+class GroundSnapper(object):
+    # Keeps dragged positions on the collision. Every move marks all dragged positions for grounding,
+    # step() then grounds as many of them as fit into the time budget. Positions that didn't fit are grounded
+    # first by the next step, so with many positions every one of them is still grounded every few frames.
+    def __init__(self, budget=DEFAULT_SNAP_BUDGET, chunk_size=SNAP_CHUNK_SIZE):
+        self.budget = budget
+        self.chunk_size = chunk_size
+        self.positions = []
+        self.cursor = 0
+        self.pending = 0
+
+    def move(self, positions):
+        self.positions = list(positions)
+        self.pending = len(self.positions)
+        if self.cursor >= len(self.positions):
+            self.cursor = 0
+
+    def clear(self):
+        self.positions = []
+        self.cursor = 0
+        self.pending = 0
+
+    def step(self, collision):
+        # Returns the number of positions that were grounded and the time it took in seconds
+        start = default_timer()
+        grounded = 0
+        count = len(self.positions)
+
+        while self.pending > 0:
+            end = self.cursor + min(self.chunk_size, self.pending)
+            chunk = self.positions[self.cursor:end] + self.positions[:max(end - count, 0)]
+            heights = collision.collide_rays_closest_many(
+                [pos.x for pos in chunk], [pos.y for pos in chunk], [pos.z for pos in chunk])
+
+            for pos, height in zip(chunk, heights.tolist()):
+                if not isnan(height):
+                    pos.y = height
+
+            grounded += len(chunk)
+            self.pending -= len(chunk)
+            self.cursor = end % count
+            if default_timer() - start >= self.budget:
+                break
+
+        return grounded, default_timer() - start
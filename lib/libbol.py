@@ -1,5 +1,5 @@
 import json
-from struct import unpack, pack
+from struct import unpack, pack, Struct
 from numpy import ndarray, array, arctan
 from math import cos, sin
 from .vectors import Vector3
@@ -73,27 +73,51 @@ def write_padding(f, multiple):
         f.write(PADDING[pos:pos + 1])
 
 
-class Rotation(object):
-    def __init__(self, forward, up, left):
-        self.mtx = ndarray(shape=(4,4), dtype=float, order="F")
+# Layouts of the fixed-size entries of each section, for decoding whole sections at once
+ENEMYPOINT_STRUCT = Struct(">fffHhfbBBBBBB5x")
+ENEMYPOINT_OLD_STRUCT = Struct(">fffHhfHBB")
+CHECKPOINTGROUP_STRUCT = Struct(">HHhhhhhhhh")
+CHECKPOINT_STRUCT = Struct(">ffffffBBBB")
+ROUTE_STRUCT = Struct(">HHIB7x")
+ROUTEPOINT_STRUCT = Struct(">fffI16x")
+MAPOBJECT_STRUCT = Struct(">ffffffhhhhhhHhHhBBBBhhhhhhhh")
+KARTSTARTPOINT_STRUCT = Struct(">ffffffhhhhhhBBH")
+AREA_STRUCT = Struct(">ffffffhhhhhhBBhIIhhhh")
+CAMERA_STRUCT = Struct(">fffhhhhhhffffffBBHHHHHhHHh4s")
+JUGEMPOINT_STRUCT = Struct(">fffhhhhhhHhhh")
+LIGHTPARAM_STRUCT = Struct(">BBBBfffBBBB")
+MGENTRY_STRUCT = Struct(">hhhh")
 
-        self.mtx[0][0] = forward.x
-        self.mtx[0][1] = -forward.z
-        self.mtx[0][2] = forward.y
-        self.mtx[0][3] = 0.0
+# The writer fills padding with its own bytes and differs from the reader in signedness for some fields
+BOL_HEADER_STRUCT = Struct(">4sBBBBBBBBfffBBHHHHHHHBBBBffBBBBBBBBBBBB4x11I12s")
+ENEMYPOINT_WRITE_STRUCT = Struct(">fffHhfbBBBBBB5s")
+ROUTE_WRITE_STRUCT = Struct(">HHIB7s")
+ROUTEPOINT_WRITE_STRUCT = Struct(">fffI16s")
+MAPOBJECT_WRITE_STRUCT = Struct(">ffffffhhhhhhhhHhBBBBhhhhhhhh")
+JUGEMPOINT_WRITE_STRUCT = Struct(">fffhhhhhhHHhh")
 
-        self.mtx[1][0] = left.x
-        self.mtx[1][1] = -left.z
-        self.mtx[1][2] = left.y
-        self.mtx[1][3] = 0.0
 
-        self.mtx[2][0] = up.x
-        self.mtx[2][1] = -up.z
-        self.mtx[2][2] = up.y
-        self.mtx[2][3] = 0.0
+def unpack_section(data, offset, count, struct):
+    return struct.iter_unpack(data[offset:offset + count*struct.size])
 
-        self.mtx[3][0] = self.mtx[3][1] = self.mtx[3][2] = 0.0
-        self.mtx[3][3] = 1.0
+
+def pack_section(buffer, offset, struct, entries):
+    for values in entries:
+        struct.pack_into(buffer, offset, *values)
+        offset += struct.size
+
+    return offset
+
+
+class Rotation(object):
+    def __init__(self, forward, up, left):
+        # Built in one go, setting the 16 entries one by one is slow when loading many objects
+        self.mtx = array([
+            (forward.x, -forward.z, forward.y, 0.0),
+            (left.x, -left.z, left.y, 0.0),
+            (up.x, -up.z, up.y, 0.0),
+            (0.0, 0.0, 0.0, 1.0)
+        ], dtype=float, order="F")
 
     @classmethod
     def from_matrix(cls, matrix):
@@ -186,20 +210,14 @@ class Rotation(object):
         self.mtx[3][0] = self.mtx[3][1] = self.mtx[3][2] = 0.0
         self.mtx[3][3] = 1.0
 
-    def write(self, f):
-        forward = Vector3(self.mtx[0][0], self.mtx[0][2], -self.mtx[0][1])
-        up = Vector3(self.mtx[2][0], self.mtx[2][2], -self.mtx[2][1])
+    def to_mkdd_rotation(self):
+        # Plain floats are much quicker to round than indexing into the matrix entry by entry
+        (fx, fz, fy, _), _, (ux, uz, uy, _), _ = self.mtx.tolist()
+        return (round(fx * 10000), round(fy * 10000), round(-fz * 10000),
+                round(ux * 10000), round(uy * 10000), round(-uz * 10000))
 
-        f.write(pack(">hhh",
-                     int(round(forward.x * 10000)),
-                     int(round(forward.y * 10000)),
-                     int(round(forward.z * 10000))
-                     ))
-        f.write(pack(">hhh",
-                     int(round(up.x * 10000)),
-                     int(round(up.y * 10000)),
-                     int(round(up.z * 10000))
-                     ))
+    def write(self, f):
+        f.write(pack(">hhhhhh", *self.to_mkdd_rotation()))
 
     def get_euler(self):
         rot_matrix = [
@@ -361,6 +379,22 @@ class EnemyPoint(object):
             obj._size += 8
         return obj
 
+    @classmethod
+    def from_values(cls, values, old_bol=False):
+        if not old_bol:
+            obj = cls(Vector3(*values[0:3]), *values[3:])
+        else:
+            obj = cls(Vector3(*values[0:3]), *values[3:], 0, 0, 0, 0)
+        obj._size = 0x20
+        return obj
+
+    def to_values(self):
+        return (self.position.x, self.position.y, self.position.z,
+                self.driftdirection, self.link, self.scale,
+                self.swerve, self.itemsonly, self.group, self.driftacuteness,
+                self.driftduration, self.driftsupplement, self.nomushroomzone,
+                b"\x01"*5)
+
     def copy(self):
         point = self.__class__.new()
         point.position = self.position.copy()
@@ -451,12 +485,15 @@ class EnemyPointGroups(object):
 
     @classmethod
     def from_file(cls, f, count, old_bol=False):
+        return cls.from_points(EnemyPoint.from_file(f, old_bol) for i in range(count))
+
+    @classmethod
+    def from_points(cls, enemypoints):
         enemypointgroups = cls()
         group_ids = {}
         curr_group = None
 
-        for i in range(count):
-            enemypoint = EnemyPoint.from_file(f, old_bol)
+        for enemypoint in enemypoints:
             #print("Point", i, "in group", enemypoint.group, "links to", enemypoint.link)
             if enemypoint.group not in group_ids:
                 # start of group
@@ -600,6 +637,20 @@ class CheckpointGroup(object):
 
         return checkpointgroup
 
+    @classmethod
+    def from_values(cls, values):
+        checkpointgroup = cls(values[1])
+        checkpointgroup._pointcount = values[0]
+        checkpointgroup.prevgroup[0:4] = values[2:6]
+        checkpointgroup.nextgroup[0:4] = values[6:10]
+
+        return checkpointgroup
+
+    def to_values(self):
+        self._pointcount = len(self.points)
+
+        return (self._pointcount, self.grouplink, *self.prevgroup[0:4], *self.nextgroup[0:4])
+
 
 
 
@@ -641,6 +692,23 @@ class Checkpoint(object):
         assert unk3 == 0 or unk3 == 1
         return cls(start, end, unk1, unk2, unk3, unk4)
 
+    @classmethod
+    def from_values(cls, values):
+        unk1, unk2, unk3, unk4 = values[6:10]
+        assert unk4 == 0
+        assert unk2 == 0 or unk2 == 1
+        assert unk3 == 0 or unk3 == 1
+        return cls(Vector3(*values[0:3]), Vector3(*values[3:6]), unk1, unk2, unk3, unk4)
+
+    def to_values(self):
+        if not ( self.unk3 == 1 and self.unk4 == 1 ):
+            flags = (self.unk1, self.unk2, self.unk3, self.unk4)
+        else:
+            flags = (0, 0, 0, 4)
+
+        return (self.start.x, self.start.y, self.start.z,
+                self.end.x, self.end.y, self.end.z, *flags)
+
 
 
 
@@ -675,6 +743,19 @@ class CheckpointGroups(object):
 
         return checkpointgroups
 
+    @classmethod
+    def from_data(cls, data, offset, count):
+        checkpointgroups = cls()
+        checkpointgroups.groups = [CheckpointGroup.from_values(values)
+                                   for values in unpack_section(data, offset, count, CHECKPOINTGROUP_STRUCT)]
+
+        pointcount = sum(group._pointcount for group in checkpointgroups.groups)
+        points = unpack_section(data, offset + count*CHECKPOINTGROUP_STRUCT.size, pointcount, CHECKPOINT_STRUCT)
+        for group in checkpointgroups.groups:
+            group.points = [Checkpoint.from_values(next(points)) for i in range(group._pointcount)]
+
+        return checkpointgroups
+
 
 
 
@@ -764,6 +845,13 @@ class Route(object):
 
         return route
 
+    @classmethod
+    def from_values(cls, values):
+        route = cls()
+        route._pointcount, route._pointstart, route.unk1, route.unk2 = values
+
+        return route
+
     def add_routepoints(self, points):
         for i in range(self._pointcount):
             self.points.append(points[self._pointstart+i])
@@ -773,6 +861,9 @@ class Route(object):
         f.write(pack(">IB", self.unk1, self.unk2))
         f.write(b"\x04"*7)
 
+    def to_values(self, pointstart):
+        return (len(self.points), pointstart, self.unk1, self.unk2, b"\x04"*7)
+
 #here for type checking - they function in the same way
 class ObjectRoute(Route):
     def __init__(self):
@@ -824,6 +915,15 @@ class RoutePoint(object):
         #assert padding == b"\x00"*16
         return point
 
+    @classmethod
+    def from_values(cls, values):
+        point = cls(Vector3(*values[0:3]))
+        point.unk = values[3]
+        return point
+
+    def to_values(self):
+        return (self.position.x, self.position.y, self.position.z, self.unk, b"\x96"*16)
+
     def copy(self):
         this_class = self.__class__
         obj = this_class.new()
@@ -906,6 +1006,27 @@ class MapObject(object):
         obj._size = f.tell() - start
         return obj
 
+    @classmethod
+    def from_values(cls, values):
+        obj = cls(Vector3(*values[0:3]), values[12])
+        obj.scale = Vector3(*values[3:6])
+        obj.rotation = Rotation.from_mkdd_rotation(*values[6:12])
+        (obj.route, obj.unk_28, obj.unk_2a,
+         obj.presence_filter, obj.presence, obj.unk_flag, obj.unk_2f) = values[13:20]
+        obj.userdata = list(values[20:28])
+        obj._size = MAPOBJECT_STRUCT.size
+        return obj
+
+    def to_values(self):
+        self.userdata = [0 if x is None else x for x in self.userdata]
+
+        return (self.position.x, self.position.y, self.position.z,
+                self.scale.x, self.scale.y, self.scale.z,
+                *self.rotation.to_mkdd_rotation(),
+                self.objectid, self.route, self.unk_28, self.unk_2a,
+                self.presence_filter, self.presence, self.unk_flag, self.unk_2f,
+                *self.userdata[0:8])
+
 
 
 
@@ -1026,6 +1147,20 @@ class KartStartPoint(object):
         #assert kstart.unknown == 0
         return kstart
 
+    @classmethod
+    def from_values(cls, values):
+        kstart = cls(Vector3(*values[0:3]))
+        kstart.scale = Vector3(*values[3:6])
+        kstart.rotation = Rotation.from_mkdd_rotation(*values[6:12])
+        kstart.poleposition, kstart.playerid, kstart.unknown = values[12:15]
+        return kstart
+
+    def to_values(self):
+        return (self.position.x, self.position.y, self.position.z,
+                self.scale.x, self.scale.y, self.scale.z,
+                *self.rotation.to_mkdd_rotation(),
+                self.poleposition, self.playerid, self.unknown)
+
 
 
 
@@ -1126,6 +1261,27 @@ class Area(object):
 
         return area
 
+    @classmethod
+    def from_values(cls, values):
+        area = cls(Vector3(*values[0:3]))
+        area.scale = Vector3(*values[3:6])
+        area.rotation = Rotation.from_mkdd_rotation(*values[6:12])
+        (area.shape, area.area_type, area.camera_index, area.feather.i0, area.feather.i1,
+         area.unkfixedpoint, area.unkshort, area.shadow_id, area.lightparam_index) = values[12:21]
+
+        assert area.shape in (0, 1)
+        assert area.area_type in AREA_TYPES
+
+        return area
+
+    def to_values(self):
+        return (self.position.x, self.position.y, self.position.z,
+                self.scale.x, self.scale.y, self.scale.z,
+                *self.rotation.to_mkdd_rotation(),
+                self.shape, self.area_type, self.camera_index,
+                self.feather.i0, self.feather.i1,
+                self.unkfixedpoint, self.unkshort, self.shadow_id, self.lightparam_index)
+
 
 
 
@@ -1257,6 +1413,34 @@ class Camera(object):
 
         return cam
 
+    @classmethod
+    def from_values(cls, values):
+        cam = cls(Vector3(*values[0:3]))
+        cam.rotation = Rotation.from_mkdd_rotation(*values[3:9])
+        cam.position2 = Vector3(*values[9:12])
+        cam.position3 = Vector3(*values[12:15])
+        (cam.chase, cam.camtype, cam.fov.start, cam.camduration, cam.startcamera,
+         cam.shimmer.z0, cam.shimmer.z1, cam.route, cam.routespeed, cam.fov.end, cam.nextcam) = values[15:26]
+        cam.name = str(values[26], encoding="ascii")
+
+        return cam
+
+    def to_values(self):
+        if self.camtype in [0, 1, 2, 3]:
+            chase = self.chase
+        else:
+            chase = 0
+        assert len(self.name) == 4
+
+        return (self.position.x, self.position.y, self.position.z,
+                *self.rotation.to_mkdd_rotation(),
+                self.position2.x, self.position2.y, self.position2.z,
+                self.position3.x, self.position3.y, self.position3.z,
+                chase, self.camtype, self.fov.start, self.camduration, self.startcamera,
+                self.shimmer.z0, self.shimmer.z1, self.route,
+                self.routespeed, self.fov.end, self.nextcam,
+                bytes(self.name, encoding="ascii"))
+
 
 
     def copy(self):
@@ -1367,6 +1551,19 @@ class JugemPoint(object):
 
         return jugem
 
+    @classmethod
+    def from_values(cls, values):
+        jugem = cls(Vector3(*values[0:3]))
+        jugem.rotation = Rotation.from_mkdd_rotation(*values[3:9])
+        jugem.respawn_id, jugem.unk1, jugem.unk2, jugem.unk3 = values[9:13]
+
+        return jugem
+
+    def to_values(self):
+        return (self.position.x, self.position.y, self.position.z,
+                *self.rotation.to_mkdd_rotation(),
+                self.respawn_id, self.unk1, self.unk2, self.unk3)
+
     def write(self, f):
         f.write(pack(">fff", self.position.x, self.position.y, self.position.z))
         self.rotation.write(f)
@@ -1397,6 +1594,20 @@ class LightParam(object):
 
         return lp
 
+    @classmethod
+    def from_values(cls, values):
+        lp = cls()
+        lp.color1 = ColorRGBA(*values[0:4])
+        lp.unkpositionvec = Vector3(*values[4:7])
+        lp.color2 = ColorRGBA(*values[7:11])
+
+        return lp
+
+    def to_values(self):
+        return (self.color1.r, self.color1.g, self.color1.b, self.color1.a,
+                self.position.x, self.position.y, self.position.z,
+                self.color2.r, self.color2.g, self.color2.b, self.color2.a)
+
     def write(self, f):
         self.color1.write(f)
         f.write(pack(">fff", self.position.x, self.position.y, self.position.z))
@@ -1426,6 +1637,16 @@ class MGEntry(object):
 
         return mgentry
 
+    @classmethod
+    def from_values(cls, values):
+        mgentry = MGEntry()
+        mgentry.rabbitWinSec, mgentry.rabbitMinSec, mgentry.rabbitDecSec, mgentry.unk4 = values
+
+        return mgentry
+
+    def to_values(self):
+        return (self.rabbitWinSec, self.rabbitMinSec, self.rabbitDecSec, self.unk4)
+
     def write(self, f):
         f.write(pack(">hhhh", self.rabbitWinSec, self.rabbitMinSec, self.rabbitDecSec, self.unk4))
 
@@ -1563,7 +1784,7 @@ class BOL(object):
         return objects
 
     @classmethod
-    def from_file(cls, f):
+    def _read_header(cls, f):
         bol = cls()
         magic = f.read(4)
         #assert magic == b"0015" or magic == b"0012"
@@ -1618,68 +1839,84 @@ class BOL(object):
         #assert padding == b"\x00"*12
         endofheader = f.tell()
 
+        return bol, old_bol, sectioncounts, sectionoffsets
+
+    @classmethod
+    def from_file(cls, f):
+        return cls.from_bytes(f.read())
 
-        #calculated_count = (sectionoffsets[CHECKPOINT] - sectionoffsets[ENEMYITEMPOINT])//0x20
-        #assert sectioncounts[ENEMYITEMPOINT] == calculated_count
-        f.seek(sectionoffsets[ENEMYITEMPOINT])
-        bol.enemypointgroups = EnemyPointGroups.from_file(f, sectioncounts[ENEMYITEMPOINT], old_bol)
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BOL':
+        # Decodes each section in one go from the document held in memory
+        bol, old_bol, sectioncounts, sectionoffsets = cls._read_header(BytesIO(data))
 
-        f.seek(sectionoffsets[CHECKPOINT])
-        bol.checkpoints = CheckpointGroups.from_file(f, sectioncounts[CHECKPOINT])
+        enemypoint_struct = ENEMYPOINT_OLD_STRUCT if old_bol else ENEMYPOINT_STRUCT
+        bol.enemypointgroups = EnemyPointGroups.from_points(
+            EnemyPoint.from_values(values, old_bol) for values in
+            unpack_section(data, sectionoffsets[ENEMYITEMPOINT], sectioncounts[ENEMYITEMPOINT], enemypoint_struct))
 
-        f.seek(sectionoffsets[ROUTEGROUP])
-        bol.routes = ObjectContainer.from_file(f, sectioncounts[ROUTEGROUP], Route)
+        bol.checkpoints = CheckpointGroups.from_data(data, sectionoffsets[CHECKPOINT], sectioncounts[CHECKPOINT])
+
+        bol.routes = ObjectContainer(
+            Route.from_values(values) for values in
+            unpack_section(data, sectionoffsets[ROUTEGROUP], sectioncounts[ROUTEGROUP], ROUTE_STRUCT))
 
-        f.seek(sectionoffsets[ROUTEPOINT])
-        routepoints = []
         count = (sectionoffsets[OBJECTS] - sectionoffsets[ROUTEPOINT])//0x20
-        for i in range(count):
-            routepoints.append(RoutePoint.from_file(f))
+        routepoints = [RoutePoint.from_values(values) for values in
+                       unpack_section(data, sectionoffsets[ROUTEPOINT], count, ROUTEPOINT_STRUCT)]
 
         for route in bol.routes:
             route.add_routepoints(routepoints)
 
-        f.seek(sectionoffsets[OBJECTS])
-        bol.objects = MapObjects.from_file(f, sectioncounts[OBJECTS])
+        bol.objects = MapObjects()
+        bol.objects.objects = [MapObject.from_values(values) for values in
+                               unpack_section(data, sectionoffsets[OBJECTS], sectioncounts[OBJECTS], MAPOBJECT_STRUCT)]
 
-        f.seek(sectionoffsets[KARTPOINT])
-        bol.kartpoints = KartStartPoints.from_file(f, (sectionoffsets[AREA] - sectionoffsets[KARTPOINT])//0x28)
+        bol.kartpoints = KartStartPoints()
+        count = (sectionoffsets[AREA] - sectionoffsets[KARTPOINT])//0x28
+        bol.kartpoints.positions = [KartStartPoint.from_values(values) for values in
+                                    unpack_section(data, sectionoffsets[KARTPOINT], count, KARTSTARTPOINT_STRUCT)]
 
-        # on the dekoboko dev track from a MKDD demo this assertion doesn't hold for some reason
-        if not old_bol:
-            assert len(bol.kartpoints.positions) == bol.starting_point_count
-        else:
-            print("Old bol detected, fixing starting point count and player id of first kart position...")
-            bol.starting_point_count = bol.kartpoints.positions
-            if len(bol.kartpoints.positions) > 0:
-                bol.kartpoints.positions[0].playerid = 0xFF
-
-        f.seek(sectionoffsets[AREA])
-        bol.areas = Areas.from_file(f, sectioncounts[AREA])
+        bol.areas = Areas()
+        bol.areas.areas = [Area.from_values(values) for values in
+                           unpack_section(data, sectionoffsets[AREA], sectioncounts[AREA], AREA_STRUCT)]
 
-        f.seek(sectionoffsets[CAMERA])
-        bol.cameras = ObjectContainer.from_file(f, sectioncounts[CAMERA], Camera)
+        bol.cameras = ObjectContainer(
+            Camera.from_values(values) for values in
+            unpack_section(data, sectionoffsets[CAMERA], sectioncounts[CAMERA], CAMERA_STRUCT))
 
-        f.seek(sectionoffsets[RESPAWNPOINT])
-        bol.respawnpoints = ObjectContainer.from_file(f, sectioncounts[RESPAWNPOINT], JugemPoint)
+        bol.respawnpoints = ObjectContainer(
+            JugemPoint.from_values(values) for values in
+            unpack_section(data, sectionoffsets[RESPAWNPOINT], sectioncounts[RESPAWNPOINT], JUGEMPOINT_STRUCT))
 
-        #order by id
-        bol.respawnpoints.sort(key=lambda x: x.respawn_id)
+        bol.lightparams = ObjectContainer(
+            LightParam.from_values(values) for values in
+            unpack_section(data, sectionoffsets[LIGHTPARAM], sectioncounts[LIGHTPARAM], LIGHTPARAM_STRUCT))
 
-        f.seek(sectionoffsets[LIGHTPARAM])
+        bol.mgentries = ObjectContainer(
+            MGEntry.from_values(values) for values in
+            unpack_section(data, sectionoffsets[MINIGAME], sectioncounts[MINIGAME], MGENTRY_STRUCT))
 
-        bol.lightparams = ObjectContainer.from_file(f, sectioncounts[LIGHTPARAM], LightParam)
+        bol._finish_loading(old_bol)
 
-        f.seek(sectionoffsets[MINIGAME])
-        bol.mgentries = ObjectContainer.from_file(f, sectioncounts[MINIGAME], MGEntry)
-
-        bol.fixup_file()
+        return bol
 
+    def _finish_loading(self, old_bol):
+        # on the dekoboko dev track from a MKDD demo this assertion doesn't hold for some reason
+        if not old_bol:
+            assert len(self.kartpoints.positions) == self.starting_point_count
+        else:
+            print("Old bol detected, fixing starting point count and player id of first kart position...")
+            self.starting_point_count = self.kartpoints.positions
+            if len(self.kartpoints.positions) > 0:
+                self.kartpoints.positions[0].playerid = 0xFF
 
+        #order by id
+        self.respawnpoints.sort(key=lambda x: x.respawn_id)
 
-        bol.set_assoc()
+        self.fixup_file()
 
-        return bol
+        self.set_assoc()
 
 
 
@@ -1750,112 +1987,76 @@ class BOL(object):
             for point in route.points:
                 point.partof = route
 
-    @classmethod
-    def from_bytes(cls, data: bytes) -> 'BOL':
-        return BOL.from_file(BytesIO(data))
-
     def write(self, f):
-        #f.write(b"0015")
-        f.write(b"0014")
-        f.write(pack(">B", self.roll))
-        self.rgb_ambient.write(f)
-        self.rgba_light.write(f)
-        f.write(pack(">fff", self.lightsource.x, self.lightsource.y, self.lightsource.z))
-        f.write(pack(">BB", self.lap_count, self.music_id))
-
-        enemypoints = 0
-        for group in self.enemypointgroups.groups:
-            enemypoints += len(group.points)
-        write_uint16(f, enemypoints)
-        write_uint16(f, len(self.checkpoints.groups))
-        write_uint16(f, len(self.objects.objects))
-        write_uint16(f, len(self.areas.areas))
-        write_uint16(f, len(self.cameras))
-        write_uint16(f, len(self.routes) + len(self.cameraroutes))
-        write_uint16(f, len(self.respawnpoints))
-
-        f.write(pack(">B", self.fog_type))
-        self.fog_color.write(f)
-        f.write(pack(">ffBBBB",
-                self.fog_startz, self.fog_endz,
-                self.lod_bias, self.dummy_start_line, self.snow_effects, self.shadow_opacity))
-        self.shadow_color.write(f)
-        f.write(pack(">BB", len(self.kartpoints.positions), self.sky_follow))
-        f.write(pack(">BB", len(self.lightparams), len(self.mgentries)))
-        f.write(pack(">B", 0))  # padding
-
-        f.write(b"\x00"*4) # Filestart 0
-
-        offset_start = f.tell()
-        offsets = []
-        for i in range(11):
-            f.write(b"FOOB") # placeholder for offsets
-        f.write(b"\x12"*12) # padding
+        f.write(self.to_bytes())
+
+    def to_bytes(self) -> bytes:
+        # Sizes of all sections are known up front, so the document is packed into a single buffer
+        routes, cameras = self.combine_routes()
 
-        offsets.append(f.tell())
+        enemypoints = []
         for group in self.enemypointgroups.groups:
-            #group = self.enemypointgroups.groups[groupindex]
             for point in group.points:
                 point.group = group.id
-                point.write(f)
+                enemypoints.append(point.to_values())
 
-        offsets.append(f.tell())
-        for group in self.checkpoints.groups:
-            group.write(f)
+        checkpoints = []
         for group in self.checkpoints.groups:
             for point in group.points:
-                point.write(f)
-
-        offsets.append(f.tell())
-
-        routes, cameras = self.combine_routes()
-
-        index = 0
-        for route in routes:
-            route.write(f, index)
-            index += len(route.points)
+                checkpoints.append(point.to_values())
 
-        offsets.append(f.tell())
+        routegroups = []
+        routepoints = []
         for route in routes:
+            routegroups.append(route.to_values(len(routepoints)))
             for point in route.points:
-                point.write(f)
-
-        offsets.append(f.tell())
-        for object in self.objects.objects:
-            object.write(f)
-
-        offsets.append(f.tell())
-        for startpoint in self.kartpoints.positions:
-            startpoint.write(f)
-
-        offsets.append(f.tell())
-        for area in self.areas.areas:
-            area.write(f)
-
-        offsets.append(f.tell())
-        for camera in cameras:
-            camera.write(f)
-
-        offsets.append(f.tell())
-        for respawnpoint in self.respawnpoints:
-            respawnpoint.write(f)
-
-        offsets.append(f.tell())
-        for lightparam in self.lightparams:
-            lightparam.write(f)
+                routepoints.append(point.to_values())
+
+        sections = (
+            (ENEMYPOINT_WRITE_STRUCT, enemypoints),
+            (CHECKPOINTGROUP_STRUCT, [group.to_values() for group in self.checkpoints.groups]),
+            (CHECKPOINT_STRUCT, checkpoints),
+            (ROUTE_WRITE_STRUCT, routegroups),
+            (ROUTEPOINT_WRITE_STRUCT, routepoints),
+            (MAPOBJECT_WRITE_STRUCT, [obj.to_values() for obj in self.objects.objects]),
+            (KARTSTARTPOINT_STRUCT, [kartpoint.to_values() for kartpoint in self.kartpoints.positions]),
+            (AREA_STRUCT, [area.to_values() for area in self.areas.areas]),
+            (CAMERA_STRUCT, [camera.to_values() for camera in cameras]),
+            (JUGEMPOINT_WRITE_STRUCT, [respawnpoint.to_values() for respawnpoint in self.respawnpoints]),
+            (LIGHTPARAM_STRUCT, [lightparam.to_values() for lightparam in self.lightparams]),
+            (MGENTRY_STRUCT, [mgentry.to_values() for mgentry in self.mgentries])
+        )
 
-        offsets.append(f.tell())
-        for mgentry in self.mgentries:
-            mgentry.write(f)
-        assert len(offsets) == 11
-        f.seek(offset_start)
-        for offset in offsets:
-            f.write(pack(">I", offset))
+        size = BOL_HEADER_STRUCT.size
+        for struct, entries in sections:
+            size += struct.size * len(entries)
+        data = bytearray(size)
 
-    def to_bytes(self) -> bytes:
-        f = BytesIO()
-        self.write(f)
-        return f.getvalue()
+        # The checkpoint groups and their points share one section offset
+        offsets = []
+        offset = BOL_HEADER_STRUCT.size
+        for struct, entries in sections:
+            if struct is not CHECKPOINT_STRUCT:
+                offsets.append(offset)
+            offset = pack_section(data, offset, struct, entries)
+
+        BOL_HEADER_STRUCT.pack_into(
+            data, 0, b"0014", self.roll,
+            self.rgb_ambient.r, self.rgb_ambient.g, self.rgb_ambient.b,
+            self.rgba_light.r, self.rgba_light.g, self.rgba_light.b, self.rgba_light.a,
+            self.lightsource.x, self.lightsource.y, self.lightsource.z,
+            self.lap_count, self.music_id,
+            len(enemypoints), len(self.checkpoints.groups), len(self.objects.objects),
+            len(self.areas.areas), len(self.cameras), len(routes), len(self.respawnpoints),
+            self.fog_type, self.fog_color.r, self.fog_color.g, self.fog_color.b,
+            self.fog_startz, self.fog_endz,
+            self.lod_bias, self.dummy_start_line, self.snow_effects, self.shadow_opacity,
+            self.shadow_color.r, self.shadow_color.g, self.shadow_color.b,
+            len(self.kartpoints.positions), self.sky_follow,
+            len(self.lightparams), len(self.mgentries), 0,
+            *offsets, b"\x12"*12)
+
+        return bytes(data)
 
     def combine_routes(self):
         routes = ObjectContainer()
@@ -0,0 +1,116 @@
+import random
+
+import numpy
+
+# Vertex and instance arrays for the lines the level view draws between points, for
+# lib.model_rendering.LineBatch and InstancedArrowHeads. In the coordinates the views draw in,
+# (x, -z, y) of a position.
+
+
+def world_positions(positions):
+    return numpy.array([(position.x, position.y, position.z) for position in positions],
+                       dtype=numpy.float64).reshape(-1, 3)
+
+
+def view_positions(world):
+    return numpy.ascontiguousarray(world[:, [0, 2, 1]] * (1.0, -1.0, 1.0), dtype=numpy.float32)
+
+
+def segments(starts, ends):
+    # Segments between the rows of the (n, 3) view positions, as LineBatch takes them
+    vertices = numpy.empty((len(starts)*2, 3), dtype=numpy.float32)
+    vertices[0::2] = starts
+    vertices[1::2] = ends
+    return vertices
+
+
+def line_strip(view):
+    # Segments between consecutive positions
+    return segments(view[:-1], view[1:])
+
+
+def arrow_heads(starts, ends):
+    # Instances of the arrow head at the ends of the segments between the (n, 3) world positions,
+    # pointing in the direction of the segment on the ground like ObjectModels.draw_arrow_head
+    # rotates it. Per instance the position and the axes its x, y and z axis are rotated to.
+    directions = ends - starts
+    lengths = numpy.sqrt((directions**2).sum(axis=1))
+    moving = lengths > 0.0
+    directions[moving] /= lengths[moving].reshape(-1, 1)
+    dx, dz = directions[:, 0], directions[:, 2]
+
+    instances = numpy.zeros((len(starts), 12), dtype=numpy.float32)
+    instances[:, 0:3] = view_positions(ends)
+    instances[:, 3] = numpy.where(moving, dx, 1.0)
+    instances[:, 4] = -dz
+    instances[:, 6] = -dz
+    instances[:, 7] = numpy.where(moving, -dx, 1.0)
+    instances[:, 11] = 1.0
+    return instances
+
+
+def route_lines(points):
+    # Segments and arrow heads from each point of a route or enemy point group to the next
+    world = world_positions([point.position for point in points])
+    return line_strip(view_positions(world)), arrow_heads(world[:-1], world[1:])
+
+
+def checkpoint_lines(checkpoints):
+    # The segments across each checkpoint and to the ends of the previous one, and the segments and arrow
+    # heads from the middle of each checkpoint to the next
+    starts = world_positions([checkpoint.start for checkpoint in checkpoints])
+    ends = world_positions([checkpoint.end for checkpoint in checkpoints])
+    view_starts, view_ends = view_positions(starts), view_positions(ends)
+    quads = numpy.concatenate((segments(view_starts, view_ends),
+                               segments(view_starts[1:], view_starts[:-1]),
+                               segments(view_ends[1:], view_ends[:-1])))
+
+    mids = (starts + ends) / 2.0
+    return quads, line_strip(view_positions(mids)), arrow_heads(mids[:-1], mids[1:])
+
+
+def segment_between(start, end):
+    return view_positions(world_positions((start, end)))
+
+
+def enemy_group_links(groups):
+    # (group, linked group, color, segment) from the last point of each enemy point group to the first point
+    # of the groups with the same link, in a color picked from the id of the group
+    links = []
+    for group in groups:
+        if len(group.points) == 0:
+            continue
+        point_a = group.points[-1]
+        color_gen = random.Random(group.id)
+        color_components = [
+            color_gen.random() * 0.5,
+            color_gen.random() * 0.5,
+            color_gen.random() * 0.2,
+        ]
+        color_gen.shuffle(color_components)
+        color_components[2] += 0.5
+
+        for group_b in groups:
+            if group is group_b or len(group_b.points) == 0:
+                continue
+            point_b = group_b.points[0]
+            if point_a.link == point_b.link:
+                links.append((group, group_b, color_components, segment_between(point_a.position, point_b.position)))
+    return links
+
+
+class GeometryCache(object):
+    # Arrays built for groups of points such as routes, kept until clear() is called because the document
+    # changed. Groups are looked up by identity.
+    def __init__(self):
+        self._entries = {}
+
+    def clear(self):
+        self._entries = {}
+
+    def get(self, group, build):
+        entry = self._entries.get(id(group))
+        if entry is None or entry[0] is not group:
+            entry = (group, build())
+            self._entries[id(group)] = entry
+        return entry[1]
@@ -1,6 +1,8 @@
+import numpy
 from PIL import Image, ImageDraw
 
 from . import BCOllider
+from .collision import CollisionGeometry
 
 MINIMAP_WIDTH = 128
 MINIMAP_HEIGHT = 256
@@ -68,12 +70,12 @@ def bco_to_minimap(
             builtins.print = print_bk
             del print_bk
 
-    return collision_to_minimap(collision, orientation, margin, outline, outline_vertical_offset,
-                                multisampling, terrain_colors)
+    return collision_to_minimap(CollisionGeometry.from_bco(collision), orientation, margin, outline,
+                                outline_vertical_offset, multisampling, terrain_colors)
 
 
 def collision_to_minimap(
-    collision: BCOllider.RacetrackCollision,
+    geometry: CollisionGeometry,
     orientation: int = DEFAULT_ORIENTATION,
     margin: int = DEFAULT_MARGIN,
     outline: int = DEFAULT_OUTLINE,
@@ -102,22 +104,17 @@ def collision_to_minimap(
     }
 
     # Filter triangles by terrain type and convert vertex indexes to vertex points.
-    triangles = []
-    for vi1, vi2, vi3, terrain_type, _rest in collision.triangles:
-        terrain_color = terrain_colors.get(terrain_type & 0xFF00)
-        if terrain_color is None:
-            continue
-        v1 = collision.vertices[vi1]
-        v2 = collision.vertices[vi2]
-        v3 = collision.vertices[vi3]
-        triangles.append((terrain_color, v1, v2, v3))
-
-    min_x = min(min(v1[0], v2[0], v3[0]) for _terrain_type, v1, v2, v3 in triangles)
-    max_x = max(max(v1[0], v2[0], v3[0]) for _terrain_type, v1, v2, v3 in triangles)
-    min_y = min(min(v2[1], v2[1], v3[1]) for _terrain_type, v1, v2, v3 in triangles)
-    max_y = max(max(v2[1], v2[1], v3[1]) for _terrain_type, v1, v2, v3 in triangles)
-    min_z = min(min(v3[2], v2[2], v3[2]) for _terrain_type, v1, v2, v3 in triangles)
-    max_z = max(max(v3[2], v2[2], v3[2]) for _terrain_type, v1, v2, v3 in triangles)
+    terrain_types = geometry.collision_types & 0xFF00
+    visible = numpy.isin(terrain_types, list(terrain_colors))
+    corners = geometry.corners[visible]
+
+    # Height and depth bounds are taken from the second and third vertex of each triangle only.
+    min_x = float(corners[:, :, 0].min())
+    max_x = float(corners[:, :, 0].max())
+    min_y = float(corners[:, 1:, 1].min())
+    max_y = float(corners[:, 1:, 1].max())
+    min_z = float(corners[:, 1:, 2].min())
+    max_z = float(corners[:, 1:, 2].max())
     center_x = (min_x + max_x) / 2.0
     center_y = (min_y + max_y) / 2.0
     center_z = (min_z + max_z) / 2.0
@@ -128,13 +125,11 @@ def collision_to_minimap(
     scale_x = (canvas_width / 2 - canvas_margin) / (max_x - center_x)
     scale_z = (canvas_height / 2 - canvas_margin) / (max_z - center_z)
     scale = min(scale_x, scale_z)
-    fit_triangles = []
-    for terrain_color, v1, v2, v3 in triangles:
-        centered_v1 = ((v1[0] - center_x) * scale, v1[1] - center_y, (v1[2] - center_z) * scale)
-        centered_v2 = ((v2[0] - center_x) * scale, v2[1] - center_y, (v2[2] - center_z) * scale)
-        centered_v3 = ((v3[0] - center_x) * scale, v3[1] - center_y, (v3[2] - center_z) * scale)
-        fit_triangles.append((terrain_color, centered_v1, centered_v2, centered_v3))
-    triangles = fit_triangles
+    centered = corners - (center_x, center_y, center_z)
+    centered[:, :, 0] *= scale
+    centered[:, :, 2] *= scale
+    triangles = [(terrain_colors[terrain_type], tuple(v1), tuple(v2), tuple(v3))
+                 for terrain_type, (v1, v2, v3) in zip(terrain_types[visible].tolist(), centered.tolist())]
 
     image = Image.new('RGBA', (canvas_width, canvas_height))
 
@@ -1,14 +1,14 @@
+import ctypes
 import json
 import math
 import os
 import re
 import sys
 
+import numpy
 from OpenGL.GL import *
 from PIL import Image
 
-from .vectors import Vector3
-
 
 with open("lib/color_coding.json") as f:
     colors = json.load(f)
@@ -72,6 +72,16 @@ class Mesh(object):
             self.generate_displist()
         glCallList(self._displist)
 
+    def triangle_positions(self):
+        # Corner positions of the triangles, three rows per triangle
+        return numpy.array([self.vertices[vi] for triangle in self.triangles for vi, ti in triangle],
+                           dtype=numpy.float32).reshape(-1, 3)
+
+    def line_positions(self):
+        # End positions of the lines, two rows per line
+        return numpy.array([self.vertices[vi] for line in self.lines for vi in line],
+                           dtype=numpy.float32).reshape(-1, 3)
+
     def render_colorid(self, id):
         glColor3ub((id >> 16) & 0xFF, (id >> 8) & 0xFF, (id >> 0) & 0xFF)
         self.render()
@@ -79,53 +89,99 @@ class Mesh(object):
 
 class TexturedMesh(object):
     def __init__(self, material):
-        self.triangles = []
+        # Position and texture coordinate index of every triangle corner, -1 where a corner has no texture
+        # coordinate. vertex_positions and vertex_texcoords are shared by all meshes of a model.
+        self.position_indices = []
+        self.texcoord_indices = []
         self.vertex_positions = []
         self.vertex_texcoords = []
 
         self.material = material
-        self._displist = None
-
-    def generate_displist(self):
-        if self._displist is not None:
-            glDeleteLists(self._displist, 1)
-
-        displist = glGenLists(1)
-        glNewList(displist, GL_COMPILE)
-        glBegin(GL_TRIANGLES)
-
-        for triangle in self.triangles:
-            assert len(triangle) == 3
-
-            # At this time, SuperBMD does not export vertex normals in the OBJ file. For now, a
-            # generated normal for the triangle will be provided.
-            v0 = Vector3(*self.vertex_positions[triangle[0][0]])
-            v1 = Vector3(*self.vertex_positions[triangle[1][0]])
-            v2 = Vector3(*self.vertex_positions[triangle[2][0]])
-            vn = (v1 - v0).cross(v2 - v0)
-            if not vn.norm():
-                # Implies that the points of the faces are colinear (don't form a triangle) and
-                # can be skipped. Several of these have been spotted in the stock Bowser's Castle.
-                continue
-            vn.normalize()
-
-            for vi, ti in triangle:
-                if self.material.tex is not None and ti is not None:
-                    glTexCoord2f(*self.vertex_texcoords[ti])
-                glNormal3f(vn.x, vn.y, vn.z)
-                glVertex3f(*self.vertex_positions[vi])
-
-        glEnd()
-        glEndList()
-        self._displist = displist
+        self._buffer = None
+        self._vertex_count = 0
+        self._textured = False
+        # The result of vertex_data() when the mesh was restored from saved arrays
+        self._saved_data = None
+
+    def vertex_data(self):
+        # Position, normal and texture coordinate of every triangle corner interleaved as float32
+        if self._saved_data is not None:
+            return self._saved_data
+
+        positions = numpy.asarray(self.vertex_positions, dtype=numpy.float64).reshape(-1, 3)
+        indices = numpy.array(self.position_indices, dtype=numpy.int64).reshape(-1, 3)
+        corners = numpy.take(positions, indices, axis=0)
+
+        # At this time, SuperBMD does not export vertex normals in the OBJ file. For now, a
+        # generated normal for the triangle will be provided.
+        edge1 = corners[:, 1] - corners[:, 0]
+        edge2 = corners[:, 2] - corners[:, 0]
+        normals = numpy.column_stack((edge1[:, 1]*edge2[:, 2] - edge1[:, 2]*edge2[:, 1],
+                                      edge1[:, 2]*edge2[:, 0] - edge1[:, 0]*edge2[:, 2],
+                                      edge1[:, 0]*edge2[:, 1] - edge1[:, 1]*edge2[:, 0]))
+        norms = numpy.sqrt(normals[:, 0]**2 + normals[:, 1]**2 + normals[:, 2]**2)
+        # Implies that the points of the faces are colinear (don't form a triangle) and
+        # can be skipped. Several of these have been spotted in the stock Bowser's Castle.
+        keep = norms != 0
+        count = int(numpy.count_nonzero(keep))
+
+        data = numpy.zeros((count, 3, 8), dtype=numpy.float32)
+        data[:, :, 0:3] = corners[keep]
+        with numpy.errstate(invalid="ignore"):
+            data[:, :, 3:6] = (normals[keep] / norms[keep].reshape(-1, 1)).reshape(-1, 1, 3)
+
+        if self.material.textured and len(self.vertex_texcoords) > 0:
+            texcoords = numpy.asarray(self.vertex_texcoords, dtype=numpy.float64).reshape(-1, 2)
+            texcoord_indices = numpy.array(self.texcoord_indices, dtype=numpy.int64).reshape(-1, 3)[keep].ravel()
+            # A corner without texture coordinate keeps the one of the corner before it, like glTexCoord2f
+            # calls did, and (0, 0) if there is none before it
+            given = texcoord_indices != -1
+            previous = numpy.maximum.accumulate(numpy.where(given, numpy.arange(len(given)), -1))
+            found = previous >= 0
+            data.reshape(-1, 8)[found, 6:8] = numpy.take(texcoords, texcoord_indices[previous[found]], axis=0)
+
+        return data.reshape(-1, 8)
+
+    def generate_buffers(self):
+        if self._buffer is not None:
+            glDeleteBuffers(1, [self._buffer])
+
+        data = self.vertex_data()
+        self._buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self._vertex_count = len(data)
+        self._textured = self.material.textured
+
+    def draw(self):
+        if self._buffer is None:
+            self.generate_buffers()
+        if self._vertex_count == 0:
+            return
+
+        stride = 8*4
+        glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(3*4))
+        if self._textured:
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(6*4))
+
+        glDrawArrays(GL_TRIANGLES, 0, self._vertex_count)
+
+        if self._textured:
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
 
     def render(self, selected=False, cull_faces=False):
-        if self._displist is None:
-            self.generate_displist()
-
-        if self.material.tex is not None:
+        if self.material.textured:
             glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, self.material.tex)
+            glBindTexture(GL_TEXTURE_2D, self.material.upload())
         else:
             glDisable(GL_TEXTURE_2D)
 
@@ -142,7 +198,7 @@ class TexturedMesh(object):
             glFrontFace(GL_CW)
             glCullFace(self.material.cull_mode)
 
-        glCallList(self._displist)
+        self.draw()
 
         if cull_faces and self.material.cull_mode is not None:
             glCullFace(GL_BACK)
@@ -150,9 +206,6 @@ class TexturedMesh(object):
             glDisable(GL_CULL_FACE)
 
     def render_coloredid(self, id, cull_faces=False):
-
-        if self._displist is None:
-            self.generate_displist()
         glColor3ub((id >> 16) & 0xFF, (id >> 8) & 0xFF, (id >> 0) & 0xFF)
 
         if cull_faces and self.material.cull_mode is not None:
@@ -160,7 +213,7 @@ class TexturedMesh(object):
             glFrontFace(GL_CW)
             glCullFace(self.material.cull_mode)
 
-        glCallList(self._displist)
+        self.draw()
 
         if cull_faces and self.material.cull_mode is not None:
             glCullFace(GL_BACK)
@@ -178,24 +231,32 @@ class Material(object):
 
             image = Image.open(texturepath)
             image = image.convert('RGBA')
+            # The texture is only created on the first render, models can be read on a thread
+            # without a GL context
+            self.image = (image.width, image.height, image.tobytes())
+            del image
+        else:
+            self.image = None
 
+        self.textured = self.image is not None
+        self.tex = None
+        self.diffuse = diffuse
+
+        self.cull_mode = GL_BACK
+
+    def upload(self):
+        if self.tex is None and self.image is not None:
+            width, height, data = self.image
             ID = glGenTextures(1)
             glBindTexture(GL_TEXTURE_2D, ID)
             glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
             glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, 0)
             glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, 0)
-            glTexImage2D(GL_TEXTURE_2D, 0, 4, image.width, image.height, 0, GL_RGBA,
-                         GL_UNSIGNED_BYTE, image.tobytes())
-
-            del image
+            glTexImage2D(GL_TEXTURE_2D, 0, 4, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
 
+            self.image = None
             self.tex = ID
-        else:
-            self.tex = None
-
-        self.diffuse = diffuse
-
-        self.cull_mode = GL_BACK
+        return self.tex
 
 
 class Model(object):
@@ -281,6 +342,44 @@ class TexturedModel(object):
     def __init__(self):
         self.mesh_list = []
 
+    def save_arrays(self):
+        # The vertex data and materials of the meshes as a dict of arrays, see lib.collision_cache.
+        # Textures have to be saved before they are uploaded.
+        materials = [mesh.material for mesh in self.mesh_list]
+        data = [mesh.vertex_data() for mesh in self.mesh_list]
+        # Materials without a diffuse color are stored with NaN, without a cull mode with -1
+        diffuse = [(numpy.nan, )*3 if material.diffuse is None else material.diffuse for material in materials]
+        cull_modes = [-1 if material.cull_mode is None else material.cull_mode for material in materials]
+        images = [material.image if material.textured else (0, 0, b"") for material in materials]
+
+        return {"model_vertex_data": numpy.concatenate(data + [numpy.zeros((0, 8), dtype=numpy.float32)]),
+                "model_vertex_counts": numpy.array([len(mesh_data) for mesh_data in data], dtype=numpy.int64),
+                "model_diffuse": numpy.array(diffuse, dtype=numpy.float64).reshape(-1, 3),
+                "model_cull_modes": numpy.array(cull_modes, dtype=numpy.int64),
+                "model_textured": numpy.array([material.textured for material in materials], dtype=bool),
+                "model_texture_sizes": numpy.array([image[:2] for image in images], dtype=numpy.int64).reshape(-1, 2),
+                "model_textures": numpy.frombuffer(b"".join(image[2] for image in images), dtype=numpy.uint8)}
+
+    @classmethod
+    def from_saved_arrays(cls, arrays):
+        model = cls()
+        vertex_offsets = numpy.cumsum([0] + arrays["model_vertex_counts"].tolist())
+        texture_offsets = numpy.cumsum([0] + (arrays["model_texture_sizes"].prod(axis=1) * 4).tolist())
+        for i, (diffuse, cull_mode, textured, (width, height)) in enumerate(zip(
+                arrays["model_diffuse"].tolist(), arrays["model_cull_modes"].tolist(),
+                arrays["model_textured"].tolist(), arrays["model_texture_sizes"].tolist())):
+            material = Material(None if math.isnan(diffuse[0]) else tuple(diffuse))
+            material.cull_mode = None if cull_mode == -1 else cull_mode
+            if textured:
+                texture = arrays["model_textures"][texture_offsets[i]:texture_offsets[i + 1]]
+                material.image = (width, height, texture.tobytes())
+                material.textured = True
+
+            mesh = TexturedMesh(material)
+            mesh._saved_data = arrays["model_vertex_data"][vertex_offsets[i]:vertex_offsets[i + 1]]
+            model.mesh_list.append(mesh)
+        return model
+
     def render(self, selected=False, selectedPart=None, cull_faces=False):
         for mesh in self.mesh_list:
             mesh.render(selected, cull_faces=cull_faces)
@@ -416,23 +515,33 @@ class TexturedModel(object):
                 #    curr_mesh.lines.append((int(args[1])-1, int(args[2])-1))
                 elif cmd == "f":
                     if currmat is None:
-                        faces = default_mesh.triangles
+                        mesh = default_mesh
                     else:
-                        faces = material_meshes[currmat].triangles
+                        mesh = material_meshes[currmat]
 
                     # if it uses more than 3 vertices to describe a face then we panic!
                     # no triangulation yet.
                     if len(args) == 5:
                         #raise RuntimeError("Model needs to be triangulated! Only faces with 3 vertices are supported.")
                         v1, v2, v3, v4 = map(read_vertex, args[1:5])
-                        faces.append(((v1[0] - 1, v1[1]), (v3[0] - 1, v3[1]), (v2[0] - 1, v2[1])))
-                        faces.append(((v3[0] - 1, v3[1]), (v1[0] - 1, v1[1]), (v4[0] - 1, v4[1])))
-
+                        corners = (v1, v3, v2, v3, v1, v4)
                     elif len(args) == 4:
-                        v1, v2, v3 = map(read_vertex, args[1:4])
-                        faces.append(((v1[0]-1, v1[1]), (v3[0]-1, v3[1]), (v2[0]-1, v2[1])))
+                        corners = tuple(map(read_vertex, args[1:4]))
+                        corners = (corners[0], corners[2], corners[1])
+                    else:
+                        continue
+
+                    mesh.position_indices.extend(v - 1 for v, ti in corners)
+                    mesh.texcoord_indices.extend(-1 if ti is None else ti for v, ti in corners)
 
-            if len(default_mesh.triangles) > 0:
+            # The meshes share the vertices as arrays
+            vertices = numpy.array(vertices, dtype=numpy.float64).reshape(-1, 3)
+            texcoords = numpy.array(texcoords, dtype=numpy.float64).reshape(-1, 2)
+            for mesh in [default_mesh] + list(material_meshes.values()):
+                mesh.vertex_positions = vertices
+                mesh.vertex_texcoords = texcoords
+
+            if len(default_mesh.position_indices) > 0:
                 model.mesh_list.append(default_mesh)
 
             for mesh in material_meshes.values():
@@ -581,6 +690,11 @@ class Cube(SelectableModel):
         glColor4f(*self.color)
         self.mesh_list[0].render()
 
+    def marker_parts(self):
+        # The outline mesh and the body meshes with their colors for InstancedMarkers,
+        # None stands for the color of each marker
+        return self.mesh_list[0], [(self.mesh_list[0], None)]
+
 
 class GenericObject(SelectableModel):
     def __init__(self, bodycolor=(1.0, 1.0, 1.0, 1.0)):
@@ -601,6 +715,10 @@ class GenericObject(SelectableModel):
         glColor4ub(0x09, 0x93, 0x00, 0xFF)
         self.named_meshes["tip"].render()
 
+    def marker_parts(self):
+        return self.named_meshes["Cube"], [(self.named_meshes["Cube"], None),
+                                           (self.named_meshes["tip"], (0x09/255.0, 0x93/255.0, 0.0, 1.0))]
+
 
 class GenericComplexObject(GenericObject):
     def __init__(self, modelpath, height, tip, eyes, body, rest):
@@ -1055,70 +1173,54 @@ otherwise = (40, 40, 40)
 
 
 class CollisionModel(object):
-    def __init__(self, mkdd_collision):
-        meshes = {}
+    def __init__(self, geometry):
+        # geometry is the lib.collision.CollisionGeometry that the collision queries use as well
+        self.geometry = geometry
         self.program = None
-        vertices = mkdd_collision.vertices
-        self._displists = []
+        self._buffer = None
+        # Collision type -> (first vertex, vertex count) in the buffer
+        self._vertex_ranges = {}
         self.hidden_collision_types = set()
         self.hidden_collision_type_groups = set()
 
-        for v1, v2, v3, coltype, rest in mkdd_collision.triangles:
-            vertex1 = Vector3(*vertices[v1])
-            vertex1.z = -vertex1.z
-            vertex2 = Vector3(*vertices[v2])
-            vertex2.z = -vertex2.z
-            vertex3 = Vector3(*vertices[v3])
-            vertex3.z = -vertex3.z
+    @property
+    def collision_types(self):
+        return list(self.geometry.type_ranges)
 
-            v1tov2 = vertex2 - vertex1
-            v1tov3 = vertex3 - vertex1
-
-            normal = v1tov2.cross(v1tov3)
-            if normal.norm() != 0.0:
-                normal.normalize()
-
-            if coltype not in meshes:
-                meshes[coltype] = []
-
-            shift = coltype >> 8
+    def vertex_data(self):
+        # Position as (x, z, y), normal with z flipped and color of every triangle corner, interleaved as
+        # float32 with the triangles ordered by collision type
+        geometry = self.geometry
+        order = geometry.type_order
+        count = len(order)
 
+        colors = numpy.empty((count, 3), dtype=numpy.float64)
+        for meshtype, (start, end) in geometry.type_ranges.items():
+            shift = meshtype >> 8
             if shift in colortypes:
                 color = colortypes[shift]
-
             else:
                 color = otherwise
-            color = (color[0]/255.0, color[1]/255.0, color[2]/255.0)
-            meshes[coltype].append((vertex1, vertex2, vertex3, normal, color))
+            colors[start:end] = (color[0]/255.0, color[1]/255.0, color[2]/255.0)
 
-        self.meshes = meshes
+        data = numpy.empty((count, 3, 9), dtype=numpy.float32)
+        data[:, :, 0:3] = geometry.corners[order][:, :, [0, 2, 1]]
+        data[:, :, 3:6] = (geometry.normals[order] * numpy.array((-1.0, -1.0, 1.0))).reshape(-1, 1, 3)
+        data[:, :, 6:9] = colors.reshape(-1, 1, 3)
+        return data
 
-    def generate_displists(self):
+    def generate_buffers(self):
         if self.program is None:
             self.create_shaders()
 
-        for meshtype, mesh in self.meshes.items():
-            displist = glGenLists(1)
-            glNewList(displist, GL_COMPILE)
-            glBegin(GL_TRIANGLES)
-
-            for v1, v2, v3, normal, color in mesh:
-                glVertexAttrib3f(3, normal.x, normal.y, normal.z)
-                glVertexAttrib3f(4, *color)
-                glVertex3f(v1.x, -v1.z, v1.y)
-                glVertexAttrib3f(3, normal.x, normal.y, normal.z)
-                glVertexAttrib3f(4, *color)
-                glVertex3f(v2.x, -v2.z, v2.y)
-                glVertexAttrib3f(3, normal.x, normal.y, normal.z)
-                glVertexAttrib3f(4, *color)
-                glVertex3f(v3.x, -v3.z, v3.y)
+        data = self.vertex_data()
+        self._buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
 
-
-
-            glEnd()
-            glEndList()
-
-            self._displists.append((meshtype, displist))
+        self._vertex_ranges = {meshtype: (start*3, (end - start)*3)
+                               for meshtype, (start, end) in self.geometry.type_ranges.items()}
 
     def create_shaders(self):
         vertshader = """
@@ -1173,13 +1275,18 @@ class CollisionModel(object):
         self.program = program
 
     def render(self, selected=False, selectedPart=None, cull_faces=None):
-        if self.program is None:
-            self.generate_displists()
+        if self._buffer is None:
+            self.generate_buffers()
         factorval = glGetUniformLocation(self.program, "interpolate")
 
         glUseProgram(self.program)
+        glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+        stride = 9*4
+        for location, offset in ((0, 0), (3, 3*4), (4, 6*4)):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset))
 
-        for colltype, displist in self._displists:
+        for colltype, (first, count) in self._vertex_ranges.items():
             if (colltype in self.hidden_collision_types
                     or colltype & 0xFF00 in self.hidden_collision_type_groups):
                 continue
@@ -1188,6 +1295,368 @@ class CollisionModel(object):
                 glUniform1f(factorval, 1.0)
             else:
                 glUniform1f(factorval, 0.0)
-            glCallList(displist)
+            glDrawArrays(GL_TRIANGLES, first, count)
+
+        for location in (0, 3, 4):
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+
+
+def _create_instanced_program():
+    # Program for instanced copies of a mesh. Per instance attributes: offset at location 5, the rotation as
+    # three axes at 6 to 8, color at 9 and scale at 10.
+    vertshader = """
+    #version 330 compatibility
+    layout(location = 0) in vec3 vert;
+    layout(location = 5) in vec3 offset;
+    layout(location = 6) in vec3 axis_x;
+    layout(location = 7) in vec3 axis_y;
+    layout(location = 8) in vec3 axis_z;
+    layout(location = 9) in vec4 color;
+    layout(location = 10) in float scale;
+    out vec4 vecColor;
+
+    void main(void)
+    {
+        vecColor = color;
+        vec3 local = mat3(axis_x, axis_y, axis_z) * (vert*scale);
+        gl_Position = gl_ModelViewProjectionMatrix * vec4(offset + local, 1.0);
+    }
+    """
+
+    fragshader = """
+    #version 330
+    in vec4 vecColor;
+    out vec4 finalColor;
+
+    void main (void)
+    {
+        finalColor = vecColor;
+    }"""
+
+    vertexShaderObject = glCreateShader(GL_VERTEX_SHADER)
+    fragmentShaderObject = glCreateShader(GL_FRAGMENT_SHADER)
+    glShaderSource(vertexShaderObject, vertshader)
+    glShaderSource(fragmentShaderObject, fragshader)
+
+    _compile_shader_with_error_report(vertexShaderObject)
+    _compile_shader_with_error_report(fragmentShaderObject)
+
+    program = glCreateProgram()
+
+    glAttachShader(program, vertexShaderObject)
+    glAttachShader(program, fragmentShaderObject)
+
+    glLinkProgram(program)
+    return program
+
+
+class InstancedMarkers(object):
+    # Draws many copies of a SelectableModel like its display lists do, one instanced draw call per pass.
+    # Markers are queued with add() while a frame is drawn and drawn together by render() or
+    # render_coloredid(), which forget them afterwards. With oriented markers each one is rotated by the
+    # matrix of a Rotation and gets the lines that show its direction, like
+    # ObjectModels.render_generic_position_rotation draws them. Given a lib.culling.Frustum, markers
+    # that are out of view are left out.
+    # Where markers overlap on screen the image differs from drawing their display lists one after the
+    # other: there the outline of a marker hides the markers behind it, here the outline depth is only
+    # written in the last pass, so outlines and bodies of markers further back show through the outlines
+    # in front. Each marker on its own and the color id pass used for picking look the same.
+    def __init__(self, model, oriented=False):
+        self.outline, self.body = model.marker_parts()
+        self.oriented = oriented
+        self.program = None
+        # Radius of a sphere around a marker's position that holds everything drawn for it
+        self.radius = None
+        self._mesh_buffer = None
+        self._instance_buffer = None
+        # Part -> (first vertex, vertex count) in the mesh buffer
+        self._ranges = {}
+        self.clear()
+
+    def clear(self):
+        self.positions = []
+        self.rotations = []
+        self.colors = []
+        self.selected = []
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, position, rotation, color, selected=False):
+        # color is the body color, or the color of the id for render_coloredid
+        self.positions.append((position.x, -position.z, position.y))
+        if self.oriented:
+            self.rotations.append(rotation.mtx)
+        self.colors.append(color)
+        self.selected.append(selected)
+
+    def instance_data(self, visible=None):
+        # Per marker: position, the three rows of the rotation, body color, outline color and outline scale.
+        # visible is an optional mask of the markers to include.
+        data = numpy.empty((len(self.positions), 21), dtype=numpy.float32)
+        data[:, 0:3] = self.positions
+        if self.oriented:
+            data[:, 3:12] = numpy.array(self.rotations)[:, :3, :3].reshape(-1, 9)
+        else:
+            data[:, 3:12] = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0)
+        data[:, 12:16] = self.colors
+        selected = numpy.array(self.selected, dtype=bool)
+        data[:, 16:20] = numpy.where(selected.reshape(-1, 1), selectioncolor, (0.0, 0.0, 0.0, 1.0))
+        data[:, 20] = numpy.where(selected, 1.3, 1.2)
+        if visible is not None:
+            data = data[visible]
+        return data
+
+    def generate_buffers(self):
+        self.create_shaders()
+
+        parts = [("outline", self.outline.triangle_positions())]
+        self.radius = float(numpy.sqrt((parts[0][1]**2).sum(axis=1)).max()) * 1.3
+        if self.oriented:
+            self.radius = max(self.radius, 1000.0)
+        for i, (mesh, color) in enumerate(self.body):
+            parts.append((i, mesh.triangle_positions()))
+        # The direction lines as a line strip from (0, 0, 750) over the origin to (1000, 0, 0)
+        parts.append(("lines", numpy.array(((0.0, 0.0, 750.0), (0.0, 0.0, 0.0), (1000.0, 0.0, 0.0)),
+                                           dtype=numpy.float32)))
+
+        first = 0
+        for name, positions in parts:
+            self._ranges[name] = (first, len(positions))
+            first += len(positions)
+
+        data = numpy.concatenate([positions for name, positions in parts])
+        self._mesh_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._mesh_buffer)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+        self._instance_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def create_shaders(self):
+        self.program = _create_instanced_program()
+
+    def _begin(self, frustum, stats):
+        # Uploads the instance data of the markers in view, returns how many there are
+        if self.program is None:
+            self.generate_buffers()
+
+        visible = None
+        if frustum is not None:
+            visible = frustum.points_visible(self.positions, self.radius)
+        data = self.instance_data(visible)
+        if stats is not None:
+            stats.count("markers", True, len(data))
+            stats.count("markers", False, len(self.positions) - len(data))
+        if len(data) == 0:
+            return 0
+
+        glUseProgram(self.program)
+        glBindBuffer(GL_ARRAY_BUFFER, self._instance_buffer)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+        stride = 21*4
+        for location, size, offset in ((5, 3, 0), (6, 3, 3), (7, 3, 6), (8, 3, 9)):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset*4))
+            glVertexAttribDivisor(location, 1)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self._mesh_buffer)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+        return len(data)
+
+    def _set_colors(self, offset):
+        # Per marker colors from the given column of the instance data
+        glBindBuffer(GL_ARRAY_BUFFER, self._instance_buffer)
+        glEnableVertexAttribArray(9)
+        glVertexAttribPointer(9, 4, GL_FLOAT, GL_FALSE, 21*4, ctypes.c_void_p(offset*4))
+        glVertexAttribDivisor(9, 1)
+
+    def _set_scales(self, scale=None):
+        # Per marker outline scales, or the same scale for all markers
+        if scale is None:
+            glBindBuffer(GL_ARRAY_BUFFER, self._instance_buffer)
+            glEnableVertexAttribArray(10)
+            glVertexAttribPointer(10, 1, GL_FLOAT, GL_FALSE, 21*4, ctypes.c_void_p(20*4))
+            glVertexAttribDivisor(10, 1)
+        else:
+            glDisableVertexAttribArray(10)
+            glVertexAttrib1f(10, scale)
+
+    def _draw(self, part, count, mode=GL_TRIANGLES):
+        first, vertices = self._ranges[part]
+        glDrawArraysInstanced(mode, first, vertices, count)
+
+    def _end(self):
+        for location in (0, 5, 6, 7, 8, 9, 10):
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+        self.clear()
+
+    def render(self, frustum=None, stats=None):
+        if not self.positions:
+            return
+        count = self._begin(frustum, stats)
+        if count == 0:
+            self.clear()
+            return
+
+        if self.oriented:
+            glDisableVertexAttribArray(9)
+            glVertexAttrib4f(9, 0.0, 0.0, 0.0, 1.0)
+            self._set_scales(1.0)
+            self._draw("lines", count, GL_LINE_STRIP)
 
+        # 1st pass: Draw outline, but without writing on the depth buffer.
+        glDepthMask(GL_FALSE)
+        self._set_colors(16)
+        self._set_scales()
+        self._draw("outline", count)
+        glDepthMask(GL_TRUE)
+
+        # 2nd pass: Draw the rest of the geometry.
+        self._set_scales(1.0)
+        for i, (mesh, color) in enumerate(self.body):
+            if color is None:
+                self._set_colors(12)
+            else:
+                glDisableVertexAttribArray(9)
+                glVertexAttrib4f(9, *color)
+            self._draw(i, count)
+
+        # 3rd pass: Draw outline again to update the depth buffer, but skipping the color buffer.
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        self._set_scales()
+        self._draw("outline", count)
+        glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+
+        self._end()
+
+    def render_coloredid(self, frustum=None):
+        if not self.positions:
+            return
+        count = self._begin(frustum, None)
+        if count == 0:
+            self.clear()
+            return
+        self._set_colors(12)
+        self._set_scales(1.2)
+        self._draw("outline", count)
+        self._end()
+
+
+class LineBatch(object):
+    # Line segments gathered while a frame is drawn and drawn with one call by render(), which forgets them
+    # afterwards. Segments are added as (2n, 3) arrays of their ends, see lib.line_geometry.
+    def __init__(self):
+        self._buffer = None
+        self.clear()
+
+    def clear(self):
+        self.vertices = []
+        self.colors = []
+
+    def __len__(self):
+        return sum(len(vertices) for vertices in self.vertices) // 2
+
+    def add(self, vertices, color):
+        if len(vertices) > 0:
+            self.vertices.append(vertices)
+            self.colors.append(color)
+
+    def vertex_data(self):
+        # Position and color of every segment end
+        counts = [len(vertices) for vertices in self.vertices]
+        data = numpy.empty((sum(counts), 6), dtype=numpy.float32)
+        data[:, 0:3] = numpy.concatenate(self.vertices)
+        data[:, 3:6] = numpy.repeat(numpy.array(self.colors, dtype=numpy.float32)[:, :3], counts, axis=0)
+        return data
+
+    def render(self, width=1.0):
+        if not self.vertices:
+            return
+        data = self.vertex_data()
+
+        if self._buffer is None:
+            self._buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 6*4, ctypes.c_void_p(0))
+        glColorPointer(3, GL_FLOAT, 6*4, ctypes.c_void_p(3*4))
+
+        glLineWidth(width)
+        glDrawArrays(GL_LINES, 0, len(data))
+        glLineWidth(1.0)
+
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.clear()
+
+
+class InstancedArrowHeads(object):
+    # Draws the lines of a model, such as the arrow head, once per instance with one instanced draw call.
+    # Instances are added as (n, 12) arrays of position and the three axes they are rotated to, see
+    # lib.line_geometry.arrow_heads. render() forgets them afterwards.
+    def __init__(self, model):
+        self.model = model
+        self.program = None
+        self._mesh_buffer = None
+        self._instance_buffer = None
+        self._vertex_count = 0
+        self.clear()
+
+    def clear(self):
+        self.instances = []
+
+    def __len__(self):
+        return sum(len(instances) for instances in self.instances)
+
+    def add(self, instances):
+        if len(instances) > 0:
+            self.instances.append(instances)
+
+    def generate_buffers(self):
+        self.program = _create_instanced_program()
+
+        data = numpy.concatenate([mesh.line_positions() for mesh in self.model.mesh_list])
+        self._vertex_count = len(data)
+        self._mesh_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._mesh_buffer)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+        self._instance_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def render(self, color):
+        if not self.instances:
+            return
+        if self.program is None:
+            self.generate_buffers()
+
+        data = numpy.concatenate(self.instances)
+        glUseProgram(self.program)
+        glBindBuffer(GL_ARRAY_BUFFER, self._instance_buffer)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+        for location, offset in ((5, 0), (6, 3), (7, 6), (8, 9)):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, 12*4, ctypes.c_void_p(offset*4))
+            glVertexAttribDivisor(location, 1)
+        glVertexAttrib4f(9, color[0], color[1], color[2], 1.0)
+        glVertexAttrib1f(10, 1.0)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self._mesh_buffer)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+        glDrawArraysInstanced(GL_LINES, 0, self._vertex_count, len(data))
+
+        for location in (0, 5, 6, 7, 8):
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
         glUseProgram(0)
+        self.clear()
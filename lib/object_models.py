@@ -3,12 +3,17 @@ import json
 from OpenGL.GL import *
 from .model_rendering import (GenericObject, Model, TexturedModel,
                               GenericFlyer, GenericCrystallWall, GenericLongLegs, GenericChappy, GenericSnakecrow,
-                              GenericSwimmer, Cube)
+                              GenericSwimmer, Cube, InstancedMarkers, InstancedArrowHeads)
 
 with open("lib/color_coding.json", "r") as f:
     colors = json.load(f)
 
 
+def id_color(id):
+    # The color glColor3ub gives the id
+    return ((id >> 16) & 0xFF) / 255.0, ((id >> 8) & 0xFF) / 255.0, (id & 0xFF) / 255.0, 1.0
+
+
 class ObjectModels(object):
     def __init__(self):
         self.models = {}
@@ -19,7 +24,7 @@ class ObjectModels(object):
         self.generic_snakecrow = GenericSnakecrow()
         self.generic_swimmer = GenericSwimmer()
         self.cube = Cube()
-        self.enemypoint = Cube(colors["EnemyRoutes"])
+        self.enemypoint = Cube(colors["EnemyPaths"])
         self.checkpointleft = Cube(colors["CheckpointLeft"])
         self.checkpointright = Cube(colors["CheckpointRight"])
         self.objectpoint = Cube(colors["ObjectRoutes"])
@@ -44,6 +49,12 @@ class ObjectModels(object):
                                                        (0.0, 0.5, 1.0, 1.0),
                                                        (1.0, 0.0, 0.5, 1.0))]
 
+        # The render_*_position* methods queue their markers, render_markers and render_markers_coloredid
+        # draw the queued ones all at once
+        self.markers = InstancedMarkers(self.cube)
+        self.oriented_markers = InstancedMarkers(self.generic, oriented=True)
+        self.id_markers = InstancedMarkers(self.cube)
+        self.oriented_id_markers = InstancedMarkers(self.generic, oriented=True)
 
         genericmodels = {
             "Chappy": self.generic_chappy,
@@ -74,6 +85,8 @@ class ObjectModels(object):
 
         with open("resources/arrow_head.obj", "r") as f:
             self.arrow_head = Model.from_obj(f, rotate=True, scale=300.0)
+        # Arrow heads as lib.line_geometry.arrow_heads places them, drawn all at once
+        self.arrow_heads = InstancedArrowHeads(self.arrow_head)
 
     def init_gl(self):
         for dirpath, dirs, files in os.walk("resources/objectmodels"):
@@ -181,51 +194,25 @@ class ObjectModels(object):
         self._render_generic_position_rotation(objecttype, position, rotation, selected)
 
     def _render_generic_position_rotation(self, name, position, rotation, selected):
-        glPushMatrix()
-        glTranslatef(position.x, -position.z, position.y)
-        mtx = rotation.mtx
-        #glBegin(GL_LINES)
-        #glVertex3f(0.0, 0.0, 0.0)
-        #glVertex3f(mtx[0][0] * 2000, mtx[0][1] * 2000, mtx[0][2] * 2000)
-        #glEnd()
-
-        glMultMatrixf(mtx)
-
-        glColor3f(0.0, 0.0, 0.0)
-        glBegin(GL_LINE_STRIP)
-        glVertex3f(0.0, 0.0, 750.0)
-        glVertex3f(0.0, 0.0, 0.0)
-        glVertex3f(1000.0, 0.0, 0.0)
-        glEnd()
-
-
-        #glMultMatrixf(rotation.mtx[])
-        getattr(self, name).render(selected=selected)
-
-        glPopMatrix()
+        # All of these are GenericObjects that only differ in their body color
+        self.oriented_markers.add(position, rotation, getattr(self, name).bodycolor, selected)
 
     def _render_generic_position(self, cube, position, selected):
-        glPushMatrix()
-        glTranslatef(position.x, -position.z, position.y)
-        cube.render(selected=selected)
-
-        glPopMatrix()
+        self.markers.add(position, None, cube.color, selected)
 
     def render_generic_position_colored_id(self, position, id):
-        glPushMatrix()
-        glTranslatef(position.x, -position.z, position.y)
-        self.cube.render_coloredid(id)
-
-        glPopMatrix()
+        self.id_markers.add(position, None, id_color(id))
 
     def render_generic_position_rotation_colored_id(self, position, rotation, id):
-        glPushMatrix()
-        glTranslatef(position.x, -position.z, position.y)
-        mtx = rotation.mtx
-        glMultMatrixf(mtx)
-        self.generic.render_coloredid(id)
+        self.oriented_id_markers.add(position, rotation, id_color(id))
 
-        glPopMatrix()
+    def render_markers(self, frustum=None, stats=None):
+        self.markers.render(frustum, stats)
+        self.oriented_markers.render(frustum, stats)
+
+    def render_markers_coloredid(self, frustum=None):
+        self.id_markers.render_coloredid(frustum)
+        self.oriented_id_markers.render_coloredid(frustum)
 
     def render_line(self, pos1, pos2):
         pass
@@ -1,7 +1,9 @@
-from struct import pack, unpack
+import os
+from struct import pack, unpack, pack_into
 from io import BytesIO
 from itertools import chain
-from .yaz0 import decompress, compress_fast, read_uint32, read_uint16
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .yaz0 import Yaz0Reader, decompress_data, compress, compress_data, read_uint32, read_uint16, LEVELS, LEVEL_GREEDY
 
 import time
 
@@ -85,6 +87,19 @@ def stringtable_get_name(f, stringtable_offset, offset):
     return decodedfilename
 
 
+def normalize_path(path):
+    return path.replace("\\", "/").strip("/")
+
+
+def name_suffixes(name):
+    # The full name and every suffix of it starting at an underscore or dot, e.g.
+    # luigi_course.bol, _course.bol and .bol
+    yield name
+    for i, char in enumerate(name):
+        if i > 0 and (char == "_" or char == "."):
+            yield name[i:]
+
+
 def split_path(path): # Splits path at first backslash encountered
     for i, char in enumerate(path):
         if char == "/" or char == "\\":
@@ -128,7 +143,8 @@ class Directory(object):
 
 
     @classmethod
-    def from_node(cls, f, _name, stringtable_offset, globalentryoffset, dataoffset, nodelist, currentnodeindex, parents=None):
+    def from_node(cls, f, _name, stringtable_offset, globalentryoffset, dataoffset, nodelist, currentnodeindex, parents=None,
+                  buffer=None):
         #print("=============================")
         #print("Creating new node with index", currentnodeindex)
         name, unknown, entrycount, entryoffset = nodelist[currentnodeindex]
@@ -176,7 +192,8 @@ class Directory(object):
                     print("Skipping")
                     continue
 
-                subdir = Directory.from_node(f, name, stringtable_offset, globalentryoffset, dataoffset, nodelist, nodeindex, parents=newparents)
+                subdir = Directory.from_node(f, name, stringtable_offset, globalentryoffset, dataoffset, nodelist, nodeindex, parents=newparents,
+                                             buffer=buffer)
                 subdir.parent = newdir
 
                 newdir.subdirs[subdir.name] = subdir
@@ -184,7 +201,11 @@ class Directory(object):
 
             else: # entry is a file
                 f.seek(offset)
-                file = File.from_fileentry(f, stringtable_offset, dataoffset, fileid, hashcode, flags, nameoffset, filedataoffset, datasize)
+                file = File.from_fileentry(f, stringtable_offset, dataoffset, fileid, hashcode, flags, nameoffset, filedataoffset, datasize,
+                                           buffer=buffer)
+                if buffer is not None:
+                    # Remember where the entry and data are for incremental saving
+                    file._entry = (offset, dataoffset+filedataoffset, datasize)
                 newdir.files[file.name] = file
 
         return newdir
@@ -222,15 +243,18 @@ class Directory(object):
         name, rest = split_path(path)
 
         if rest is None or rest.strip() == "":
-            if isinstance(name, File):
+            if isinstance(entry, File):
                 if name in self.subdirs:
                     raise FileExistsError("Cannot add file, '{}' already exists as a directory".format(path))
 
+                entry.name = name
                 self.files[name] = entry
-            elif isinstance(name, Directory):
+            elif isinstance(entry, Directory):
                 if name in self.files:
                     raise FileExistsError("Cannot add directory, '{}' already exists as a file".format(path))
 
+                entry.name = name
+                entry.parent = self
                 self.subdirs[name] = entry
             else:
                 raise TypeError("Entry should be of type File or Directory but is type {}".format(type(entry)))
@@ -238,7 +262,7 @@ class Directory(object):
         elif name in self.files:
             raise RuntimeError("File", name, "is a directory in path", path, "which should not happen!")
         else:
-            return self.subdirs[name][rest]
+            self.subdirs[name][rest] = entry
 
     def listdir(self, path):
         if path == ".":
@@ -265,7 +289,13 @@ class Directory(object):
 
 
 class File(BytesIO):
-    def __init__(self, filename, fileid=None, hashcode=None, flags=None):
+    """A file in an archive.
+
+    A file can be created from a read-only view into a buffer that holds the
+    whole archive. Reading is then served from the view and the data is only
+    copied into the file's own buffer once the file is modified.
+    """
+    def __init__(self, filename, fileid=None, hashcode=None, flags=None, view=None):
         super().__init__()
 
         self.name = filename
@@ -273,6 +303,9 @@ class File(BytesIO):
         self._hashcode = hashcode
         self._flags = flags
 
+        self._view = view
+        self._viewpos = 0
+
     @classmethod
     def from_file(cls, filename, f):
         file = cls(filename)
@@ -283,13 +316,18 @@ class File(BytesIO):
         return file
 
     @classmethod
-    def from_fileentry(cls, f, stringtable_offset, globaldataoffset, fileid, hashcode, flags, nameoffset, filedataoffset, datasize):
+    def from_fileentry(cls, f, stringtable_offset, globaldataoffset, fileid, hashcode, flags, nameoffset, filedataoffset, datasize,
+                       buffer=None):
         filename = stringtable_get_name(f, stringtable_offset, nameoffset)
         """print("-----")
         print("File", len(filename))
         print("size", datasize)
         print(hex(stringtable_offset), hex(nameoffset))
         print(hex(datasize))"""
+        if buffer is not None:
+            start = globaldataoffset+filedataoffset
+            return cls(filename, fileid, hashcode, flags, view=buffer[start:start+datasize])
+
         file = cls(filename, fileid, hashcode, flags)
 
         f.seek(globaldataoffset+filedataoffset)
@@ -300,14 +338,111 @@ class File(BytesIO):
 
         return file
 
+    def _materialize(self):
+        if self._view is not None:
+            view, pos = self._view, self._viewpos
+            self._view = None
+            super().seek(0)
+            super().write(view)
+            super().seek(pos)
+
+    def getview(self):
+        # Read-only memoryview of the file's data that avoids a copy where possible.
+        if self._view is not None:
+            return self._view
+        else:
+            return memoryview(super().getvalue())
+
+    def getvalue(self):
+        if self._view is not None:
+            return bytes(self._view)
+        return super().getvalue()
+
+    def getbuffer(self):
+        self._materialize()
+        return super().getbuffer()
+
+    def read(self, size=-1):
+        if self._view is None:
+            return super().read(size)
+
+        start = min(self._viewpos, len(self._view))
+        if size is None or size < 0:
+            end = len(self._view)
+        else:
+            end = min(start + size, len(self._view))
+        self._viewpos = max(self._viewpos, end)
+        return bytes(self._view[start:end])
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+    def readinto(self, b):
+        if self._view is None:
+            return super().readinto(b)
+
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readline(self, size=-1):
+        self._materialize()
+        return super().readline(size)
+
+    def readlines(self, hint=-1):
+        self._materialize()
+        return super().readlines(hint)
+
+    def seek(self, offset, whence=0):
+        if self._view is None:
+            return super().seek(offset, whence)
+
+        if whence == 1:
+            offset += self._viewpos
+        elif whence == 2:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("negative seek value {0}".format(offset))
+        self._viewpos = offset
+        return offset
+
+    def tell(self):
+        if self._view is None:
+            return super().tell()
+        return self._viewpos
+
+    def write(self, b):
+        self._materialize()
+        return super().write(b)
+
+    def writelines(self, lines):
+        self._materialize()
+        return super().writelines(lines)
+
+    def truncate(self, size=None):
+        self._materialize()
+        return super().truncate(size)
+
     def dump(self, f):
-        f.write(self.getvalue())
+        f.write(self.getview())
 
 
 class Archive(object):
     def __init__(self):
         self.root = None
 
+        # Set for archives loaded lazily, write_arc then only rewrites changed files.
+        self._source = None
+        self._data_offset = None
+        self._loaded_tree = None
+        self._loaded_files = None
+
+        # Full path -> File or Directory, and file name suffix -> full paths of files,
+        # see name_suffixes. Built on first use and kept up to date by __setitem__.
+        self._paths = None
+        self._suffixes = None
+        self._indexed_root = None
+
     @classmethod
     def from_dir(cls, path, follow_symlinks=False):
         arc = cls()
@@ -318,26 +453,32 @@ class Archive(object):
 
 
     @classmethod
-    def from_file(cls, f):
+    def from_file(cls, f, lazy=False):
+        """Read an archive, Yaz0 compressed or not, from f.
+
+        With lazy set, the files in the archive are views into a single buffer
+        holding the whole archive instead of copies, see File.
+        """
         newarc = cls()
         print("ok")
         header = f.read(4)
+        buffer = None
 
         if header == b"Yaz0":
-            # Decompress first
-            print("Yaz0 header detected, decompressing...")
-            start = time.time()
-            tmp = BytesIO()
-            f.seek(0)
-            decompress(f, tmp)
-            #with open("decompressed.bin", "wb") as g:
-            #    decompress(f,)
-            f = tmp
+            # Data is decompressed as the parser reads it
+            print("Yaz0 header detected, decompressing while reading...")
             f.seek(0)
+            f = Yaz0Reader(f)
+            if lazy:
+                buffer = f.getbuffer().toreadonly()
 
             header = f.read(4)
-            print("Finished decompression.")
-            print("Time taken:", time.time() - start)
+        elif lazy:
+            f.seek(0)
+            data = f.read()
+            buffer = memoryview(data)
+            f = BytesIO(data)
+            f.seek(4)
 
         if header == b"RARC":
             pass
@@ -375,10 +516,24 @@ class Archive(object):
             nodes.append((dir_name, unknown, entrycount, entryoffset))
 
         rootfoldername = nodes[0][0]
-        newarc.root = Directory.from_node(f, rootfoldername, stringtable_offset, file_entry_offset, data_offset, nodes, 0)
+        newarc.root = Directory.from_node(f, rootfoldername, stringtable_offset, file_entry_offset, data_offset, nodes, 0,
+                                          buffer=buffer)
+
+        if buffer is not None:
+            newarc._source = buffer
+            newarc._data_offset = data_offset
+            newarc._loaded_tree = newarc._get_tree()
+            newarc._loaded_files = {}
+            for dirpath, dirnames, filenames in newarc.root.walk():
+                dir = newarc[dirpath]
+                for filename in filenames:
+                    newarc._loaded_files[dirpath + "/" + filename] = dir.files[filename]
 
         return newarc
 
+    def _get_tree(self):
+        return [(dirpath, tuple(dirnames), tuple(filenames)) for dirpath, dirnames, filenames in self.root.walk()]
+
     def listdir(self, path):
         if path == ".":
             return [self.root.name]
@@ -389,7 +544,65 @@ class Archive(object):
             entries.extend(dir.subdirs.keys())
             return entries
 
+    def _get_index(self):
+        if self._paths is None or self._indexed_root is not self.root:
+            self._paths = {}
+            self._suffixes = {}
+            self._indexed_root = self.root
+            if self.root is not None:
+                self._index_entry(self.root.name, self.root)
+
+        return self._paths
+
+    def _index_entry(self, path, entry):
+        self._paths[path] = entry
+
+        if isinstance(entry, Directory):
+            for name, subdir in entry.subdirs.items():
+                self._index_entry(path + "/" + name, subdir)
+            for name, file in entry.files.items():
+                self._index_entry(path + "/" + name, file)
+        else:
+            for suffix in name_suffixes(path.rsplit("/", 1)[-1]):
+                self._suffixes.setdefault(suffix, []).append(path)
+
+    def _unindex_entry(self, path):
+        subpath = path + "/"
+        for indexed_path in [p for p in self._paths if p == path or p.startswith(subpath)]:
+            entry = self._paths.pop(indexed_path)
+            if isinstance(entry, File):
+                for suffix in name_suffixes(indexed_path.rsplit("/", 1)[-1]):
+                    self._suffixes[suffix].remove(indexed_path)
+
+    def find_path(self, suffix, dirpath=None):
+        """Return the full path of the first file whose name ends with suffix, or None.
+
+        If dirpath is given, only files directly in that directory are considered.
+        Suffixes starting with an underscore or dot, or full file names, are
+        looked up in the index, anything else needs a scan over all files.
+        """
+        paths = self._get_index()
+
+        if suffix[:1] in ("_", ".") and "/" not in suffix:
+            candidates = self._suffixes.get(suffix, ())
+        else:
+            candidates = [path for path, entry in paths.items()
+                          if isinstance(entry, File) and path.endswith(suffix)]
+
+        if dirpath is not None:
+            dirpath = normalize_path(dirpath)
+
+        for path in candidates:
+            if dirpath is None or path.rsplit("/", 1)[0] == dirpath:
+                return path
+
+        return None
+
     def __getitem__(self, path):
+        entry = self._get_index().get(normalize_path(path))
+        if entry is not None:
+            return entry
+
         dirname, rest = split_path(path)
 
         if rest is None or rest.strip() == "":
@@ -411,19 +624,98 @@ class Archive(object):
             else:
                 raise TypeError("Root entry should be of type directory but is type '{}'".format(type(entry)))
         else:
+            self._get_index()
             self.root[rest] = entry
 
+            path = self.root.name + "/" + normalize_path(rest)
+            self._unindex_entry(path)
+            self._index_entry(path, entry)
+
     def extract_to(self, path):
         self.root.extract_to(path)
 
-    def write_arc_compressed(self, f):
+    def write_arc_compressed(self, f, level=LEVEL_GREEDY):
         temp = BytesIO()
         self.write_arc(temp)
         temp.seek(0)
 
-        compress_fast(temp, f)
+        compress(temp, f, level)
+
+    def _get_incremental_layout(self):
+        # Returns the loaded files ordered by data offset with their current File objects,
+        # or None if the archive's structure changed since loading and needs a full rewrite.
+        if self._source is None or self._get_tree() != self._loaded_tree:
+            return None
+
+        layout = []
+        for path, loaded_file in self._loaded_files.items():
+            entryoffset, dataoffset, datasize = loaded_file._entry
+            layout.append((dataoffset, datasize, entryoffset, loaded_file, self[path]))
+        layout.sort(key=lambda x: x[0])
+
+        for i in range(1, len(layout)):
+            if layout[i][0] < layout[i-1][0] + layout[i-1][1]:
+                return None  # Overlapping file data
+
+        if layout and layout[0][0] < self._data_offset:
+            return None
+
+        return layout
 
     def write_arc(self, f):
+        layout = self._get_incremental_layout()
+        if layout is not None:
+            self._write_arc_incremental(f, layout)
+        else:
+            self._write_arc_full(f)
+
+    def _write_arc_incremental(self, f, layout):
+        # Reuses the node, entry and string tables of the loaded archive. Unchanged file data is
+        # written straight from the loaded buffer, only the entries of moved or changed files are patched.
+        source = self._source
+        data_offset = self._data_offset
+        old_size = unpack(">I", source[4:8])[0]
+        old_datasize = old_size - data_offset
+
+        header = bytearray(source[:data_offset])
+        segments = []
+        position = data_offset
+
+        if layout and layout[0][0] > data_offset:
+            segments.append(source[data_offset:layout[0][0]])
+            position += len(segments[-1])
+
+        for i, (dataoffset, datasize, entryoffset, loaded_file, file) in enumerate(layout):
+            if i+1 < len(layout):
+                slot_end = layout[i+1][0]
+            else:
+                # The header size may claim more than the loaded buffer holds
+                slot_end = min(max(old_size, dataoffset + datasize), len(source))
+
+            if file is loaded_file and file._view is not None:
+                segments.append(source[dataoffset:slot_end])
+                if position != dataoffset:
+                    pack_into(">I", header, entryoffset+8, position - data_offset)
+                position += len(segments[-1])
+            else:
+                data = file.getview()
+                size = len(data)
+                padding = -(position + size) & 0x1F
+                segments.append(data)
+                segments.append(b"\x00"*padding)
+                pack_into(">II", header, entryoffset+8, position - data_offset, size)
+                position += size + padding
+
+        pack_into(">I", header, 4, position)
+        for field in (0x10, 0x14, 0x18):
+            if unpack(">I", header[field:field+4])[0] in (old_datasize, len(source) - data_offset):
+                pack_into(">I", header, field, position - data_offset)
+
+        f.write(header)
+        for segment in segments:
+            f.write(segment)
+
+    def _write_arc_full(self, f):
         stringtable = StringTable()
 
         nodes = BytesIO()
@@ -518,7 +810,7 @@ class Archive(object):
 
                 filedata_offset = data.tell()
                 write_uint32(f, filedata_offset) # Write file data offset
-                data.write(file.getvalue()) # Write file data
+                data.write(file.getview()) # Write file data
                 write_uint32(f, data.tell()-filedata_offset) # Write file size
                 write_pad32(data)
                 write_uint32(f, 0)
@@ -571,87 +863,177 @@ class Archive(object):
         write_uint32(f, current_stringtable_offset-0x20)
 
 
+def find_archive_root_dir(path):
+    # An extracted archive is a directory containing exactly one folder, the root of the archive.
+    rootdir = None
 
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            if rootdir is None:
+                rootdir = entry.name
+            else:
+                raise RuntimeError("Directory {0} contains multiple folders! Only one folder should exist.".format(path))
 
+    if rootdir is None:
+        raise RuntimeError("Directory {0} contains no folders! Exactly one folder should exist.".format(path))
 
+    return os.path.join(path, rootdir)
 
 
+def compress_archive(inputpath, outputpath, level=LEVEL_GREEDY):
+    """Write inputpath as a Yaz0 compressed archive to outputpath.
 
+    inputpath is either an extracted archive directory or an archive file,
+    which is recompressed. Returns the time taken in seconds.
+    """
+    start = time.time()
 
+    if os.path.isdir(inputpath):
+        archive = Archive.from_dir(find_archive_root_dir(inputpath))
+        data = BytesIO()
+        archive.write_arc(data)
+        data = data.getvalue()
+    else:
+        with open(inputpath, "rb") as f:
+            data = f.read()
+        if data[:4] == b"Yaz0":
+            data = decompress_data(data)
+
+    with open(outputpath, "wb") as f:
+        f.write(compress_data(data, level))
+
+    return time.time() - start
+
+
+def compress_archives(jobs, level=LEVEL_GREEDY, workers=None):
+    """Compress many archives in parallel, one process per archive.
+
+    jobs is an iterable of (inputpath, outputpath) pairs as taken by
+    compress_archive. workers is the process count and defaults to the
+    number of CPUs. Yields (inputpath, outputpath, seconds) in the order
+    the archives finish.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for inputpath, outputpath in jobs:
+            future = executor.submit(compress_archive, inputpath, outputpath, level)
+            futures[future] = (inputpath, outputpath)
+
+        for future in as_completed(futures):
+            inputpath, outputpath = futures[future]
+            yield inputpath, outputpath, future.result()
+
+
+def find_batch_jobs(inputdir, outputdir):
+    # Extracted archives (directories) and archive files directly inside inputdir. Archive files are only
+    # recompressed into a different output directory, otherwise they would be overwritten, and with the
+    # output directory inside inputdir the archives written there by an earlier run are left alone.
+    # Inputs that would be written to the same output file, e.g. X.arc_ext and X.arc, are an error.
+    jobs = []
+    outputs = {}
+    same_dir = os.path.normpath(inputdir) == os.path.normpath(outputdir)
+
+    for entry in sorted(os.scandir(inputdir), key=lambda entry: entry.name):
+        if entry.is_dir():
+            if os.path.normpath(entry.path) == os.path.normpath(outputdir):
+                continue
+            if entry.name.endswith("_ext"):
+                outputname = entry.name[:-4]
+            else:
+                outputname = entry.name + ".szs"
+        elif entry.name.lower().endswith((".arc", ".szs")):
+            if same_dir:
+                continue
+            outputname = entry.name
+        else:
+            continue
 
+        outputpath = os.path.join(outputdir, outputname)
+        # Compared without case, file names aren't case sensitive on Windows
+        other = outputs.setdefault(os.path.normcase(outputpath).lower(), entry.path)
+        if other != entry.path:
+            raise RuntimeError("{0} and {1} would both be written to {2}, rename or move one of them.".format(
+                other, entry.path, outputpath))
+        jobs.append((entry.path, outputpath))
 
-
-
-
+    return jobs
 
 
 if __name__ == "__main__":
     import argparse
-    import os
 
     parser = argparse.ArgumentParser()
     parser.add_argument("input",
                         help="Path to the archive file (usually .arc or .szs) to be extracted or the directory to be packed into an archive file.")
     parser.add_argument("--yaz0fast", action="store_true",
                         help="Encode archive as yaz0 when doing directory->.arc/.szs")
+    parser.add_argument("--yaz0level", choices=list(LEVELS), default=LEVEL_GREEDY,
+                        help="Yaz0 compression level. Lazy compresses best, fast is quickest.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Yaz0 compress every extracted archive directory and archive file inside the input directory. "
+                             "Output is an optional directory for the compressed archives, by default <input>_packed.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of processes used with --batch. Default is the number of CPUs.")
     parser.add_argument("output", default=None, nargs = '?',
                         help="Output path to which the archive is extracted or a new archive file is written, depending on input.")
 
     args = parser.parse_args()
 
     inputpath = os.path.normpath(args.input)
-    if os.path.isdir(inputpath):
-        dir2arc = True
+
+    if args.batch:
+        if not os.path.isdir(inputpath):
+            raise RuntimeError("{0} is not a directory! Batch mode needs a directory as input.".format(inputpath))
+
+        outputdir = inputpath + "_packed" if args.output is None else args.output
+        os.makedirs(outputdir, exist_ok=True)
+        jobs = find_batch_jobs(inputpath, outputdir)
+        print("Compressing", len(jobs), "archives")
+
+        start = time.time()
+        for done, (jobinput, joboutput, taken) in enumerate(compress_archives(jobs, args.yaz0level, args.workers)):
+            print("[{0}/{1}] {2} -> {3} in {4:.2f}s".format(done+1, len(jobs), jobinput, joboutput, taken))
+        print("Done in {0:.2f}s".format(time.time() - start))
     else:
-        dir2arc = False
+        if os.path.isdir(inputpath):
+            dir2arc = True
+        else:
+            dir2arc = False
 
 
-    if args.output is None:
-        path, name = os.path.split(inputpath)
+        if args.output is None:
+            path, name = os.path.split(inputpath)
 
-        if dir2arc:
-            if args.yaz0fast:
-                ending = ".szs"
-            else:
-                ending = ".arc"
+            if dir2arc:
+                if args.yaz0fast:
+                    ending = ".szs"
+                else:
+                    ending = ".arc"
             
-            if inputpath.endswith("_ext"):
-                outputpath = inputpath[:-4]
+                if inputpath.endswith("_ext"):
+                    outputpath = inputpath[:-4]
+                else:
+                    outputpath = inputpath + ending 
             else:
-                outputpath = inputpath + ending 
+                outputpath = os.path.join(path, name+"_ext")
         else:
-            outputpath = os.path.join(path, name+"_ext")
-    else:
-        outputpath = args.output
+            outputpath = args.output
 
-    if dir2arc:
-        dirscan = os.scandir(inputpath)
-        inputdir = None 
-        
-        for entry in dirscan:
-            if entry.is_dir():
-                if inputdir is None:
-                    inputdir = entry.name
-                else:
-                    raise RuntimeError("Directory {0} contains multiple folders! Only one folder should exist.".format(inputpath))
-        
-        if inputdir is None:
-            raise RuntimeError("Directory {0} contains no folders! Exactly one folder should exist.".format(inputpath))
-        
-        print("Packing directory to archive")
-        archive = Archive.from_dir(os.path.join(inputpath, inputdir))
-        print("Directory loaded into memory, writing archive now")
+        if dir2arc:
+            print("Packing directory to archive")
+            archive = Archive.from_dir(find_archive_root_dir(inputpath))
+            print("Directory loaded into memory, writing archive now")
 
-        with open(outputpath, "wb") as f:
-            if args.yaz0fast:
-                archive.write_arc_compressed(f)
-            else:
-                archive.write_arc(f)
-        print("Done")
-    else:
-        print("Extracting archive to directory")
-        with open(inputpath, "rb") as f:
-            archive = Archive.from_file(f)
-        archive.extract_to(outputpath)
+            with open(outputpath, "wb") as f:
+                if args.yaz0fast:
+                    archive.write_arc_compressed(f, args.yaz0level)
+                else:
+                    archive.write_arc(f)
+            print("Done")
+        else:
+            print("Extracting archive to directory")
+            with open(inputpath, "rb") as f:
+                archive = Archive.from_file(f)
+            archive.extract_to(outputpath)
 
 
@@ -6,7 +6,7 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), os.path.pardir))
 
-from lib.yaz0 import decompress, read_uint32, read_uint16, compress_fast
+from lib.yaz0 import Yaz0Reader, read_uint32, read_uint16, compress_data, LEVELS, LEVEL_GREEDY
 
 
 def write_uint32(f, val):
@@ -134,7 +134,7 @@ class SARCArchive(object):
                     print("Permission denied:", os.path.join(dirpath, filename), "skipping...")
         return arc
 
-    def to_file(self, f, compress=False, padding=0x20):
+    def to_file(self, f, compress=False, padding=0x20, level=LEVEL_GREEDY):
         if compress:
             file = BytesIO()
         else:
@@ -191,8 +191,7 @@ class SARCArchive(object):
         write_uint32(file, dataoffset)
 
         if compress:
-            file.seek(0)
-            compress_fast(file, f)
+            f.write(compress_data(file.getvalue(), level))
 
 
     @classmethod
@@ -202,20 +201,12 @@ class SARCArchive(object):
         header = f.read(4)
 
         if header == b"Yaz0":
-            # Decompress first
-            print("Yaz0 header detected, decompressing...")
-            start = time.time()
-            tmp = BytesIO()
-            f.seek(0)
-            decompress(f, tmp)
-            #with open("decompressed.bin", "wb") as g:
-            #    decompress(f,)
-            f = tmp
+            # Data is decompressed as the parser reads it
+            print("Yaz0 header detected, decompressing while reading...")
             f.seek(0)
+            f = Yaz0Reader(f)
 
             header = f.read(4)
-            print("Finished decompression.")
-            print("Time taken:", time.time() - start)
 
         if header == b"SARC":
             pass
@@ -303,6 +294,8 @@ if __name__ == "__main__":
                         help="Path to the archive file (usually .arc or .szs) to be extracted or the directory to be packed into an archive file.")
     parser.add_argument("--yaz0fast", action="store_true",
                         help="Encode archive as yaz0 when doing directory->.arc/.szs")
+    parser.add_argument("--yaz0level", choices=list(LEVELS), default=LEVEL_GREEDY,
+                        help="Yaz0 compression level. Lazy compresses best, fast is quickest.")
     parser.add_argument("output", default=None, nargs='?',
                         help="Output path to which the archive is extracted or a new archive file is written, depending on input.")
     parser.add_argument("--padding", default=0x20, type=int,
@@ -337,7 +330,7 @@ if __name__ == "__main__":
     if dir2arc:
         sarc = SARCArchive.from_folder(inputpath)
         with open(outputpath, "wb") as f:
-            sarc.to_file(f, padding=args.padding, compress=args.yaz0fast)
+            sarc.to_file(f, padding=args.padding, compress=args.yaz0fast, level=args.yaz0level)
     else:
         with open(inputpath, "rb") as f:
             sarc = SARCArchive.from_file(f)
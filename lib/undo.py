@@ -0,0 +1,535 @@
+import sys
+
+import numpy
+
+from lib import libbol
+
+# Default memory budget of the undo and redo history together
+UNDO_MEMORY_BUDGET = 64*1024*1024
+
+# Attributes that belong to the user interface, not to the document
+IGNORED_ATTRIBUTES = ("widget", )
+
+# Tags of frozen states that need more than a plain value to be restored
+_MISSING = object()
+_VALUE = object()
+_ARRAY = object()
+_LIST = object()
+_DICT = object()
+
+# How values of a type are frozen
+_SCALAR = 0
+_DOCUMENT = 1
+_LIST_KIND = 2
+_ARRAY_KIND = 3
+_VALUE_KIND = 4
+_DICT_KIND = 5
+_OTHER = 6
+
+_SCALARS = (int, float, bool, str, bytes, type(None), type)
+_ENTRY_OVERHEAD = 64
+_kinds = {}
+
+
+def get_kind(cls):
+    kind = _kinds.get(cls)
+    if kind is None:
+        if issubclass(cls, _SCALARS):
+            kind = _SCALAR
+        elif issubclass(cls, list):
+            # Containers such as ObjectContainer are tracked as lists
+            kind = _LIST_KIND
+        elif issubclass(cls, dict):
+            kind = _DICT_KIND
+        elif issubclass(cls, numpy.ndarray):
+            kind = _ARRAY_KIND
+        elif cls.__module__ == libbol.__name__:
+            kind = _DOCUMENT
+        elif cls.__dictoffset__ != 0:
+            # Small value types such as Vector3
+            kind = _VALUE_KIND
+        else:
+            kind = _OTHER
+        _kinds[cls] = kind
+
+    return kind
+
+
+def is_document_object(value):
+    return get_kind(type(value)) == _DOCUMENT
+
+
+def freeze(value):
+    # Returns a state of value that compares equal as long as the value doesn't change, including the
+    # values it holds. Document objects are tracked on their own and are only referenced.
+    kind = get_kind(type(value))
+    if kind == _LIST_KIND:
+        return (_LIST, value, tuple(freeze(item) for item in value))
+    elif kind == _DICT_KIND:
+        return (_DICT, value, tuple((key, freeze(item)) for key, item in value.items()))
+    elif kind == _ARRAY_KIND:
+        return (_ARRAY, value.dtype, value.shape, value.tobytes())
+    elif kind == _VALUE_KIND:
+        return (_VALUE, value, {name: freeze(item) for name, item in value.__dict__.items()})
+    else:
+        return value
+
+
+def thaw(state):
+    # Returns the value a frozen state was taken from, put back the way it was. Lists, dicts and value
+    # objects are restored in place so that references held elsewhere (e.g. by the selection) stay valid.
+    if type(state) is tuple and state:
+        tag = state[0]
+        if tag is _VALUE:
+            _, value, attributes = state
+            value.__dict__.clear()
+            value.__dict__.update({name: thaw(item) for name, item in attributes.items()})
+            return value
+        elif tag is _LIST:
+            _, items, values = state
+            items[:] = [thaw(item) for item in values]
+            return items
+        elif tag is _DICT:
+            _, items, values = state
+            items.clear()
+            items.update((key, thaw(item)) for key, item in values)
+            return items
+        elif tag is _ARRAY:
+            _, dtype, shape, data = state
+            return numpy.frombuffer(data, dtype=dtype).reshape(shape).copy()
+
+    return state
+
+
+def restore(obj, name, state):
+    # Puts a frozen state back into the attribute
+    current = getattr(obj, name, _MISSING)
+
+    if state is _MISSING:
+        if current is not _MISSING:
+            delattr(obj, name)
+    elif type(state) is tuple and state and state[0] is _ARRAY:
+        _, dtype, shape, data = state
+        if isinstance(current, numpy.ndarray) and current.shape == shape and current.dtype == dtype:
+            current[...] = numpy.frombuffer(data, dtype=dtype).reshape(shape)
+        else:
+            setattr(obj, name, thaw(state))
+    elif (type(state) is tuple and state and state[0] is _VALUE
+            and current is not state[1] and type(current) is type(state[1])):
+        # The value was swapped for another of its type, which may be referenced by now
+        current.__dict__.clear()
+        current.__dict__.update({name: thaw(item) for name, item in state[2].items()})
+    else:
+        value = thaw(state)
+        if current is not value:
+            setattr(obj, name, value)
+
+
+def state_size(state):
+    size = sys.getsizeof(state)
+    if type(state) is tuple:
+        for item in state:
+            if isinstance(item, (tuple, bytes, dict)):
+                size += sys.getsizeof(item)
+    return size
+
+
+class FieldChange(object):
+    def __init__(self, obj, name, old, new):
+        self.obj = obj
+        self.name = name
+        self.old = old
+        self.new = new
+
+    def undo(self):
+        restore(self.obj, self.name, self.old)
+
+    def redo(self):
+        restore(self.obj, self.name, self.new)
+
+    def lists(self):
+        # Lists that the attribute was swapped from or to
+        return [state for state in (self.old, self.new) if get_kind(type(state)) == _LIST_KIND]
+
+    def size(self):
+        return _ENTRY_OVERHEAD + state_size(self.old) + state_size(self.new)
+
+
+class ListChange(object):
+    # Items of a list were replaced, inserted or removed. Only the part that differs is kept.
+    def __init__(self, obj, name, items, old, new):
+        start = 0
+        end = min(len(old), len(new))
+        while start < end and old[start] is new[start]:
+            start += 1
+
+        old_end = len(old)
+        new_end = len(new)
+        while old_end > start and new_end > start and old[old_end-1] is new[new_end-1]:
+            old_end -= 1
+            new_end -= 1
+
+        self.obj = obj
+        self.name = name
+        self.items = items
+        self.start = start
+        self.old = old[start:old_end]
+        self.new = new[start:new_end]
+
+    def undo(self):
+        self.items[self.start:self.start+len(self.new)] = self.old
+
+    def redo(self):
+        self.items[self.start:self.start+len(self.old)] = self.new
+
+    def lists(self):
+        return [self.items]
+
+    def removed(self):
+        return [item for item in self.old if not any(item is other for other in self.new)]
+
+    def size(self):
+        return _ENTRY_OVERHEAD + 8*(len(self.old) + len(self.new))
+
+
+class ListValuesChange(object):
+    # A list holding values such as vectors changed, its whole contents are kept
+    def __init__(self, obj, name, items, old, new):
+        self.obj = obj
+        self.name = name
+        self.items = items
+        self.old = old
+        self.new = new
+
+    def undo(self):
+        thaw((_LIST, self.items, self.old))
+
+    def redo(self):
+        thaw((_LIST, self.items, self.new))
+
+    def lists(self):
+        return [self.items]
+
+    def removed(self):
+        return []
+
+    def size(self):
+        return _ENTRY_OVERHEAD + sum(state_size(item) for item in self.old + self.new)
+
+
+class UndoEntry(object):
+    def __init__(self, changes, size):
+        self.changes = changes
+        self.size = size
+
+    def undo(self):
+        for change in reversed(self.changes):
+            change.undo()
+
+    def redo(self):
+        for change in self.changes:
+            change.redo()
+
+    def objects(self):
+        # Objects whose attributes or lists changed
+        return [change.obj for change in self.changes]
+
+    def lists(self):
+        # Lists whose items changed or that were swapped for another list
+        lists = []
+        for change in self.changes:
+            lists.extend(change.lists())
+        return lists
+
+
+class DocumentState(object):
+    # The attributes of the objects of the document and the contents of its lists as they were when they
+    # were last looked at. Attributes are only compared again for the objects passed to update(), the
+    # lists are compared every time by the identity of their items, which is cheap.
+    def __init__(self, roots):
+        # id(obj) -> (obj, {attribute name: frozen state})
+        self.objects = {}
+        # id(list) -> (list, owner, attribute name, items, frozen items or None if the items are
+        # document objects and scalars only)
+        self.lists = {}
+        # id(root) -> the attribute names of the root that belong to the document
+        self.root_attributes = {}
+
+        self.add(roots)
+
+    def add(self, roots):
+        # Starts tracking the roots and everything that can be reached from them
+        pending = []
+        for obj, attributes in roots:
+            self.root_attributes[id(obj)] = attributes
+            if id(obj) not in self.objects:
+                pending.append(obj)
+
+        self._add_objects(pending)
+
+    def _add_objects(self, pending):
+        while pending:
+            obj = pending.pop()
+            if id(obj) not in self.objects:
+                self.objects[id(obj)] = (obj, self._freeze_object(obj, pending))
+
+    def _freeze_object(self, obj, pending):
+        # Document objects and lists that aren't tracked yet are added to pending and self.lists
+        attributes = self.root_attributes.get(id(obj))
+        if attributes is None:
+            values = obj.__dict__.items()
+        else:
+            values = [(name, getattr(obj, name, _MISSING)) for name in attributes]
+
+        state = {}
+        for name, value in values:
+            kind = _kinds.get(type(value))
+            if kind is None:
+                kind = get_kind(type(value))
+
+            if kind == _SCALAR:
+                state[name] = value
+            elif kind == _DOCUMENT:
+                state[name] = value
+                if id(value) not in self.objects:
+                    pending.append(value)
+            elif kind == _LIST_KIND:
+                # The contents are tracked with the list
+                state[name] = value
+                if id(value) not in self.lists:
+                    items = tuple(value)
+                    self.lists[id(value)] = (value, obj, name, items, self._freeze_items(items, pending))
+            elif name not in IGNORED_ATTRIBUTES:
+                state[name] = freeze(value)
+
+        return state
+
+    def _freeze_items(self, items, pending):
+        frozen = None
+        for item in items:
+            kind = _kinds.get(type(item))
+            if kind is None:
+                kind = get_kind(type(item))
+
+            if kind == _DOCUMENT:
+                if id(item) not in self.objects:
+                    pending.append(item)
+            elif kind != _SCALAR:
+                frozen = True
+
+        if frozen is not None:
+            frozen = tuple(freeze(item) for item in items)
+        return frozen
+
+    def _compare_object(self, obj, old_state, state, changes):
+        for name in old_state.keys() | state.keys():
+            old_value = old_state.get(name, _MISSING)
+            new_value = state.get(name, _MISSING)
+            if old_value != new_value:
+                changes.append(FieldChange(obj, name, old_value, new_value))
+
+    def _compare_list(self, old_entry, new_entry, changes):
+        items, obj, name, old_values, old_frozen = old_entry
+        new_values, new_frozen = new_entry[3], new_entry[4]
+        if old_frozen is None and new_frozen is None:
+            changes.append(ListChange(obj, name, items, old_values, new_values))
+        else:
+            changes.append(ListValuesChange(obj, name, items,
+                                            old_values if old_frozen is None else old_frozen,
+                                            new_values if new_frozen is None else new_frozen))
+
+    def update(self, roots, objects):
+        # Compares the attributes of the roots, of the given objects and of the document objects they hold
+        # directly (e.g. a rotation) and the contents of all lists against the stored state. Returns the
+        # changes, the stored state is brought up to date.
+        changes = []
+        pending = []
+
+        candidates = []
+        for obj, attributes in roots:
+            self.root_attributes[id(obj)] = attributes
+            if id(obj) not in self.objects:
+                pending.append(obj)
+            else:
+                candidates.append(obj)
+        candidates.extend(objects)
+        self._add_objects(pending)
+
+        seen = set()
+        queue = [(obj, True) for obj in candidates]
+        while queue:
+            obj, with_parts = queue.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+
+            entry = self.objects.get(id(obj))
+            if entry is None or entry[0] is not obj:
+                continue
+
+            state = self._freeze_object(obj, pending)
+            if state != entry[1]:
+                self._compare_object(obj, entry[1], state, changes)
+                self.objects[id(obj)] = (obj, state)
+
+            if with_parts:
+                for value in state.values():
+                    if get_kind(type(value)) == _DOCUMENT:
+                        queue.append((value, False))
+
+        for key, entry in list(self.lists.items()):
+            items, obj, name, values, frozen = entry
+            new_values = tuple(items)
+            if frozen is None:
+                if new_values == values:
+                    continue
+            elif tuple(freeze(item) for item in new_values) == frozen:
+                continue
+
+            new_entry = (items, obj, name, new_values, self._freeze_items(new_values, pending))
+            self._compare_list(entry, new_entry, changes)
+            self.lists[key] = new_entry
+
+        self._add_objects(pending)
+        return changes
+
+    def diff(self, newer):
+        # The changes between this state and a state of the same document taken later
+        changes = []
+        for key, (obj, state) in newer.objects.items():
+            old = self.objects.get(key)
+            if old is None or old[0] is not obj:
+                # Objects that were added to the document are covered by the change of the list they are in
+                continue
+            if old[1] != state:
+                self._compare_object(obj, old[1], state, changes)
+
+        for key, entry in newer.lists.items():
+            old = self.lists.get(key)
+            if old is None or old[0] is not entry[0]:
+                continue
+            if old[3] != entry[3] or old[4] != entry[4]:
+                self._compare_list(old, entry, changes)
+
+        return changes
+
+    def object_size(self, obj):
+        entry = self.objects.get(id(obj))
+        if entry is None or entry[0] is not obj:
+            return 0
+        state = entry[1]
+        return sys.getsizeof(state) + sum(state_size(value) for value in state.values())
+
+
+class UndoStack(object):
+    # Changes are found by comparing the objects that were marked as possibly changed with mark_changed()
+    # against their state at the last record, along with the roots and the lists of the document. Edits
+    # mark the objects they write to as they make them. Edits that may touch any part of the document call
+    # mark_all_changed(), and when nothing was marked since the last record the whole document is compared
+    # too, so that edits made elsewhere still get their own entry.
+    def __init__(self, get_roots, budget=UNDO_MEMORY_BUDGET):
+        # get_roots returns a list of (object, attribute names or None for all attributes)
+        self.get_roots = get_roots
+        self.budget = budget
+
+        self.undo_history = []
+        self.redo_history = []
+        self.size = 0
+        self.changed = {}
+        self.all_changed = False
+        self.state = DocumentState(self.get_roots())
+
+    def reset(self):
+        self.undo_history.clear()
+        self.redo_history.clear()
+        self.size = 0
+        self.changed = {}
+        self.all_changed = False
+        self.state = DocumentState(self.get_roots())
+
+    def can_undo(self):
+        return bool(self.undo_history)
+
+    def can_redo(self):
+        return bool(self.redo_history)
+
+    def mark_changed(self, *objects):
+        for obj in objects:
+            self.changed[id(obj)] = obj
+
+    def mark_all_changed(self):
+        self.all_changed = True
+
+    def _collect_changes(self):
+        # Returns the changes since the last call and the size of the states of objects that left the
+        # document, which the undo history keeps alive
+        if self.all_changed or not self.changed:
+            # Starting over also forgets objects that are no longer part of the document
+            state = DocumentState(self.get_roots())
+            changes = self.state.diff(state)
+            retained = self._removed_size(changes, self.state)
+            self.state = state
+        else:
+            changes = self.state.update(self.get_roots(), list(self.changed.values()))
+            retained = self._removed_size(changes, self.state)
+
+        self.changed = {}
+        self.all_changed = False
+        return changes, retained
+
+    def _removed_size(self, changes, state):
+        size = 0
+        for change in changes:
+            if isinstance(change, ListChange):
+                for obj in change.removed():
+                    size += state.object_size(obj)
+        return size
+
+    def record(self):
+        # Stores the changes since the last record as a new entry
+        changes, retained = self._collect_changes()
+        if not changes:
+            return None
+
+        size = sum(change.size() for change in changes) + retained
+        entry = UndoEntry(changes, size)
+
+        for redo_entry in self.redo_history:
+            self.size -= redo_entry.size
+        self.redo_history.clear()
+
+        self.undo_history.append(entry)
+        self.size += entry.size
+        self.trim()
+
+        return entry
+
+    def undo(self):
+        if not self.undo_history:
+            return None
+
+        entry = self.undo_history.pop()
+        entry.undo()
+        self.redo_history.append(entry)
+        self.mark_changed(*entry.objects())
+        self._collect_changes()
+
+        return entry
+
+    def redo(self):
+        if not self.redo_history:
+            return None
+
+        entry = self.redo_history.pop()
+        entry.redo()
+        self.undo_history.append(entry)
+        self.mark_changed(*entry.objects())
+        self._collect_changes()
+
+        return entry
+
+    def trim(self):
+        # Drops the oldest entries until the history fits the budget, the latest entry is always kept
+        while self.size > self.budget and len(self.undo_history) > 1:
+            entry = self.undo_history.pop(0)
+            self.size -= entry.size
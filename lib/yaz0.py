@@ -7,7 +7,6 @@ from struct import unpack, pack
 import os
 import re
 import hashlib
-import math
 
 from timeit import default_timer as time
 from io import BytesIO
@@ -133,28 +132,328 @@ def decompress(f, out):
                 "{}/decompressed: {}".format(out.tell(), decompressed_size))
 
 
-def compress_fast(f, out):
-    data = f.read()
-    
-    maxsize = len(data)
-    
-    out.write(b"Yaz0")
-    out.write(pack(">I", maxsize))
-    out.write(b"\x00"*8)
+# A code byte followed by eight 3 byte back-references is the most input a group can use.
+MAX_GROUP_SIZE = 1 + 8*3
 
-    out_write = out.write
-    print("size:", hex(maxsize))
-    print(maxsize//8, maxsize/8.0)
-    for i in range(int(math.ceil(maxsize/8))):
-        start = i*8 
-        end = (i+1)*8
-        print(hex(start), hex(end))
-        if end > maxsize:
-            # Pad data with 0's up to 8 bytes
-            tocopy = data[start:maxsize] + b"\x00"*(end-maxsize)
-            print("padded")
+
+def _decode_groups(data, src, src_end, out, dst, dst_end):
+    # Decodes whole groups (a code byte and the up to 8 chunks it describes) into the
+    # preallocated out buffer until dst reaches dst_end or src reaches src_end.
+    # Back-references are copied with slice assignment. Returns the new src and dst.
+    decompressed_size = len(out)
+
+    while dst < dst_end and src < src_end:
+        code_byte = data[src]
+        src += 1
+
+        if code_byte == 0xFF and dst + 8 <= decompressed_size and src + 8 <= len(data):
+            # Fast path: 8 literal bytes in a row
+            out[dst:dst+8] = data[src:src+8]
+            src += 8
+            dst += 8
+            continue
+
+        for i in range(8):
+            if dst >= decompressed_size:
+                break
+
+            if (code_byte << i) & 0x80:
+                out[dst] = data[src]
+                src += 1
+                dst += 1
+                continue
+
+            byte1 = data[src]
+            byte2 = data[src+1]
+            src += 2
+
+            bytecount = byte1 >> 4
+            if bytecount == 0:
+                bytecount = data[src] + 0x12
+                src += 1
+            else:
+                bytecount += 2
+
+            start = dst - (((byte1 & 0x0F) << 8 | byte2) + 1)
+            if start < 0:
+                raise RuntimeError("Malformed Yaz0 file: Seek back position goes below 0")
+
+            end = dst + bytecount
+            if end > decompressed_size:
+                end = decompressed_size
+
+            if end - dst <= dst - start:
+                out[dst:end] = out[start:start+end-dst]
+                dst = end
+            else:
+                # Copy source and destination overlap. The bytes between start and dst
+                # repeat, so every copy doubles the length of the next chunk we can take.
+                while dst < end:
+                    chunk = dst - start
+                    if chunk > end - dst:
+                        chunk = end - dst
+                    out[dst:dst+chunk] = out[start:start+chunk]
+                    dst += chunk
+
+    return src, dst
+
+
+def read_header(header):
+    if header[0:4] != b"Yaz0":
+        raise RuntimeError("File is not Yaz0-compressed! Header: {0}".format(bytes(header[0:4])))
+
+    return unpack(">I", header[4:8])[0]
+
+
+def decompress_data(data):
+    """Decompress a complete Yaz0 stream held in memory.
+
+    The output is written into a bytearray preallocated to the size stored
+    in the Yaz0 header and back-references are copied with slice assignment.
+    Returns a memoryview of the decompressed data.
+    """
+    data = memoryview(data)
+    out = bytearray(read_header(data))
+
+    try:
+        src, dst = _decode_groups(data, 16, len(data), out, 0, len(out))
+    except IndexError:
+        dst = -1
+    if dst < len(out):
+        raise RuntimeError("Malformed Yaz0 file: Data ends before the decompressed size is reached")
+
+    return memoryview(out)
+
+
+class Yaz0Reader(object):
+    """Read-only file-like object that decompresses a Yaz0 stream on demand.
+
+    Compressed data is read from f in chunks and only decoded as far as the
+    consumer has read or seeked, into a single buffer of the decompressed size.
+    """
+    def __init__(self, f, chunksize=0x10000):
+        self._f = f
+        self._chunksize = chunksize
+        self.size = read_header(f.read(16))
+
+        self._input = b""
+        self._src = 0
+        self._input_done = False
+
+        self._output = bytearray(self.size)
+        self._decoded = 0
+        self._pos = 0
+
+    def _decode_until(self, target):
+        if target > self.size:
+            target = self.size
+
+        while self._decoded < target:
+            if not self._input_done and len(self._input) - self._src < MAX_GROUP_SIZE:
+                chunk = self._f.read(self._chunksize)
+                if len(chunk) == 0:
+                    self._input_done = True
+                self._input = self._input[self._src:] + chunk
+                self._src = 0
+
+            if self._input_done:
+                src_end = len(self._input)
+            else:
+                src_end = len(self._input) - MAX_GROUP_SIZE + 1
+
+            try:
+                self._src, self._decoded = _decode_groups(self._input, self._src, src_end,
+                                                          self._output, self._decoded, target)
+            except IndexError:
+                self._input_done = True
+                self._src = len(self._input)
+
+            if self._input_done and self._src >= len(self._input) and self._decoded < target:
+                raise RuntimeError("Malformed Yaz0 file: Data ends before the decompressed size is reached")
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            end = self.size
         else:
-            tocopy = data[start:end]
-        
-        out_write(b"\xFF") # Set all bits in the code byte to 1 to mark the following 8 bytes as copy
-        out_write(tocopy)
+            end = min(self._pos + size, self.size)
+
+        self._decode_until(end)
+        data = bytes(self._output[self._pos:end])
+        self._pos = max(self._pos, end)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self.size
+
+        if offset < 0:
+            raise ValueError("Negative seek position {0}".format(offset))
+
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def iter_chunks(self, chunksize=0x10000):
+        # Yields the decompressed data in order as memoryviews of at most chunksize bytes.
+        for start in range(0, self.size, chunksize):
+            end = min(start + chunksize, self.size)
+            self._decode_until(end)
+            yield memoryview(self._output)[start:end]
+
+    def getbuffer(self):
+        # Decompresses the remaining data and returns a memoryview of the whole output.
+        self._decode_until(self.size)
+        return memoryview(self._output)
+
+
+WINDOW_SIZE = 0x1000
+MIN_MATCH = 3
+MAX_MATCH = 0x111
+
+LEVEL_FAST = "fast"
+LEVEL_GREEDY = "greedy"
+LEVEL_LAZY = "lazy"
+
+# Per level: how many earlier positions with the same 3 byte prefix are tried,
+# whether positions inside a match are added to the hash chains and whether
+# a match is deferred when the next position has a longer one.
+LEVELS = {
+    LEVEL_FAST: (4, False, False),
+    LEVEL_GREEDY: (32, True, False),
+    LEVEL_LAZY: (128, True, True)
+}
+
+
+def compress_data(data, level=LEVEL_GREEDY):
+    """Compress data to a Yaz0 stream and return it as a bytearray.
+
+    Matches are searched with hash chains over the 3 byte prefixes in the
+    4 KiB window. level is one of LEVEL_FAST, LEVEL_GREEDY or LEVEL_LAZY.
+    """
+    if level not in LEVELS:
+        raise ValueError("Unknown Yaz0 compression level: {0}".format(level))
+    max_chain, insert_all, lazy = LEVELS[level]
+
+    data = bytes(data)
+    size = len(data)
+
+    out = bytearray(b"Yaz0")
+    out += pack(">I", size)
+    out += b"\x00"*8
+
+    # head maps a 3 byte prefix to the last position it was seen at, prev links
+    # each position in the window to the previous position with the same prefix.
+    head = {}
+    head_get = head.get
+    prev = [-1]*WINDOW_SIZE
+    mask = WINDOW_SIZE - 1
+    last_prefix = size - MIN_MATCH
+
+    def insert(start, end):
+        if end > last_prefix + 1:
+            end = last_prefix + 1
+        for pos in range(start, end):
+            key = data[pos:pos+3]
+            prev[pos & mask] = head_get(key, -1)
+            head[key] = pos
+
+    def find_match(pos):
+        limit = size - pos
+        if limit > MAX_MATCH:
+            limit = MAX_MATCH
+        if limit < MIN_MATCH:
+            return 0, 0
+
+        best_length = MIN_MATCH - 1
+        best_distance = 0
+        min_pos = pos - WINDOW_SIZE
+        candidate = head_get(data[pos:pos+3], -1)
+        chain = max_chain
+
+        while candidate >= min_pos and candidate >= 0 and chain > 0:
+            if (data[candidate+best_length] == data[pos+best_length]
+                    and data[candidate:candidate+best_length+1] == data[pos:pos+best_length+1]):
+                # Matching prefixes only ever get shorter, so binary search the match length.
+                low = best_length + 1
+                high = limit
+                while low < high:
+                    mid = (low + high + 1) >> 1
+                    if data[candidate:candidate+mid] == data[pos:pos+mid]:
+                        low = mid
+                    else:
+                        high = mid - 1
+
+                best_length = low
+                best_distance = pos - candidate
+                if best_length == limit:
+                    break
+
+            next_candidate = prev[candidate & mask]
+            if next_candidate >= candidate:
+                break
+            candidate = next_candidate
+            chain -= 1
+
+        if best_length < MIN_MATCH:
+            return 0, 0
+        return best_length, best_distance
+
+    code_pos = 0
+    code_bit = 0
+    pos = 0
+    deferred = None
+
+    while pos < size:
+        if code_bit == 0:
+            code_pos = len(out)
+            out.append(0)
+            code_bit = 0x80
+
+        if deferred is not None:
+            length, distance = deferred
+            deferred = None
+        else:
+            length, distance = find_match(pos)
+            insert(pos, pos+1)
+
+        if length and lazy and length < MAX_MATCH:
+            next_length, next_distance = find_match(pos+1)
+            if next_length > length:
+                # Emit a literal, the match at the next position is better
+                insert(pos+1, pos+2)
+                deferred = (next_length, next_distance)
+                length = 0
+
+        if length:
+            distance -= 1
+            if length >= 0x12:
+                out.append(distance >> 8)
+                out.append(distance & 0xFF)
+                out.append(length - 0x12)
+            else:
+                out.append((length - 2) << 4 | distance >> 8)
+                out.append(distance & 0xFF)
+
+            if insert_all:
+                insert(pos+1, pos+length)
+            pos += length
+        else:
+            out[code_pos] |= code_bit
+            out.append(data[pos])
+            pos += 1
+
+        code_bit >>= 1
+
+    return out
+
+
+def compress(f, out, level=LEVEL_GREEDY):
+    out.write(compress_data(f.read(), level))
+
+
+def compress_fast(f, out):
+    compress(f, out, LEVEL_FAST)
@@ -6,7 +6,8 @@ import os
 from timeit import default_timer
 from copy import deepcopy
 from io import TextIOWrapper, BytesIO, StringIO
-from math import sin, cos, atan2
+from concurrent.futures import ThreadPoolExecutor
+from math import sin, cos, atan2, isnan
 import json
 from PIL import Image
 import PyQt5.QtWidgets as QtWidgets
@@ -20,7 +21,6 @@ from PyQt5.QtGui import QMouseEvent, QImage
 import PyQt5.QtGui as QtGui
 
 import opengltext
-import py_obj
 
 from lib import bti
 from widgets.editor_widgets import catch_exception
@@ -36,14 +36,16 @@ from mkdd_widgets import BolMapViewer, MODE_TOPDOWN
 from lib.libbol import BOL, MGEntry, MapObject, Area, Camera, Route, get_full_name, ObjectContainer, MapObjects, Rotation, ObjectRoute, CameraRoute
 import lib.libbol as libbol
 from lib.rarc import Archive
-from lib.BCOllider import RacetrackCollision
-from lib.model_rendering import TexturedModel, CollisionModel, Minimap
+from lib.model_rendering import CollisionModel, Minimap
+from lib.collision_cache import CollisionCache, DEFAULT_CACHE_SIZE
+from lib.ground_snap import GroundSnapper, DEFAULT_SNAP_BUDGET
+from lib import collision_loader
 from widgets.editor_widgets import ErrorAnalyzer, ErrorAnalyzerButton, show_minimap_generator
 from lib.dolreader import DolFile, read_float, write_float, read_load_immediate_r0, write_load_immediate_r0, UnmappedAddress
 from widgets.file_select import FileSelect
 from PyQt5.QtWidgets import QTreeWidgetItem
-from lib.bmd_render import clear_temp_folder, load_textured_bmd
 from lib.game_visualizer import Game
+from lib.undo import UndoStack, UndoEntry, UNDO_MEMORY_BUDGET
 from lib.vectors import Vector3
 PIKMIN2GEN = "Generator files (defaultgen.txt;initgen.txt;plantsgen.txt;*.txt)"
 
@@ -94,34 +96,16 @@ def get_treeitem(root:QTreeWidgetItem, obj):
     return None
 
 
-class UndoEntry:
-
-    def __init__(self, bol_document: bytes, enemy_path_data: 'tuple[tuple[bool, int]]',
-                 minimap_data: tuple):
-        self.bol_document = bol_document
-        self.enemy_path_data = enemy_path_data
-        self.minimap_data = minimap_data
-
-        self.bol_hash = hash((bol_document, enemy_path_data))
-        self.hash = hash((self.bol_hash, self.minimap_data))
-
-    def __eq__(self, other) -> bool:
-        return self.hash == other.hash
-
-
 class GenEditor(QMainWindow):
+    # Sent from the collision loader thread and handled on the GUI thread
+    collision_load_progress = QtCore.pyqtSignal(int, str)
+    collision_load_finished = QtCore.pyqtSignal(int, object)
+
     def __init__(self):
         super().__init__()
         self.level_file = BOL.make_useful()
 
-        self.undo_history: list[tuple[int, bytes]] = []
-        self.redo_history: list[tuple[int, bytes]] = []
-
-        document = self.level_file.to_bytes()
-        self.undo_history.append((hash(document), document))
-
-        self.undo_history: list[UndoEntry] = []
-        self.redo_history: list[UndoEntry] = []
+        self.undo_stack: UndoStack = None
         self.undo_history_disabled_count: int  = 0
 
         try:
@@ -157,6 +141,7 @@ class GenEditor(QMainWindow):
         self._justupdatingselectedobject = False
 
         self.bco_coll = None
+        self.bco_geometry = None
         self.loaded_archive = None
         self.loaded_archive_file = None
         self.last_position_clicked = []
@@ -171,7 +156,22 @@ class GenEditor(QMainWindow):
 
         self.restore_geometry()
 
-        self.undo_history.append(self.generate_undo_entry())
+        undo_budget = int(self.editorconfig.get("undo_memory_budget_mb", UNDO_MEMORY_BUDGET // 2**20))
+        self.undo_stack = UndoStack(self.get_undo_roots, undo_budget * 2**20)
+        cache_size = int(self.editorconfig.get("collision_cache_mb", DEFAULT_CACHE_SIZE // 2**20))
+        self.collision_cache = CollisionCache(max_size=cache_size * 2**20)
+        # Collision is loaded on a single thread so that loads never overlap. The results of loads that were
+        # superseded by another load or by clearing the collision are dropped.
+        self.collision_loader = ThreadPoolExecutor(max_workers=1)
+        self.collision_load_generation = 0
+        self.collision_load_progress.connect(self.on_collision_load_progress)
+        self.collision_load_finished.connect(self.on_collision_load_finished)
+        # Dragged positions are kept on the ground within a time budget per frame when ground_when_moving is on
+        snap_budget = float(self.editorconfig.get("ground_when_moving_budget_ms", DEFAULT_SNAP_BUDGET * 1000))
+        self.ground_snapper = GroundSnapper(snap_budget / 1000)
+        self.ground_snap_scheduled = False
+        # The objects whose positions the ground snapper holds
+        self.ground_snap_objects = []
 
         self.leveldatatreeview.set_objects(self.level_file)
         self.leveldatatreeview.bound_to_group(self.level_file)
@@ -279,102 +279,66 @@ class GenEditor(QMainWindow):
             else:
                 self.setWindowTitle("MKDD Track Editor")
 
-    def generate_undo_entry(self) -> UndoEntry:
-        bol_document = self.level_file.to_bytes()
-
-        # List containing a tuple with the emptiness and ID of each of the enemy paths.
-        enemy_paths = self.level_file.enemypointgroups.groups
-        enemy_path_data = tuple((not path.points, path.id) for path in enemy_paths)
+    def get_undo_roots(self):
+        # The document and the minimap placement are tracked by the undo history
+        return [(self, ("level_file", )),
+                (self.level_view.minimap, ("corner1", "corner2", "orientation"))]
 
+    def is_document_change(self, undo_entry: UndoEntry) -> bool:
         minimap = self.level_view.minimap
-        minimap_data = (
-            minimap.corner1.x, minimap.corner1.y, minimap.corner1.z,
-            minimap.corner2.x, minimap.corner2.y, minimap.corner2.z,
-            minimap.orientation
-        )
-
-        return UndoEntry(bol_document, enemy_path_data, minimap_data)
-
-    def load_top_undo_entry(self):
-        if not self.undo_history:
-            return
-
-        current_undo_entry = self.generate_undo_entry()
-        undo_entry = self.undo_history[-1]
-
-        bol_changed = current_undo_entry.bol_hash != undo_entry.bol_hash
-
-        self.level_file = BOL.from_bytes(undo_entry.bol_document)
+        return any(obj is not minimap for obj in undo_entry.objects())
 
-        # The BOL document cannot store information on empty enemy paths; this information is
-        # sourced from a separate list.
-        bol_enemy_paths = list(self.level_file.enemypointgroups.groups)
-        self.level_file.enemypointgroups.groups.clear()
-        enemy_path_data = undo_entry.enemy_path_data
-        for empty, enemy_path_id in enemy_path_data:
-            if empty:
-                empty_enemy_path = libbol.EnemyPointGroup()
-                empty_enemy_path.id = enemy_path_id
-                self.level_file.enemypointgroups.groups.append(empty_enemy_path)
-            else:
-                enemy_path = bol_enemy_paths.pop(0)
-                assert enemy_path.id == enemy_path_id
-                self.level_file.enemypointgroups.groups.append(enemy_path)
-
-        self.level_view.level_file = self.level_file
-        self.leveldatatreeview.set_objects(self.level_file)
-
-        minimap = self.level_view.minimap
-        minimap.corner1.x = undo_entry.minimap_data[0]
-        minimap.corner1.y = undo_entry.minimap_data[1]
-        minimap.corner1.z = undo_entry.minimap_data[2]
-        minimap.corner2.x = undo_entry.minimap_data[3]
-        minimap.corner2.y = undo_entry.minimap_data[4]
-        minimap.corner2.z = undo_entry.minimap_data[5]
-        minimap.orientation = undo_entry.minimap_data[6]
+    def on_undo_entry_applied(self, undo_entry: UndoEntry):
+        # The entry was applied to the document in place, so only the changed parts of the tree are rebuilt.
+        if self.level_view.level_file is not self.level_file:
+            self.level_view.level_file = self.level_file
+            self.leveldatatreeview.set_objects(self.level_file)
+        else:
+            self.leveldatatreeview.update_objects(self.level_file, undo_entry.lists(), undo_entry.objects())
 
+        self.level_view.invalidate_group_caches()
         self.update_3d()
         self.pik_control.update_info()
 
-        if bol_changed:
+        if self.is_document_change(undo_entry):
             self.set_has_unsaved_changes(True)
             self.error_analyzer_button.analyze_bol(self.level_file)
 
     def on_undo_action_triggered(self):
-        if len(self.undo_history) > 1:
-            self.redo_history.insert(0, self.undo_history.pop())
+        undo_entry = self.undo_stack.undo()
+        if undo_entry is not None:
             self.update_undo_redo_actions()
-            self.load_top_undo_entry()
+            self.on_undo_entry_applied(undo_entry)
 
     def on_redo_action_triggered(self):
-        if self.redo_history:
-            self.undo_history.append(self.redo_history.pop(0))
+        undo_entry = self.undo_stack.redo()
+        if undo_entry is not None:
             self.update_undo_redo_actions()
-            self.load_top_undo_entry()
+            self.on_undo_entry_applied(undo_entry)
 
     def on_document_potentially_changed(self, update_unsaved_changes=True):
+        self.level_view.invalidate_group_caches()
+
         # Early out if undo history is temporarily disabled.
         if self.undo_history_disabled_count:
             return
 
-        undo_entry = self.generate_undo_entry()
+        undo_entry = self.undo_stack.record()
 
-        if self.undo_history[-1] != undo_entry:
-            bol_changed = self.undo_history[-1].bol_hash != undo_entry.bol_hash
-
-            self.undo_history.append(undo_entry)
-            self.redo_history.clear()
+        if undo_entry is not None:
             self.update_undo_redo_actions()
 
-            if bol_changed:
+            if self.is_document_change(undo_entry):
                 if update_unsaved_changes:
                     self.set_has_unsaved_changes(True)
 
                 self.error_analyzer_button.analyze_bol(self.level_file)
 
     def update_undo_redo_actions(self):
-        self.undo_action.setEnabled(len(self.undo_history) > 1)
-        self.redo_action.setEnabled(bool(self.redo_history))
+        can_undo = self.undo_stack is not None and self.undo_stack.can_undo()
+        can_redo = self.undo_stack is not None and self.undo_stack.can_redo()
+        self.undo_action.setEnabled(can_undo)
+        self.redo_action.setEnabled(can_redo)
 
     @contextlib.contextmanager
     def undo_history_disabled(self):
@@ -488,14 +452,10 @@ class GenEditor(QMainWindow):
             extend(self.level_view.minimap.corner1)
             extend(self.level_view.minimap.corner2)
 
-        if self.level_view.collision is not None and self.level_view.collision.verts:
-            vertices = self.level_view.collision.verts
-            min_x = min(x for x, _y, _z in vertices)
-            min_y = min(y for _x, y, _z in vertices)
-            min_z = min(z for _x, _y, z in vertices)
-            max_y = max(y for _x, y, _z in vertices)
-            max_x = max(x for x, _y, _z in vertices)
-            max_z = max(z for _x, _y, z in vertices)
+        if self.level_view.collision is not None and self.level_view.collision.geometry.bounds is not None:
+            bounds_min, bounds_max = self.level_view.collision.geometry.bounds
+            min_x, min_y, min_z = bounds_min.tolist()
+            max_x, max_y, max_z = bounds_max.tolist()
 
             if extent:
                 extent[0] = min(extent[0], min_x)
@@ -700,6 +660,10 @@ class GenEditor(QMainWindow):
         cull_faces_action.setCheckable(True)
         cull_faces_action.setChecked(self.editorconfig.get("cull_faces") == "True")
         cull_faces_action.triggered.connect(self.on_cull_faces_triggered)
+        ground_when_moving_action = self.collision_menu.addAction("Ground Objects While Moving")
+        ground_when_moving_action.setCheckable(True)
+        ground_when_moving_action.setChecked(self.editorconfig.get("ground_when_moving") == "True")
+        ground_when_moving_action.triggered.connect(self.on_ground_when_moving_triggered)
         self.collision_menu.addSeparator()
         self.choose_default_collision = QMenu("Choose Autoloaded Geometry", self)
         self.collision_menu.addMenu(self.choose_default_collision)
@@ -1100,7 +1064,7 @@ class GenEditor(QMainWindow):
             self.collision_area_dialog = None
 
         collision_model = self.level_view.alternative_mesh
-        colltypes = tuple(sorted(collision_model.meshes))
+        colltypes = tuple(collision_model.collision_types)
 
         colltypegroups = {}
         for colltype in colltypes:
@@ -1333,6 +1297,12 @@ class GenEditor(QMainWindow):
         self.level_view.cull_faces = bool(checked)
         self.level_view.do_redraw()
 
+    def on_ground_when_moving_triggered(self, checked):
+        self.editorconfig["ground_when_moving"] = "True" if checked else "False"
+        save_cfg(self.configuration)
+
+        self.ground_snapper.clear()
+
     def on_default_geometry_changed(self, default_filetype):
         self.editorconfig["addi_file_on_load"] = default_filetype
         save_cfg(self.configuration)
@@ -1431,6 +1401,7 @@ class GenEditor(QMainWindow):
         self.leveldatatreeview.split_checkpoint.connect(self.split_group_checkpoint)
 
     def split_group_checkpoint(self, group_item, item):
+        self.undo_stack.mark_all_changed()
         group = group_item.bound_to
         point = item.bound_to
 
@@ -1457,6 +1428,7 @@ class GenEditor(QMainWindow):
         self.set_has_unsaved_changes(True)
 
     def split_group(self, group_item, item):
+        self.undo_stack.mark_all_changed()
         group = group_item.bound_to
         point = item.bound_to
 
@@ -1481,6 +1453,7 @@ class GenEditor(QMainWindow):
         self.set_has_unsaved_changes(True)
 
     def duplicate_group(self, item):
+        self.undo_stack.mark_all_changed()
         group = item.bound_to
         if isinstance(group, libbol.EnemyPointGroup):
             new_id = len(self.level_file.enemypointgroups.groups)
@@ -1492,6 +1465,7 @@ class GenEditor(QMainWindow):
             self.set_has_unsaved_changes(True)
 
     def reverse_all_of_group(self, item):
+        self.undo_stack.mark_all_changed()
         group = item.bound_to
         if isinstance(group, libbol.CheckpointGroup):
             group.points.reverse()
@@ -1587,9 +1561,9 @@ class GenEditor(QMainWindow):
             if chosentype == "Archived files (*.arc)" or filepath.endswith(".arc"):
                 with open(filepath, "rb") as f:
                     try:
-                        self.loaded_archive = Archive.from_file(f)
+                        self.loaded_archive = Archive.from_file(f, lazy=True)
                         root_name = self.loaded_archive.root.name
-                        coursename = find_file(self.loaded_archive.root, "_course.bol")
+                        coursename = find_file(self.loaded_archive, "_course.bol")
                         bol_file = self.loaded_archive[root_name + "/" + coursename]
                         bol_data = BOL.from_file(bol_file)
                         self.setup_bol_file(bol_data, filepath)
@@ -1605,12 +1579,12 @@ class GenEditor(QMainWindow):
                         self.loaded_archive_file = None
                         return
 
-                bmdfile = get_file_safe(self.loaded_archive.root, "_course.bmd")
-                collisionfile = get_file_safe(self.loaded_archive.root, "_course.bco")
+                bmdfile = get_file_safe(self.loaded_archive, "_course.bmd")
+                collisionfile = get_file_safe(self.loaded_archive, "_course.bco")
 
                 if self.editorconfig["addi_file_on_load"] == "Choose":
                     try:
-                        collisionfile = get_file_safe(self.loaded_archive.root, "_course.bco")
+                        collisionfile = get_file_safe(self.loaded_archive, "_course.bco")
                         if collisionfile is not None:
                             self.load_collision_from_arc(collisionfile, filepath)
                     except Exception as error:
@@ -1687,19 +1661,7 @@ class GenEditor(QMainWindow):
             self.update_3d()
 
     def load_collision_from_arc(self, collisionfile, arcfilepath):
-        bco_coll = RacetrackCollision()
-        verts = []
-        faces = []
-
-        bco_coll.load_file(collisionfile)
-
-        for vert in bco_coll.vertices:
-            verts.append(vert)
-
-        for v1, v2, v3, collision_type, rest in bco_coll.triangles:
-            faces.append(((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type))
-        model = CollisionModel(bco_coll)
-        self.setup_collision(verts, faces, arcfilepath, alternative_mesh=model)
+        self.load_bco_collision(collisionfile.getvalue(), arcfilepath)
 
 
 
@@ -1719,28 +1681,10 @@ class GenEditor(QMainWindow):
             self.load_optional_bco(collisionfile)
 
     def load_optional_bmd(self, bmdfile):
-        alternative_mesh = load_textured_bmd(bmdfile)
-        with open("lib/temp/temp.obj", "r") as f:
-            verts, faces, normals = py_obj.read_obj(f)
-
-        self.setup_collision(verts, faces, bmdfile, alternative_mesh)
+        self.load_bmd_collision(bmdfile, bmdfile)
 
     def load_optional_bco(self, collisionfile):
-        bco_coll = RacetrackCollision()
-        verts = []
-        faces = []
-
-        with open(collisionfile, "rb") as f:
-            bco_coll.load_file(f)
-        self.bco_coll = bco_coll
-
-        for vert in bco_coll.vertices:
-            verts.append(vert)
-
-        for v1, v2, v3, collision_type, rest in bco_coll.triangles:
-            faces.append(((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type))
-        model = CollisionModel(bco_coll)
-        self.setup_collision(verts, faces, collisionfile, alternative_mesh=model)
+        self.load_bco_collision(collisionfile, collisionfile)
 
     def load_optional_3d_file_arc(self, additional_files, bmdfile, collisionfile, arcfilepath):
         choice, pos = FileSelect.open_file_list(self, additional_files,
@@ -1758,31 +1702,10 @@ class GenEditor(QMainWindow):
             self.load_bco_from_arc(collisionfile, arcfilepath)
 
     def load_bmd_from_arc(self, bmdfile, arcfilepath):
-        with open("lib/temp/temp.bmd", "wb") as f:
-            f.write(bmdfile.getvalue())
-
-        bmdpath = "lib/temp/temp.bmd"
-        alternative_mesh = load_textured_bmd(bmdpath)
-        with open("lib/temp/temp.obj", "r") as f:
-            verts, faces, normals = py_obj.read_obj(f)
-
-        self.setup_collision(verts, faces, arcfilepath, alternative_mesh)
+        self.load_bmd_collision("lib/temp/temp.bmd", arcfilepath, bmdfile.getvalue())
 
     def load_bco_from_arc(self, collisionfile, arcfilepath):
-        bco_coll = RacetrackCollision()
-        verts = []
-        faces = []
-
-        bco_coll.load_file(collisionfile)
-        self.bco_coll = bco_coll
-
-        for vert in bco_coll.vertices:
-            verts.append(vert)
-
-        for v1, v2, v3, collision_type, rest in bco_coll.triangles:
-            faces.append(((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type))
-        model = CollisionModel(bco_coll)
-        self.setup_collision(verts, faces, arcfilepath, alternative_mesh=model)
+        self.load_bco_collision(collisionfile.getvalue(), arcfilepath)
 
     def load_file(self, filepath, additional=None):
         if filepath.endswith('.bol'):
@@ -1808,41 +1731,23 @@ class GenEditor(QMainWindow):
             if not os.path.isfile(bmdfile):
                 return
 
-            alternative_mesh = load_textured_bmd(bmdfile)
-            with open("lib/temp/temp.obj", "r") as f:
-                verts, faces, normals = py_obj.read_obj(f)
-
-            self.setup_collision(verts, faces, bmdfile, alternative_mesh)
+            self.load_bmd_collision(bmdfile, bmdfile)
 
         elif additional == 'collision':
             collisionfile = filepath[:-len('.bol')] + ".bco"
             if not os.path.isfile(collisionfile):
                 return
 
-            bco_coll = RacetrackCollision()
-            with open(collisionfile, "rb") as f:
-                bco_coll.load_file(f)
-            self.bco_coll = bco_coll
-
-            verts = []
-            for vert in bco_coll.vertices:
-                verts.append(vert)
-
-            faces = []
-            for v1, v2, v3, collision_type, rest in bco_coll.triangles:
-                faces.append(((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type))
-
-            model = CollisionModel(bco_coll)
-            self.setup_collision(verts, faces, collisionfile, alternative_mesh=model)
+            self.load_bco_collision(collisionfile, collisionfile)
 
         QtCore.QTimer.singleShot(0, self.update_3d)
 
     def load_arc_file(self, filepath, additional=None):
         with open(filepath, "rb") as f:
             try:
-                self.loaded_archive = Archive.from_file(f)
+                self.loaded_archive = Archive.from_file(f, lazy=True)
                 root_name = self.loaded_archive.root.name
-                coursename = find_file(self.loaded_archive.root, "_course.bol")
+                coursename = find_file(self.loaded_archive, "_course.bol")
                 bol_file = self.loaded_archive[root_name + "/" + coursename]
                 bol_data = BOL.from_file(bol_file)
                 self.setup_bol_file(bol_data, filepath)
@@ -1857,39 +1762,18 @@ class GenEditor(QMainWindow):
         self.clear_collision()
 
         if additional == 'model':
-            bmdfile = get_file_safe(self.loaded_archive.root, "_course.bmd")
+            bmdfile = get_file_safe(self.loaded_archive, "_course.bmd")
             if bmdfile is None:
                 return
 
-            bmdpath = "lib/temp/temp.bmd"
-            with open(bmdpath, "wb") as f:
-                f.write(bmdfile.getvalue())
-
-            alternative_mesh = load_textured_bmd(bmdpath)
-            with open("lib/temp/temp.obj", "r") as f:
-                verts, faces, normals = py_obj.read_obj(f)
-
-            self.setup_collision(verts, faces, filepath, alternative_mesh)
+            self.load_bmd_collision("lib/temp/temp.bmd", filepath, bmdfile.getvalue())
 
         elif additional == 'collision':
-            collisionfile = get_file_safe(self.loaded_archive.root, "_course.bco")
+            collisionfile = get_file_safe(self.loaded_archive, "_course.bco")
             if collisionfile is None:
                 return
 
-            bco_coll = RacetrackCollision()
-            bco_coll.load_file(collisionfile)
-            self.bco_coll = bco_coll
-
-            verts = []
-            for vert in bco_coll.vertices:
-                verts.append(vert)
-
-            faces = []
-            for v1, v2, v3, collision_type, rest in bco_coll.triangles:
-                faces.append(((v1 + 1, None), (v2 + 1, None), (v3 + 1, None), collision_type))
-
-            model = CollisionModel(bco_coll)
-            self.setup_collision(verts, faces, filepath, alternative_mesh=model)
+            self.load_bco_collision(collisionfile.getvalue(), filepath)
 
         QtCore.QTimer.singleShot(0, self.update_3d)
 
@@ -1898,6 +1782,7 @@ class GenEditor(QMainWindow):
         self.level_view.level_file = self.level_file
         # self.pikmin_gen_view.update()
         self.level_view.do_redraw()
+        self.undo_stack.mark_all_changed()
         self.on_document_potentially_changed(update_unsaved_changes=False)
 
         self.on_document_potentially_changed(update_unsaved_changes=False)
@@ -1921,6 +1806,7 @@ class GenEditor(QMainWindow):
                 file.seek(0)
 
                 self.level_file.write(file)
+                file.truncate()
 
                 with open(self.current_gen_path, "wb") as f:
                     self.loaded_archive.write_arc(f)
@@ -1959,14 +1845,15 @@ class GenEditor(QMainWindow):
             if choosentype == "Archived files (*.arc)" or filepath.endswith(".arc"):
                 if self.loaded_archive is None or self.loaded_archive_file is None:
                     with open(filepath, "rb") as f:
-                        self.loaded_archive = Archive.from_file(f)
+                        self.loaded_archive = Archive.from_file(f, lazy=True)
 
-                self.loaded_archive_file = find_file(self.loaded_archive.root, "_course.bol")
+                self.loaded_archive_file = find_file(self.loaded_archive, "_course.bol")
                 root_name = self.loaded_archive.root.name
                 file = self.loaded_archive[root_name + "/" + self.loaded_archive_file]
                 file.seek(0)
 
                 self.level_file.write(file)
+                file.truncate()
 
                 with open(filepath, "wb") as f:
                     self.loaded_archive.write_arc(f)
@@ -1998,12 +1885,7 @@ class GenEditor(QMainWindow):
             if not filepath:
                 return
 
-            with open(filepath, "r") as f:
-                verts, faces, normals = py_obj.read_obj(f)
-            alternative_mesh = TexturedModel.from_obj_path(filepath, rotate=True)
-
-
-            self.setup_collision(verts, faces, filepath, alternative_mesh)
+            self.load_obj_collision(filepath, filepath)
 
         except Exception as e:
             traceback.print_exc()
@@ -2021,27 +1903,13 @@ class GenEditor(QMainWindow):
 
             if not filepath:
                 return
-            bmdpath = filepath
-            clear_temp_folder()
-            if choosentype == "Archived files (*.arc)" or filepath.endswith(".arc"):
-                with open(filepath, "rb") as f:
-                    rarc = Archive.from_file(f)
-
-                root_name = rarc.root.name
-                bmd_filename = find_file(rarc.root, "_course.bmd")
-                bmd = rarc[root_name][bmd_filename]
-                with open("lib/temp/temp.bmd", "wb") as f:
-                    f.write(bmd.getvalue())
-
-                bmdpath = "lib/temp/temp.bmd"
-
             self.clear_collision()
 
-            alternative_mesh = load_textured_bmd(bmdpath)
-            with open("lib/temp/temp.obj", "r") as f:
-                verts, faces, normals = py_obj.read_obj(f)
-
-            self.setup_collision(verts, faces, filepath, alternative_mesh)
+            if choosentype == "Archived files (*.arc)" or filepath.endswith(".arc"):
+                self.load_bmd_collision("lib/temp/temp.bmd", filepath,
+                                        lambda: collision_loader.read_archive_file(filepath, "_course.bmd"))
+            else:
+                self.load_bmd_collision(filepath, filepath)
 
         except Exception as e:
             traceback.print_exc()
@@ -2057,32 +1925,11 @@ class GenEditor(QMainWindow):
                 self.pathsconfig["collision"],
                 "MKDD Collision (*.bco);;Archived files (*.arc);;All files (*)")
             if filepath:
-                bco_coll = RacetrackCollision()
-                verts = []
-                faces = []
-
                 if choosentype == "Archived files (*.arc)" or filepath.endswith(".arc"):
-                    with open(filepath, "rb") as f:
-                        rarc = Archive.from_file(f)
-
-
-                    root_name = rarc.root.name
-                    collision_file = find_file(rarc.root, "_course.bco")
-                    bco = rarc[root_name][collision_file]
-                    bco_coll.load_file(bco)
-                    self.bco_coll = bco_coll
+                    self.load_bco_collision(lambda: collision_loader.read_archive_file(filepath, "_course.bco"),
+                                            filepath)
                 else:
-                    with open(filepath, "rb") as f:
-                        bco_coll.load_file(f)
-                    self.bco_coll = bco_coll
-
-                for vert in bco_coll.vertices:
-                    verts.append(vert)
-
-                for v1, v2, v3, collision_type, rest in bco_coll.triangles:
-                    faces.append(((v1+1, None), (v2+1, None), (v3+1, None), collision_type))
-                model = CollisionModel(bco_coll)
-                self.setup_collision(verts, faces, filepath, alternative_mesh=model)
+                    self.load_bco_collision(filepath, filepath)
 
         except Exception as e:
             traceback.print_exc()
@@ -2092,15 +1939,96 @@ class GenEditor(QMainWindow):
             self.update_3d()
 
     def clear_collision(self):
+        # Collision that is still being loaded is dropped as well
+        self.collision_load_generation += 1
         self.bco_coll = None
+        self.bco_geometry = None
         self.level_view.clear_collision()
 
         # Synchronously force a draw operation to provide immediate feedback.
         self.level_view.update()
         QApplication.instance().processEvents()
 
-    def setup_collision(self, verts, faces, filepath, alternative_mesh=None):
-        self.level_view.set_collision(verts, faces, alternative_mesh)
+    def start_collision_load(self, filepath, job, finish):
+        # job runs on the loader thread and is given a progress callback. finish is then called on the GUI
+        # thread with the result of job, sets the collision up and returns the LoadTimes of the load.
+        self.collision_load_generation += 1
+        generation = self.collision_load_generation
+        name = os.path.basename(filepath)
+
+        def progress(stage):
+            self.collision_load_progress.emit(generation, "Loading collision from {0}: {1}...".format(name, stage))
+
+        future = self.collision_loader.submit(job, progress)
+        future.add_done_callback(
+            lambda future: self.collision_load_finished.emit(generation, (name, future, finish)))
+
+    def on_collision_load_progress(self, generation, message):
+        if generation == self.collision_load_generation:
+            self.statusbar.showMessage(message)
+
+    def on_collision_load_finished(self, generation, load):
+        if generation != self.collision_load_generation:
+            return
+
+        name, future, finish = load
+        try:
+            result = future.result()
+            self.statusbar.showMessage("Loading collision from {0}: uploading...".format(name))
+            start = default_timer()
+            times = finish(result)
+            times.add("upload", default_timer() - start)
+        except Exception as error:
+            print("Error appeared while loading:", error)
+            traceback.print_exc()
+            self.statusbar.clearMessage()
+            open_error_dialog(str(error), self)
+            return
+
+        print("Loaded collision from {0} in {1:.3f}s: {2}".format(name, times.total(), times))
+        self.statusbar.showMessage("Loaded collision from {0} in {1:.2f}s".format(name, times.total()), 5000)
+        self.update_3d()
+
+    def load_bco_collision(self, source, filepath):
+        # source is given like collision_loader.read_source takes it
+        cache = self.collision_cache
+
+        def finish(result):
+            bco_coll, collision, times = result
+            self.bco_coll = bco_coll
+            # Collision queries, the collision model and the minimap generator share one geometry
+            self.bco_geometry = collision.geometry
+            self.setup_collision_object(collision, filepath, CollisionModel(collision.geometry))
+            return times
+
+        self.start_collision_load(
+            filepath, lambda progress: collision_loader.load_bco_collision(source, cache, progress), finish)
+
+    def load_bmd_collision(self, bmdpath, filepath, source=None):
+        # With source given like collision_loader.read_source takes it, the model is written to bmdpath first
+        cache = self.collision_cache
+
+        def finish(result):
+            collision, alternative_mesh, times = result
+            self.setup_collision_object(collision, filepath, alternative_mesh)
+            return times
+
+        self.start_collision_load(
+            filepath, lambda progress: collision_loader.load_bmd_collision(bmdpath, cache, progress, source), finish)
+
+    def load_obj_collision(self, objpath, filepath):
+        cache = self.collision_cache
+
+        def finish(result):
+            collision, alternative_mesh, times = result
+            self.setup_collision_object(collision, filepath, alternative_mesh)
+            return times
+
+        self.start_collision_load(
+            filepath, lambda progress: collision_loader.load_obj_collision(objpath, cache, progress), finish)
+
+    def setup_collision_object(self, collision, filepath, alternative_mesh=None):
+        self.level_view.set_collision(collision, alternative_mesh)
         self.pathsconfig["collision"] = filepath
         editor_config = self.configuration["editor"]
         alternative_mesh.hidden_collision_types = \
@@ -2230,6 +2158,7 @@ class GenEditor(QMainWindow):
     #this is the function that the new side buttons calls
     @catch_exception
     def button_add_from_addi_options(self, option, obj = None):
+        self.undo_stack.mark_all_changed()
         self.points_added = 0
         copy_current_obj = None
         self.pik_control.button_add_object.setChecked(False)
@@ -2518,6 +2447,7 @@ class GenEditor(QMainWindow):
 
     @catch_exception
     def button_add_from_addi_options_multi(self, option, objs = None):
+        self.undo_stack.mark_all_changed()
         if option == -1 or option == -1.5:
             sum_x = 0
             count_x = 0
@@ -2559,8 +2489,7 @@ class GenEditor(QMainWindow):
             return added_item_boxes
         if option == 0.5:
             to_ground = self.button_add_from_addi_options_multi(0, objs)
-            for obj in to_ground:
-                self.action_ground_spec_object(obj)
+            self.action_ground_spec_objects(to_ground)
             return
         if option == 1: #currently unused
             for obj in objs:
@@ -2665,6 +2594,7 @@ class GenEditor(QMainWindow):
 
     @catch_exception
     def action_add_object_3d(self, x, y, z):
+        self.undo_stack.mark_all_changed()
         object, group, position = self.object_to_be_added
         if position is not None and position < 0:
             position = 99999999 # this forces insertion at the end of the list
@@ -2804,6 +2734,7 @@ class GenEditor(QMainWindow):
 
     @catch_exception
     def action_add_objects_3d(self, x, y, z):
+        self.undo_stack.mark_all_changed()
 
         #areas should be grounded and place at the position
         #cameras should be +3000 on x, +3000 on y
@@ -2887,14 +2818,13 @@ class GenEditor(QMainWindow):
                     self.level_file.cameraroutes[object.route].used_by.append(object)
                     for point in self.level_file.cameraroutes[object.route].points:
                         point.position = point.position + object.position
-                        self.action_ground_spec_object(point)
+                    self.action_ground_spec_objects(self.level_file.cameraroutes[object.route].points)
             if isinstance(object, libbol.Area):
                 object.camera_index = len(self.level_file.cameras) - 1
                 self.level_file.cameras[-1].used_by.append(object)
             if isinstance(object, Route):
 
-                for point in object.points:
-                    self.action_ground_spec_object(point)
+                self.action_ground_spec_objects(object.points)
             if isinstance(object, libbol.MapObject):
 
                 object.route = len(self.level_file.routes) - 1
@@ -2905,7 +2835,7 @@ class GenEditor(QMainWindow):
 
                 for point in self.level_file.routes[object.route].points:
                     point.position = point.position + object.position
-                    self.action_ground_spec_object(point)
+                self.action_ground_spec_objects(self.level_file.routes[object.route].points)
 
 
 
@@ -2917,6 +2847,7 @@ class GenEditor(QMainWindow):
 
 
     def button_side_button_action(self, option, obj=None):
+        self.undo_stack.mark_all_changed()
         #stop adding new stuff
         self.pik_control.button_add_object.setChecked(False)
         self.level_view.set_mouse_mode(mkdd_widgets.MOUSE_MODE_NONE)
@@ -2957,30 +2888,20 @@ class GenEditor(QMainWindow):
 
     @catch_exception
     def action_move_objects(self, deltax, deltay, deltaz):
-        for i in range(len(self.level_view.selected_positions)):
-            for j in range(len(self.level_view.selected_positions)):
-                pos = self.level_view.selected_positions
-                if i != j and pos[i] == pos[j]:
-                    print("What the fuck")
-        for pos in self.level_view.selected_positions:
-            """obj.x += deltax
-            obj.z += deltaz
-            obj.x = round(obj.x, 6)
-            obj.z = round(obj.z, 6)
-            obj.position_x = obj.x
-            obj.position_z = obj.z
-            obj.offset_x = 0
-            obj.offset_z = 0
-
-            if self.editorconfig.getboolean("GroundObjectsWhenMoving") is True:
-                if self.pikmin_gen_view.collision is not None:
-                    y = self.pikmin_gen_view.collision.collide_ray_downwards(obj.x, obj.z)
-                    obj.y = obj.position_y = round(y, 6)
-                    obj.offset_y = 0"""
+        self.undo_stack.mark_changed(*self.level_view.selected)
+        positions = self.level_view.selected_positions
+        for pos in positions:
             pos.x += deltax
             pos.y += deltay
             pos.z += deltaz
 
+        # Moving only up or down is left alone, that is how objects are lifted off the ground
+        if ((deltax != 0 or deltaz != 0) and self.editorconfig.get("ground_when_moving") == "True"
+                and self.level_view.collision is not None):
+            self.ground_snapper.move(positions)
+            self.ground_snap_objects = list(self.level_view.selected)
+            self.step_ground_snap()
+
         self.level_view.gizmo.move_to_average(self.level_view.selected_positions)
 
 
@@ -3077,6 +2998,7 @@ class GenEditor(QMainWindow):
         self.level_view.change_height_is_pressed = False
 
     def action_rotate_object(self, deltarotation):
+        self.undo_stack.mark_changed(*self.level_view.selected)
         #obj.set_rotation((None, round(angle, 6), None))
         for rot in self.level_view.selected_rotations:
             if deltarotation.x != 0:
@@ -3111,31 +3033,65 @@ class GenEditor(QMainWindow):
         self.set_has_unsaved_changes(True)
         self.pik_control.update_info()
 
-    def action_ground_objects(self):
-        for pos in self.level_view.selected_positions:
-            if self.level_view.collision is None:
-                return None
-            height = self.level_view.collision.collide_ray_closest(pos.x, pos.z, pos.y)
+    def step_ground_snap(self):
+        collision = self.level_view.collision
+        if collision is None:
+            self.ground_snapper.clear()
+            return
+
+        grounded, seconds = self.ground_snapper.step(collision)
+        self.statusbar.showMessage("Grounded {0} of {1} moved positions in {2:.2f} ms".format(
+            grounded, len(self.ground_snapper.positions), seconds * 1000), 2000)
+
+        # The positions that didn't fit into the budget are grounded once the pending events are handled
+        if self.ground_snapper.pending > 0 and not self.ground_snap_scheduled:
+            self.ground_snap_scheduled = True
+            QtCore.QTimer.singleShot(0, self.continue_ground_snap)
+
+    def continue_ground_snap(self):
+        self.ground_snap_scheduled = False
+        if self.ground_snapper.pending == 0:
+            return
+
+        self.undo_stack.mark_changed(*self.ground_snap_objects)
+        self.step_ground_snap()
+        self.level_view.gizmo.move_to_average(self.level_view.selected_positions)
+        self.level_view.do_redraw()
+        self.pik_control.update_info()
 
-            if height is not None:
+    def ground_positions(self, positions):
+        # Moves all positions onto the collision closest to their current height in one batch query
+        positions = list(positions)
+        if self.level_view.collision is None or not positions:
+            return
+
+        heights = self.level_view.collision.collide_rays_closest_many(
+            [pos.x for pos in positions], [pos.y for pos in positions], [pos.z for pos in positions])
+
+        for pos, height in zip(positions, heights.tolist()):
+            if not isnan(height):
                 pos.y = height
 
+    def action_ground_objects(self):
+        if self.level_view.collision is None:
+            return None
+        self.undo_stack.mark_changed(*self.level_view.selected)
+        self.ground_positions(self.level_view.selected_positions)
+
         self.pik_control.update_info()
         self.level_view.gizmo.move_to_average(self.level_view.selected_positions)
         self.set_has_unsaved_changes(True)
         self.level_view.do_redraw()
 
     def action_ground_spec_object(self, obj):
+        self.action_ground_spec_objects([obj])
 
-        if self.level_view.collision is None:
-            return None
-        pos = obj.position
-        height = self.level_view.collision.collide_ray_closest(pos.x, pos.z, pos.y)
-
-        if height is not None:
-            pos.y = height
+    def action_ground_spec_objects(self, objs):
+        self.undo_stack.mark_changed(*objs)
+        self.ground_positions(obj.position for obj in objs)
 
     def action_delete_objects(self):
+        self.undo_stack.mark_all_changed()
         tobedeleted = []
         for obj in self.level_view.selected:
             if isinstance(obj, libbol.EnemyPoint):
@@ -3289,6 +3245,7 @@ class GenEditor(QMainWindow):
         QtWidgets.QApplication.instance().clipboard().setMimeData(mimedata)
 
     def on_paste_action_triggered(self):
+        self.undo_stack.mark_all_changed()
         mimedata = QtWidgets.QApplication.instance().clipboard().mimeData()
         data = bytes(mimedata.data("application/mkdd-track-editor"))
         if not data:
@@ -3645,6 +3602,7 @@ class GenEditor(QMainWindow):
 
 
     def auto_qol(self):
+        self.undo_stack.mark_all_changed()
         self.level_file.auto_qol_all()
         self.leveldatatreeview.set_objects(self.level_file)
         self.leveldatatreeview.bound_to_group(self.level_file)
@@ -3655,18 +3613,18 @@ class GenEditor(QMainWindow):
 
 
 
-def find_file(rarc_folder, ending):
-    for filename in rarc_folder.files.keys():
-        if filename.endswith(ending):
-            return filename
-    raise RuntimeError("No Course File found!")
+def find_file(rarc, ending):
+    path = rarc.find_path(ending, rarc.root.name)
+    if path is None:
+        raise RuntimeError("No Course File found!")
+    return path.rsplit("/", 1)[-1]
 
 
-def get_file_safe(rarc_folder, ending):
-    for filename in rarc_folder.files.keys():
-        if filename.endswith(ending):
-            return rarc_folder.files[filename]
-    return None
+def get_file_safe(rarc, ending):
+    path = rarc.find_path(ending, rarc.root.name)
+    if path is None:
+        return None
+    return rarc[path]
 
 
 import sys
@@ -3727,6 +3685,9 @@ if __name__ == "__main__":
     parser.add_argument("--additional", default=None, choices=['model', 'collision'],
                         help="Whether to also load the additional BMD file (3D model) or BCO file "
                         "(collision file).")
+    parser.add_argument("--frame-stats", action="store_true",
+                        help="Print the time taken by each frame of the level view and how many things were "
+                        "drawn and culled.")
 
     args = parser.parse_args()
 
@@ -3784,6 +3745,7 @@ if __name__ == "__main__":
         print("Python version: ", sys.version)
         editor_gui = GenEditor()
         editor_gui.setWindowIcon(QtGui.QIcon('resources/icon.ico'))
+        editor_gui.level_view.show_frame_stats = args.frame_stats
 
         app.document_potentially_changed.connect(
             editor_gui.on_document_potentially_changed)
@@ -1,4 +1,3 @@
-import random
 import traceback
 import os
 from time import sleep
@@ -23,18 +22,34 @@ from PyQt5.QtCore import Qt
 
 from helper_functions import calc_zoom_in_factor, calc_zoom_out_factor
 from lib.libgen import GeneratorObject
-from lib.collision import Collision
 from widgets.editor_widgets import catch_exception, catch_exception_with_dialog
 from opengltext import draw_collision
 from lib.vectors import Matrix4x4, Vector3, Line, Plane, Triangle
 from lib.model_rendering import TexturedPlane, Model, Grid, GenericObject, Material, Minimap
 from gizmo import Gizmo
 from lib.object_models import ObjectModels
+from lib.culling import Frustum, GroupBounds, CullStats
+from lib.line_geometry import (GeometryCache, route_lines, checkpoint_lines, enemy_group_links,
+                               segment_between)
+from lib.model_rendering import LineBatch
 from editor_controls import UserControl
 from lib.libpath import Paths
 from lib.libbol import BOL
 import numpy
 
+# Added to the bounds of routes and point groups so that their markers, arrow heads and the cylinders of
+# enemy points are inside them
+GROUP_BOUNDS_PADDING = 1000.0
+
+
+def route_point_positions(point):
+    return (point.position, )
+
+
+def checkpoint_positions(checkpoint):
+    return (checkpoint.start, checkpoint.end)
+
+
 ObjectSelectionEntry = namedtuple("ObjectSelectionEntry", ["obj", "pos1", "pos2", "pos3", "rotation"])
 
 MOUSE_MODE_NONE = 0
@@ -242,6 +257,16 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
         self.models = ObjectModels()
         self.grid = Grid(100000, 100000, 10000)
 
+        # Things out of view are not drawn. The bounds of routes and point groups and the lines between their
+        # points are kept until the document might have changed, see invalidate_group_caches.
+        self.frustum = None
+        self.group_bounds = GroupBounds(GROUP_BOUNDS_PADDING)
+        self.line_geometry = GeometryCache()
+        self.lines = LineBatch()
+        self.wide_lines = LineBatch()
+        self.cull_stats = CullStats()
+        self.show_frame_stats = False
+
         self.modelviewmatrix = None
         self.projectionmatrix = None
 
@@ -520,8 +545,8 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
             glDeleteLists(self.main_model, 1)
             self.main_model = None
 
-    def set_collision(self, verts, faces, alternative_mesh):
-        self.collision = Collision(verts, faces)
+    def set_collision(self, collision, alternative_mesh):
+        self.collision = collision
 
         if self.main_model is None:
             self.main_model = glGenLists(1)
@@ -530,7 +555,7 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
 
         glNewList(self.main_model, GL_COMPILE)
         #glBegin(GL_TRIANGLES)
-        draw_collision(verts, faces)
+        draw_collision(collision.geometry)
         #glEnd()
         glEndList()
 
@@ -586,6 +611,38 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
 
         return result
 
+    def invalidate_group_caches(self):
+        self.group_bounds.clear()
+        self.line_geometry.clear()
+
+    def group_visible(self, group, members, position_of, selected_position_ids):
+        # Groups with selected positions are always drawn, the cached bounds don't follow them while they are
+        # being moved
+        bounds = self.group_bounds.get(group, members, position_of)
+        visible = (bounds is None or self.frustum.box_visible(*bounds)
+                   or any(id(position) in selected_position_ids
+                          for member in members for position in position_of(member)))
+        self.cull_stats.count("groups", visible)
+        return visible
+
+    def group_lines(self, group, position_of, build, selected_position_ids):
+        # The lines between the points of the group, built again every frame while some of them are selected
+        # as they might be moving
+        if any(id(position) in selected_position_ids
+               for member in group.points for position in position_of(member)):
+            return build(group.points)
+        return self.line_geometry.get(group, lambda: build(group.points))
+
+    def draw_lines(self, arrow_color=(0.0, 0.0, 0.0)):
+        self.lines.render()
+        self.wide_lines.render(3.0)
+        self.models.arrow_heads.render(arrow_color)
+
+    def entity_visible(self, position, radius):
+        visible = self.frustum.position_visible(position, radius)
+        self.cull_stats.count("areas", visible)
+        return visible
+
     #@catch_exception_with_dialog
     #@catch_exception
     def paintGL(self):
@@ -640,6 +697,8 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
         self.modelviewmatrix = numpy.transpose(numpy.reshape(glGetFloatv(GL_MODELVIEW_MATRIX), (4,4)))
         self.projectionmatrix = numpy.transpose(numpy.reshape(glGetFloatv(GL_PROJECTION_MATRIX), (4,4)))
         self.mvp_mat = numpy.dot(self.projectionmatrix, self.modelviewmatrix)
+        self.frustum = Frustum(self.mvp_mat)
+        self.cull_stats.reset()
         self.modelviewmatrix_inv = numpy.linalg.inv(self.modelviewmatrix)
 
         campos = Vector3(self.offset_x, self.camera_height, -self.offset_z)
@@ -860,6 +919,7 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                                                     pos3=None,
                                                     rotation=None))
                             self.models.render_generic_position_colored_id(obj.position, id + (offset + i) * 4 )
+                self.models.render_markers_coloredid(self.frustum)
                 for entry in objlist:
                     assert isinstance(entry, ObjectSelectionEntry)
                 len_objlist = len(objlist)
@@ -1024,6 +1084,7 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
             positions = self.selected_positions
 
             select_optimize = {x:True for x in selected}
+            selected_position_ids = {id(position) for position in positions}
             #objects = self.pikmin_generators.generators
 
             #for pikminobject in objects:
@@ -1039,38 +1100,25 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                         routes_to_highlight.add(obj.route)
 
                 for i, route in enumerate(self.level_file.routes):
+                    if not self.group_visible(route, route.points, route_point_positions, selected_position_ids):
+                        continue
                     selected = i in routes_to_highlight
-                    last_point = None
                     if route in self.selected:
                         selected = True
 
                     if route.used_by:
-                        for point in route.points:
-                            point_selected = point in select_optimize
-                            self.models.render_generic_position_colored(point.position, point_selected, "objectpoint")
-                            selected = selected or point_selected
-                            if last_point is not None:
-                                self.models.draw_arrow_head(last_point.position, point.position)
-                            last_point = point
-
+                        cubename = "objectpoint"
                     else:
-                        for point in route.points:
-                            point_selected = point in select_optimize
-                            self.models.render_generic_position_colored(point.position, point_selected, "unusedpoint")
-                            selected = selected or point_selected
-                            if last_point is not None:
-                                self.models.draw_arrow_head(last_point.position, point.position)
-                            last_point = point
-                    if selected:
-                        glLineWidth(3.0)
-                    glBegin(GL_LINE_STRIP)
-                    glColor3f(0.0, 0.0, 0.0)
+                        cubename = "unusedpoint"
                     for point in route.points:
-                        pos = point.position
-                        glVertex3f(pos.x, -pos.z, pos.y)
-                    glEnd()
-                    if selected:
-                        glLineWidth(1.0)
+                        point_selected = point in select_optimize
+                        self.models.render_generic_position_colored(point.position, point_selected, cubename)
+                        selected = selected or point_selected
+
+                    lines, arrows = self.group_lines(route, route_point_positions, route_lines, selected_position_ids)
+                    (self.wide_lines if selected else self.lines).add(lines, (0.0, 0.0, 0.0))
+                    self.models.arrow_heads.add(arrows)
+                self.draw_lines()
             if vismenu.cameraroutes.is_visible():
                 routes_to_highlight = set()
                 routes_to_circle = set()
@@ -1086,38 +1134,25 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                         routes_to_highlight.add(camera.route)
 
                 for i, route in enumerate(self.level_file.cameraroutes):
+                    if not self.group_visible(route, route.points, route_point_positions, selected_position_ids):
+                        continue
                     selected = i in routes_to_highlight
 
                     if route in self.selected:
                         selected = True
-                    last_point = None
                     if route.used_by:
-                        for point in route.points:
-                            point_selected = point in select_optimize
-                            self.models.render_generic_position_colored(point.position, point_selected, "camerapoint")
-                            selected = selected or point_selected
-                            if last_point is not None:
-                                self.models.draw_arrow_head(last_point.position, point.position)
-                            last_point = point
+                        cubename = "camerapoint"
                     else:
-                        for point in route.points:
-                            point_selected = point in select_optimize
-                            self.models.render_generic_position_colored(point.position, point_selected, "unusedpoint")
-                            selected = selected or point_selected
-                            if last_point is not None:
-                                self.models.draw_arrow_head(last_point.position, point.position)
-                            last_point = point
-
-                    if selected:
-                        glLineWidth(3.0)
-                    glBegin(GL_LINE_STRIP)
-                    glColor3f(0.0, 0.0, 0.0)
+                        cubename = "unusedpoint"
                     for point in route.points:
-                        pos = point.position
-                        glVertex3f(pos.x, -pos.z, pos.y)
-                    glEnd()
-                    if selected:
-                        glLineWidth(1.0)
+                        point_selected = point in select_optimize
+                        self.models.render_generic_position_colored(point.position, point_selected, cubename)
+                        selected = selected or point_selected
+
+                    lines, arrows = self.group_lines(route, route_point_positions, route_lines, selected_position_ids)
+                    (self.wide_lines if selected else self.lines).add(lines, (0.0, 0.0, 0.0))
+                    self.models.arrow_heads.add(arrows)
+                self.draw_lines()
             if vismenu.enemyroute.is_visible():
                 enemypoints_to_highlight = set()
                 for respawn_point in self.level_file.respawnpoints:
@@ -1128,12 +1163,16 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                         enemypoints_to_highlight.add(next_enemy_point)
 
                 point_index = 0
+                selected_groups = set()
                 for group in self.level_file.enemypointgroups.groups:
                     if len(group.points) == 0:
                         continue
 
                     group_selected = False
-                    for point in group.points:
+                    # The lines to the other groups are still drawn for groups out of view
+                    group_visible = self.group_visible(group, group.points, route_point_positions,
+                                                       selected_position_ids)
+                    for point in (group.points if group_visible else ()):
                         if point in select_optimize:
                             group_selected = True
                             glColor3f(0.3, 0.3, 0.3)
@@ -1169,50 +1208,33 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
 
                         point_index += 1
 
-                    # Draw the connections between each enemy point.
-                    if group_selected:
-                        glLineWidth(3.0)
-                    glBegin(GL_LINE_STRIP)
-                    glColor3f(0.0, 0.0, 0.0)
-                    for point in group.points:
-                        pos = point.position
-                        glVertex3f(pos.x, -pos.z, pos.y)
-                    glEnd()
+                    if not group_visible:
+                        point_index += len(group.points)
+                    else:
+                        # Draw the connections between each enemy point.
+                        lines, arrows = self.group_lines(group, route_point_positions, route_lines,
+                                                         selected_position_ids)
+                        (self.wide_lines if group_selected else self.lines).add(lines, (0.0, 0.0, 0.0))
                     if group_selected:
-                        glLineWidth(1.0)
-
-                    if len(group.points) > 0:
-
-                        # Draw the connections between each enemy point group.
-                        pointA = group.points[-1]
-                        color_gen = random.Random(group.id)
-                        color_components = [
-                            color_gen.random() * 0.5,
-                            color_gen.random() * 0.5,
-                            color_gen.random() * 0.2,
-                        ]
-                        color_gen.shuffle(color_components)
-                        color_components[2] += 0.5
-                        glColor3f(*color_components)
-                        for groupB in self.level_file.enemypointgroups.groups:
-                            if group is groupB or len(groupB.points) == 0:
-                                continue
-                            pointB = groupB.points[0]
-                            if pointA.link == pointB.link:
-                                groupB_selected = any(map(lambda p: p in select_optimize, groupB.points))
-                                if group_selected or groupB_selected:
-                                    glLineWidth(3.0)
-                                glBegin(GL_LINES)
-                                glVertex3f(pointA.position.x, -pointA.position.z, pointA.position.y)
-                                glVertex3f(pointB.position.x, -pointB.position.z, pointB.position.y)
-                                glEnd()
-                                if group_selected or groupB_selected:
-                                    glLineWidth(1.0)
+                        selected_groups.add(group)
+
+                # Draw the connections between each enemy point group.
+                groups = self.level_file.enemypointgroups.groups
+                links = self.line_geometry.get(self.level_file.enemypointgroups, lambda: enemy_group_links(groups))
+                for group, groupB, color, line in links:
+                    selected = group in selected_groups or groupB in selected_groups
+                    if selected:
+                        line = segment_between(group.points[-1].position, groupB.points[0].position)
+                    (self.wide_lines if selected else self.lines).add(line, color)
+                self.draw_lines()
             if vismenu.checkpoints.is_visible():
                 checkpoints_to_highlight = set()
                 count = 0
+                visible_checkpoint_lines = []
                 for i, group in enumerate(self.level_file.checkpoints.groups):
-                    prev = None
+                    if not self.group_visible(group, group.points, checkpoint_positions, selected_position_ids):
+                        count += len(group.points)
+                        continue
                     for checkpoint in group.points:
                         start_point_selected = checkpoint.start in positions
                         end_point_selected = checkpoint.end in positions
@@ -1223,32 +1245,11 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                             checkpoints_to_highlight.add(count)
                         count += 1
 
-                    glColor3f(*colors[i % 4])
-
-                    glBegin(GL_LINES)
-                    for checkpoint in group.points:
-                        pos1 = checkpoint.start
-                        pos2 = checkpoint.end
-
-                        #self.models.render_generic_position(pos1, False)
-                        #self.models.render_generic_position(pos2, False)
-
-                        glVertex3f(pos1.x, -pos1.z, pos1.y)
-                        glVertex3f(pos2.x, -pos2.z, pos2.y)
-                        #glColor3f(0.0, 0.0, 0.0)
-
-                        if prev is not None:
-                            pos3 = prev.start
-                            pos4 = prev.end
-
-                            glVertex3f(pos1.x, -pos1.z, pos1.y)
-                            glVertex3f(pos3.x, -pos3.z, pos3.y)
-                            glVertex3f(pos2.x, -pos2.z, pos2.y)
-                            glVertex3f(pos4.x, -pos4.z, pos4.y)
-
-                        prev = checkpoint
-
-                    glEnd()
+                    quads, mid_lines, arrows = self.group_lines(group, checkpoint_positions, checkpoint_lines,
+                                                                selected_position_ids)
+                    self.lines.add(quads, colors[i % 4])
+                    visible_checkpoint_lines.append((mid_lines, arrows))
+                self.draw_lines()
 
                 for respawn_point in self.level_file.respawnpoints:
                     if respawn_point not in select_optimize:
@@ -1260,61 +1261,22 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                     # Was that an oversight by the original maker?
 
                 if checkpoints_to_highlight:
-                    glLineWidth(4.0)
                     point_index = 0
                     for i, group in enumerate(self.level_file.checkpoints.groups):
-                        glColor3f(*colors[i % 4])
                         for checkpoint in group.points:
                             if point_index in checkpoints_to_highlight:
-                                pos1 = checkpoint.start
-                                pos2 = checkpoint.end
-                                glBegin(GL_LINES)
-                                glVertex3f(pos1.x, -pos1.z, pos1.y)
-                                glVertex3f(pos2.x, -pos2.z, pos2.y)
-                                glEnd()
+                                self.wide_lines.add(segment_between(checkpoint.start, checkpoint.end), colors[i % 4])
                             point_index += 1
-                    glLineWidth(1.0)
+                    self.wide_lines.render(4.0)
 
-            #glColor3f(1.0, 1.0, 1.0)
-            #glEnable(GL_TEXTURE_2D)
-            #glBindTexture(GL_TEXTURE_2D, self.arrow.tex)
-            glPushMatrix()
-            #lines = []
-            if vismenu.checkpoints.is_visible():
-                for group in self.level_file.checkpoints.groups:
-                    prev = None
-                    for checkpoint in group.points:
-                        if prev is None:
-                            prev = checkpoint
-                        else:
-                            #mid1 = prev.mid
-                            #mid2 = checkpoint.mid
-                            mid1 = (prev.start + prev.end) / 2.0
-                            mid2 = (checkpoint.start + checkpoint.end) / 2.0
-
-                            self.models.draw_arrow_head(mid1, mid2)
-                            #lines.append((mid1, mid2))
-                            prev = checkpoint
-            glPopMatrix()
-            glBegin(GL_LINES)
-            """for linestart, lineend in lines:
-                glVertex3f(linestart.x, -linestart.z, linestart.y)
-                glVertex3f(lineend.x, -lineend.z, lineend.y)"""
-            if vismenu.checkpoints.is_visible():
-                for group in self.level_file.checkpoints.groups:
-                    prev = None
-                    for checkpoint in group.points:
-                        if prev is None:
-                            prev = checkpoint
-                        else:
-                            mid1 = (prev.start+prev.end)/2.0
-                            mid2 = (checkpoint.start+checkpoint.end)/2.0
-                            #mid1 = prev.mid
-                            #mid2 = checkpoint.mid
-                            glVertex3f(mid1.x, -mid1.z, mid1.y)
-                            glVertex3f(mid2.x, -mid2.z, mid2.y)
-                            prev = checkpoint
-            glEnd()
+                # The lines and arrows between the middles of the checkpoints, in the color of the last group
+                # like when they were drawn one by one with the current color
+                if self.level_file.checkpoints.groups:
+                    color = colors[(len(self.level_file.checkpoints.groups) - 1) % 4]
+                    for mid_lines, arrows in visible_checkpoint_lines:
+                        self.lines.add(mid_lines, color)
+                        self.models.arrow_heads.add(arrows)
+                    self.draw_lines(color)
 
             if vismenu.objects.is_visible():
                 for object in self.level_file.objects.objects:
@@ -1331,6 +1293,9 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                     self.models.render_generic_position_rotation_colored("areas",
                                                                 object.position, object.rotation,
                                                                 object in select_optimize)
+                    # The marker is culled with the other markers, the wireframe by the area's extent
+                    if not self.entity_visible(object.position, (object.scale*100).norm()):
+                        continue
                     if object in select_optimize:
                         glColor4f(*colors_selection)
                     else:
@@ -1377,6 +1342,8 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
                                                             'minimap')
             #glDisable(GL_TEXTURE_2D)
 
+        self.models.render_markers(self.frustum, self.cull_stats)
+
         glColor3f(0.0, 0.0, 0.0)
         glDisable(GL_TEXTURE_2D)
         glColor4f(0.0, 1.0, 0.0, 1.0)
@@ -1444,6 +1411,8 @@ class BolMapViewer(QtWidgets.QOpenGLWidget):
         glFinish()
         now = default_timer() - start
         #print("Frame time:", now, 1/now, "fps")
+        if self.show_frame_stats:
+            print("Frame time: {0:.2f} ms, {1}".format(now * 1000, self.cull_stats))
 
     @catch_exception
     def mousePressEvent(self, event):
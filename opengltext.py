@@ -1,11 +1,13 @@
 from math import sqrt
+import numpy
 # PyQt4 imports
 from PyQt5 import QtGui, QtCore, QtOpenGL, QtWidgets
 #from PyQt5.QtOpenGL import QOpenGLWidget
 # PyOpenGL imports
 from OpenGL.GL import *
 import OpenGL.arrays.vbo as glvbo
-from lib.vectors import Vector3, Triangle
+from lib.vectors import Vector3
+from lib.collision import CollisionGeometry
 
 from widgets.editor_widgets import catch_exception
 
@@ -52,91 +54,38 @@ for coltrans in [
 
 DO_GRAYSCALE = False
 
-def draw_collision(verts, faces):
-    biggest, smallest = None, None
-    for x, y, z in verts:
-        if biggest is None:
-            biggest = smallest = y
-        if y > biggest:
-            biggest = y
-        if y < smallest:
-            smallest = y
+def draw_collision(geometry):
+    # geometry is a lib.collision.CollisionGeometry
+    if geometry.bounds is None:
+        return
+    smallest, biggest = geometry.bounds[0][1], geometry.bounds[1][1]
     scaleheight = biggest - smallest
     if scaleheight == 0:
         scaleheight = 1
 
-    print(len(COLORS))
-    lightvec = Vector3(0, 1, -1)
+    # Corners in the axis order of the view, x, -z, y
+    corners = geometry.corners[:, :, [0, 2, 1]] * numpy.array((1.0, -1.0, 1.0))
+    heights = geometry.corners[:, :, 1]
 
-    glBegin(GL_TRIANGLES)
+    if DO_GRAYSCALE:
+        grayscale = (heights.sum(axis=1) / 3.0 - smallest) / scaleheight
+        colors = numpy.repeat(grayscale, 9).reshape(-1, 3, 3)
+    else:
+        # Cosine between the light and the normal in the view's axis order, which is x, -z, y as well
+        lightvec = Vector3(0, 1, -1)
+        normals = geometry.normals
+        angles = (-normals[:, 2]*lightvec.y + normals[:, 1]*lightvec.z) / lightvec.norm()
+        light = numpy.maximum(numpy.abs(angles), 0.3)
+
+        indices = ((heights - smallest) / scaleheight * len(COLORS)).astype(numpy.int64)
+        numpy.clip(indices, 0, len(COLORS) - 1, out=indices)
+        colors = numpy.array(COLORS, dtype=numpy.float64)[indices] * light.reshape(-1, 1, 1) / 256.0
 
-    i = -1
-    
-    for face in faces:
-    
-    
-        v1, v2, v3 = face[0:3]
-        i += 1
-        v1x, v1y, v1z = verts[v1[0]-1]
-        v2x, v2y, v2z = verts[v2[0]-1]
-        v3x, v3y, v3z = verts[v3[0]-1]
-
-        # grayscale = ((v1y+v2y+v3y)/3.0)/scaleheight
-        """average_y = max(v1y, v2y,v3y) - smallest#(v1y+v2y+v3y)/3.0 - smallest
-        index = int((average_y/scaleheight)*len(COLORS))
-        if index < 0:
-            index = 0
-        if index >= len(COLORS):
-            index = len(COLORS)-1
-        r, g, b = COLORS[index]
-        glColor3f(r/256.0,g/256.0,b/256.0)"""
-
-        if DO_GRAYSCALE:
-            average_y = (v1y + v2y + v3y) / 3.0 - smallest
-            grayscale = average_y / scaleheight
-
-            glColor3f(grayscale, grayscale, grayscale)
-            glVertex3f(v1x, -v1z, v1y)
-            glVertex3f(v2x, -v2z, v2y)
-            glVertex3f(v3x, -v3z, v3y)
-
-        else:
-            face = Triangle(Vector3(v1x, -v1z, v1y), Vector3(v2x, -v2z, v2y), Vector3(v3x, -v3z, v3y))
-            if face.normal.norm() != 0:
-                angle = lightvec.cos_angle(face.normal)
-            else:
-                angle = 0.0
-            light = max(abs(angle), 0.3)
-
-            average_y = v1y - smallest
-            index = int((average_y / scaleheight) * len(COLORS))
-            if index < 0:
-                index = 0
-            if index >= len(COLORS):
-                index = len(COLORS) - 1
-            r, g, b = (i * light for i in COLORS[index])
-            glColor3f(r / 256.0, g / 256.0, b / 256.0)
-            glVertex3f(v1x, -v1z, v1y)
-
-            average_y = v2y - smallest
-            index = int((average_y / scaleheight) * len(COLORS))
-            if index < 0:
-                index = 0
-            if index >= len(COLORS):
-                index = len(COLORS) - 1
-            r, g, b = (i * light for i in COLORS[index])
-            glColor3f(r / 256.0, g / 256.0, b / 256.0)
-            glVertex3f(v2x, -v2z, v2y)
-
-            average_y = v3y - smallest
-            index = int((average_y / scaleheight) * len(COLORS))
-            if index < 0:
-                index = 0
-            if index >= len(COLORS):
-                index = len(COLORS) - 1
-            r, g, b = (i * light for i in COLORS[index])
-            glColor3f(r / 256.0, g / 256.0, b / 256.0)
-            glVertex3f(v3x, -v3z, v3y)
+    glBegin(GL_TRIANGLES)
+    for triangle_corners, triangle_colors in zip(corners.tolist(), colors.tolist()):
+        for vertex, color in zip(triangle_corners, triangle_colors):
+            glColor3f(*color)
+            glVertex3f(*vertex)
     glEnd()
 
 class GLPlotWidget(QtWidgets.QOpenGLWidget):
@@ -151,6 +100,7 @@ class GLPlotWidget(QtWidgets.QOpenGLWidget):
         #Load 2D data as a Nx2 Numpy array.
         self.verts = verts
         self.faces = faces
+        self.geometry = CollisionGeometry.from_faces(verts, faces)
         self.colors = None
 
     def set_color_data(self, facecolors):
@@ -180,7 +130,7 @@ class GLPlotWidget(QtWidgets.QOpenGLWidget):
 
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
-        draw_collision(self.verts, self.faces)
+        draw_collision(self.geometry)
         glFinish()
         print("drawn")
 
@@ -150,6 +150,7 @@ class ColorPicker(ClickableLabel):
 
 class DataEditor(QWidget):
     emit_3d_update = pyqtSignal()
+    emit_edit = pyqtSignal(object)
     
 
     def __init__(self, parent, bound_to):
@@ -161,10 +162,29 @@ class DataEditor(QWidget):
         self.vbox.setSpacing(3)
 
         self.setup_widgets()
+        self.connect_edit_signals()
 
     def catch_text_update(self):
         self.emit_3d_update.emit()
 
+    def connect_edit_signals(self):
+        # Any input may write to bound_to, which is reported with emit_edit for the undo history
+        for widget in self.findChildren(QLineEdit):
+            widget.textEdited.connect(self.catch_edit)
+            widget.editingFinished.connect(self.catch_edit)
+        for widget in self.findChildren(QCheckBox):
+            widget.stateChanged.connect(self.catch_edit)
+        for widget in self.findChildren(QComboBox):
+            widget.currentIndexChanged.connect(self.catch_edit)
+        for widget in self.findChildren(QPushButton):
+            widget.clicked.connect(self.catch_edit)
+        for widget in self.findChildren(ColorPicker):
+            widget.color_changed.connect(self.catch_edit)
+            widget.color_picked.connect(self.catch_edit)
+
+    def catch_edit(self, *args):
+        self.emit_edit.emit(self.bound_to)
+
     def setup_widgets(self):
         pass
 
@@ -930,7 +930,7 @@ def show_minimap_generator(editor: 'GenEditor'):
 
         # Generate the minimap image.
         image_placeholder.clear()
-        image, coordinates = minimap_generator.collision_to_minimap(editor.bco_coll, orientation,
+        image, coordinates = minimap_generator.collision_to_minimap(editor.bco_geometry, orientation,
                                                                     margin, outline,
                                                                     outline_vertical_offset,
                                                                     multisampling, terrain_colors)
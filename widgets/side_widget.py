@@ -169,6 +169,7 @@ class PikminSideWidget(QWidget):
             self.object_data_edit = editor(self, obj)
             self.verticalLayout.addWidget(self.object_data_edit)
             self.object_data_edit.emit_3d_update.connect(update3d)
+            self.object_data_edit.emit_edit.connect(lambda obj: self.parent.undo_stack.mark_changed(obj))
             
             if isinstance(self.object_data_edit, ObjectEdit) or isinstance(self.object_data_edit, CameraEdit):
                 #self.object_data_edit.set_default_values()
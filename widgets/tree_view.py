@@ -1,8 +1,12 @@
-from PyQt5.QtWidgets import QTreeWidget, QTreeWidgetItem
+from PyQt5.QtWidgets import QTreeWidget, QTreeWidgetItem, QTreeWidgetItemIterator
 from lib.libbol import BOL, get_full_name, AREA_TYPES
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import QAction, QMenu
 
+# Top-level groups of LevelDataTreeView that list document entries, in the order they are shown
+TREE_SECTIONS = ("kartpoints", "enemyroutes", "checkpointgroups", "respawnpoints", "objects",
+                 "objectroutes", "areas", "cameras", "cameraroutes", "lightparams")
+
 
 class BaseTreeWidgetItem(QTreeWidgetItem):
 
@@ -404,6 +408,10 @@ class LevelDataTreeView(QTreeWidget):
         #self.mgentries.remove_children()
 
     def set_objects(self, boldata: BOL):
+        self.set_sections(boldata, TREE_SECTIONS)
+
+    def set_sections(self, boldata: BOL, sections):
+        # Rebuilds the items of the given top-level groups, the remaining groups are left untouched.
         # Compute the location (based on indexes) of the currently selected item, if any.
         selected_item_indexes = []
         selected_items = self.selectedItems()
@@ -419,82 +427,138 @@ class LevelDataTreeView(QTreeWidget):
         selected_items = None
 
         # Preserve the expansion state of the top-level items that can have nested groups.
-        enemyroutes_expansion_states = self._get_expansion_states(self.enemyroutes)
-        checkpointgroups_expansion_states = self._get_expansion_states(self.checkpointgroups)
-        routes_expansion_states = self._get_expansion_states(self.objectroutes)
-        routes_expansion_states = self._get_expansion_states(self.cameraroutes)
+        expansion_states = {}
+        for section in ("enemyroutes", "checkpointgroups", "objectroutes", "cameraroutes"):
+            if section in sections:
+                expansion_states[section] = self._get_expansion_states(getattr(self, section))
+
+        for section in sections:
+            getattr(self, section).remove_children()
+            getattr(self, "_set_" + section)(boldata)
+
+        for section, states in expansion_states.items():
+            self._set_expansion_states(getattr(self, section), states)
+
+        # And restore previous selection.
+        if selected_item_indexes:
+            for item in self.selectedItems():
+                item.setSelected(False)
+            item = self.topLevelItem(selected_item_indexes.pop(0))
+            while selected_item_indexes:
+                index = selected_item_indexes.pop(0)
+                if index < item.childCount():
+                    item = item.child(index)
+                else:
+                    break
+            item.setSelected(True)
+
+        self.bound_to_group(boldata)
 
-        self.reset()
+    def update_objects(self, boldata: BOL, lists, objects):
+        # Brings the tree up to date after the given lists and objects of the document changed in place,
+        # rebuilding only the groups that contain a changed list.
+        section_lists = self._get_section_lists(boldata)
+        sections = []
+        for items in lists:
+            section = section_lists.get(id(items))
+            if section is not None and section not in sections:
+                sections.append(section)
+
+        if sections:
+            self.set_sections(boldata, [section for section in TREE_SECTIONS if section in sections])
+
+        changed = set(id(obj) for obj in objects)
+        iterator = QTreeWidgetItemIterator(self)
+        while iterator.value() is not None:
+            item = iterator.value()
+            if id(getattr(item, "bound_to", None)) in changed and hasattr(item, "update_name"):
+                item.update_name()
+            iterator += 1
+        self.cameras.set_name()
+
+    def _get_section_lists(self, boldata: BOL):
+        # Maps the lists of the document to the top-level group that shows their entries
+        section_lists = {
+            id(boldata.enemypointgroups.groups): "enemyroutes",
+            id(boldata.checkpoints.groups): "checkpointgroups",
+            id(boldata.routes): "objectroutes",
+            id(boldata.cameraroutes): "cameraroutes",
+            id(boldata.objects.objects): "objects",
+            id(boldata.kartpoints.positions): "kartpoints",
+            id(boldata.areas.areas): "areas",
+            id(boldata.cameras): "cameras",
+            id(boldata.respawnpoints): "respawnpoints",
+            id(boldata.lightparams): "lightparams"
+        }
+        for group in boldata.enemypointgroups.groups:
+            section_lists[id(group.points)] = "enemyroutes"
+        for group in boldata.checkpoints.groups:
+            section_lists[id(group.points)] = "checkpointgroups"
+        for route in boldata.routes:
+            section_lists[id(route.points)] = "objectroutes"
+        for route in boldata.cameraroutes:
+            section_lists[id(route.points)] = "cameraroutes"
+
+        return section_lists
+
+    def _set_kartpoints(self, boldata: BOL):
+        for kartpoint in boldata.kartpoints.positions:
+            item = KartpointEntry(self.kartpoints, "Kartpoint", kartpoint)
 
+    def _set_enemyroutes(self, boldata: BOL):
         for group in boldata.enemypointgroups.groups:
             group_item = EnemyPointGroup(self.enemyroutes, group)
 
             for point in group.points:
                 point_item = EnemyRoutePoint(group_item, "Enemy Route Point", point)
 
+    def _set_checkpointgroups(self, boldata: BOL):
         for group in boldata.checkpoints.groups:
             group_item = CheckpointGroup(self.checkpointgroups, group)
 
             for point in group.points:
                 point_item = Checkpoint(group_item, "Checkpoint", point)
 
-        for route in boldata.routes:
-            route_item = ObjectPointGroup(self.objectroutes, route)
-
-            for point in route.points:
-                point_item = ObjectRoutePoint(route_item, "Object route point", point)
-        for route in boldata.cameraroutes:
-            route_item = CameraPointGroup(self.cameraroutes, route)
-
-            for point in route.points:
-                point_item = CameraRoutePoint(route_item, "Camera route point", point)
-
-
+    def _set_respawnpoints(self, boldata: BOL):
+        for respawn in boldata.respawnpoints:
+            item = RespawnEntry(self.respawnpoints, "Respawn", respawn)
 
+    def _set_objects(self, boldata: BOL):
         for object in boldata.objects.objects:
             object_item = ObjectEntry(self.objects, "Object", object)
 
         self.sort_objects()
 
-        for kartpoint in boldata.kartpoints.positions:
-            item = KartpointEntry(self.kartpoints, "Kartpoint", kartpoint)
+    def _set_objectroutes(self, boldata: BOL):
+        for route in boldata.routes:
+            route_item = ObjectPointGroup(self.objectroutes, route)
 
+            for point in route.points:
+                point_item = ObjectRoutePoint(route_item, "Object route point", point)
+
+    def _set_areas(self, boldata: BOL):
         for area in boldata.areas.areas:
             item = AreaEntry(self.areas, "Area", area)
 
-        for respawn in boldata.respawnpoints:
-            item = RespawnEntry(self.respawnpoints, "Respawn", respawn)
-
+    def _set_cameras(self, boldata: BOL):
         for i, camera in enumerate(boldata.cameras):
             item = CameraEntry(self.cameras, "Camera", camera, i)
         self.cameras.set_name()
 
+    def _set_cameraroutes(self, boldata: BOL):
+        for route in boldata.cameraroutes:
+            route_item = CameraPointGroup(self.cameraroutes, route)
+
+            for point in route.points:
+                point_item = CameraRoutePoint(route_item, "Camera route point", point)
+
+    def _set_lightparams(self, boldata: BOL):
         for i, lightparam in enumerate(boldata.lightparams):
             item = LightParamEntry(self.lightparams, "LightParam", lightparam, i)
 
         for mg in boldata.mgentries:
             item = MGEntry(self.mgentries, "MG", mg)
 
-        self._set_expansion_states(self.enemyroutes, enemyroutes_expansion_states)
-        self._set_expansion_states(self.checkpointgroups, checkpointgroups_expansion_states)
-        self._set_expansion_states(self.objectroutes, routes_expansion_states)
-        self._set_expansion_states(self.cameraroutes, routes_expansion_states)
-
-        # And restore previous selection.
-        if selected_item_indexes:
-            for item in self.selectedItems():
-                item.setSelected(False)
-            item = self.topLevelItem(selected_item_indexes.pop(0))
-            while selected_item_indexes:
-                index = selected_item_indexes.pop(0)
-                if index < item.childCount():
-                    item = item.child(index)
-                else:
-                    break
-            item.setSelected(True)
-
-        self.bound_to_group(boldata)
-
     def sort_objects(self):
         self.objects.sort()
         """items = []